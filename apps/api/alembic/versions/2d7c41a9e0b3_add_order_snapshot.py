@@ -0,0 +1,30 @@
+"""add order snapshot
+
+Revision ID: 2d7c41a9e0b3
+Revises: 4e8984cf8d57
+Create Date: 2026-10-19 13:05:12.402918
+
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2d7c41a9e0b3"
+down_revision = "4e8984cf8d57"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Nullable and without a default, so this is a catalog-only change; existing
+    # orders are backfilled with python -m src.modules.orders.snapshots
+    op.add_column(
+        "orders", sa.Column("snapshot", postgresql.JSONB(astext_type=sa.Text()), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("orders", "snapshot")
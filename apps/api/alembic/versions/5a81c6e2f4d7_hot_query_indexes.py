@@ -0,0 +1,58 @@
+"""hot query indexes
+
+Revision ID: 5a81c6e2f4d7
+Revises: 7f3b9c2d1a64
+Create Date: 2026-10-19 15:42:08.531774
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5a81c6e2f4d7"
+down_revision = "7f3b9c2d1a64"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # GET /products pages active products newest first. This index returns
+    # them already in order and stops at LIMIT, instead of a primary key scan
+    # that filters out inactive rows (or a sort). It also serves the page's
+    # count(*) as an index-only scan. Built concurrently since products takes
+    # live writes.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_products_active_id",
+            "products",
+            [sa.text("id DESC")],
+            unique=False,
+            postgresql_where=sa.text("is_active"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+    # The payments worker's stale-payment sweep (in-flight payments by id).
+    # In-flight payments are a tiny fraction of the table, so the partial
+    # index stays small. payments is partitioned, so it cannot be built
+    # concurrently; each partition gets its own index.
+    op.create_index(
+        "ix_payments_in_flight",
+        "payments",
+        ["id"],
+        unique=False,
+        postgresql_where=sa.text("status IN ('PENDING', 'AUTHORIZED')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_payments_in_flight", table_name="payments")
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_products_active_id",
+            table_name="products",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
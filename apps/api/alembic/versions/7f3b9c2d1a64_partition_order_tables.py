@@ -0,0 +1,330 @@
+"""partition order tables by month
+
+Converts orders, order_items and payments to native range partitions on the
+order's creation time (order_items/payments are co-partitioned on a copied
+order_created_at), moves checkout idempotency keys to a non-partitioned
+table, and installs ensure_monthly_partitions() for creating future months.
+
+Rewrites all three tables: run in a maintenance window.
+
+Revision ID: 7f3b9c2d1a64
+Revises: 2d7c41a9e0b3
+Create Date: 2026-10-19 13:40:27.551032
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7f3b9c2d1a64"
+down_revision = "2d7c41a9e0b3"
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+# Creates <parent>_pYYYYMM partitions (UTC month bounds) from from_ts's month
+# through months_ahead months after the current one. Months whose rows already
+# sit in <parent>_default are skipped with a warning, since Postgres refuses to
+# create a partition that would have to take rows out of the default one.
+ENSURE_MONTHLY_PARTITIONS = """
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(
+    parent text, key_column text, from_ts timestamptz, months_ahead int
+) RETURNS int
+LANGUAGE plpgsql AS $$
+DECLARE
+    m timestamp := date_trunc('month', from_ts AT TIME ZONE 'UTC');
+    stop timestamp := date_trunc('month', now() AT TIME ZONE 'UTC')
+                      + make_interval(months => months_ahead + 1);
+    part text;
+    lo timestamptz;
+    hi timestamptz;
+    in_default boolean;
+    created int := 0;
+BEGIN
+    WHILE m < stop LOOP
+        part := format('%s_p%s', parent, to_char(m, 'YYYYMM'));
+        lo := m AT TIME ZONE 'UTC';
+        hi := (m + interval '1 month') AT TIME ZONE 'UTC';
+        IF to_regclass(part) IS NULL THEN
+            in_default := false;
+            IF to_regclass(parent || '_default') IS NOT NULL THEN
+                EXECUTE format(
+                    'SELECT EXISTS (SELECT 1 FROM %I WHERE %I >= %L AND %I < %L)',
+                    parent || '_default', key_column, lo, key_column, hi
+                ) INTO in_default;
+            END IF;
+            IF in_default THEN
+                RAISE WARNING '% has rows for %, not creating %', parent || '_default', lo, part;
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                    part, parent, lo, hi
+                );
+                created := created + 1;
+            END IF;
+        END IF;
+        m := m + interval '1 month';
+    END LOOP;
+    RETURN created;
+END
+$$;
+"""
+
+
+def _create_partitions(from_sql: str) -> None:
+    for table, key in (
+        ("orders", "created_at"),
+        ("order_items", "order_created_at"),
+        ("payments", "order_created_at"),
+    ):
+        op.execute(
+            f"SELECT ensure_monthly_partitions('{table}', '{key}', {from_sql}, {MONTHS_AHEAD})"
+        )
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+
+def upgrade() -> None:
+    op.execute(ENSURE_MONTHLY_PARTITIONS)
+
+    # Keep the id sequences: detach them so dropping the old tables keeps them
+    for table in ("orders", "order_items", "payments"):
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+
+    op.execute(
+        """
+        CREATE TABLE orders (
+            id integer NOT NULL DEFAULT nextval('orders_id_seq'),
+            user_id varchar(64) NOT NULL,
+            status varchar(32) NOT NULL DEFAULT 'CREATED',
+            total_cents integer NOT NULL DEFAULT 0,
+            currency varchar(8) NOT NULL DEFAULT 'USD',
+            idempotency_key varchar(128),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            snapshot jsonb
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE order_items (
+            id integer NOT NULL DEFAULT nextval('order_items_id_seq'),
+            order_id integer NOT NULL,
+            order_created_at timestamptz NOT NULL,
+            product_id integer NOT NULL,
+            sku varchar(64) NOT NULL,
+            name varchar(200) NOT NULL,
+            qty integer NOT NULL,
+            unit_price_cents integer NOT NULL,
+            line_total_cents integer NOT NULL
+        ) PARTITION BY RANGE (order_created_at)
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE payments (
+            id integer NOT NULL DEFAULT nextval('payments_id_seq'),
+            order_id integer NOT NULL,
+            order_created_at timestamptz NOT NULL,
+            status varchar(32) NOT NULL DEFAULT 'PENDING',
+            amount numeric(10, 2) NOT NULL,
+            currency varchar(8) NOT NULL DEFAULT 'USD',
+            idempotency_key varchar(128) NOT NULL,
+            created_at timestamptz NOT NULL DEFAULT now()
+        ) PARTITION BY RANGE (order_created_at)
+        """
+    )
+    _create_partitions("coalesce((SELECT min(created_at) FROM orders_unpartitioned), now())")
+
+    op.execute(
+        """
+        INSERT INTO orders
+            (id, user_id, status, total_cents, currency, idempotency_key, created_at, snapshot)
+        SELECT id, user_id, status, total_cents, currency, idempotency_key, created_at, snapshot
+        FROM orders_unpartitioned
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO order_items
+            (id, order_id, order_created_at, product_id, sku, name, qty,
+             unit_price_cents, line_total_cents)
+        SELECT i.id, i.order_id, o.created_at, i.product_id, i.sku, i.name, i.qty,
+               i.unit_price_cents, i.line_total_cents
+        FROM order_items_unpartitioned i
+        JOIN orders_unpartitioned o ON o.id = i.order_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO payments
+            (id, order_id, order_created_at, status, amount, currency, idempotency_key, created_at)
+        SELECT p.id, p.order_id, o.created_at, p.status, p.amount, p.currency,
+               p.idempotency_key, p.created_at
+        FROM payments_unpartitioned p
+        JOIN orders_unpartitioned o ON o.id = p.order_id
+        """
+    )
+
+    op.execute(
+        """
+        CREATE TABLE order_idempotency_keys (
+            user_id varchar(64) NOT NULL,
+            idempotency_key varchar(128) NOT NULL,
+            order_id integer NOT NULL,
+            order_created_at timestamptz NOT NULL,
+            CONSTRAINT order_idempotency_keys_pkey PRIMARY KEY (user_id, idempotency_key)
+        )
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO order_idempotency_keys (user_id, idempotency_key, order_id, order_created_at)
+        SELECT user_id, idempotency_key, id, created_at
+        FROM orders_unpartitioned
+        WHERE idempotency_key IS NOT NULL
+        ON CONFLICT DO NOTHING
+        """
+    )
+
+    op.execute("DROP TABLE payments_unpartitioned, order_items_unpartitioned, orders_unpartitioned")
+
+    # Constraints and indexes go on the parents and cascade to every partition
+    op.execute("ALTER TABLE orders ADD CONSTRAINT orders_pkey PRIMARY KEY (id, created_at)")
+    op.execute(
+        "CREATE INDEX ix_orders_user_id_created_at ON orders (user_id, created_at DESC, id DESC)"
+    )
+
+    op.execute(
+        "ALTER TABLE order_items ADD CONSTRAINT order_items_pkey "
+        "PRIMARY KEY (id, order_created_at)"
+    )
+    op.execute(
+        "ALTER TABLE order_items ADD CONSTRAINT order_items_order_id_fkey "
+        "FOREIGN KEY (order_id, order_created_at) REFERENCES orders (id, created_at) "
+        "ON DELETE CASCADE"
+    )
+    op.execute(
+        "ALTER TABLE order_items ADD CONSTRAINT order_items_product_id_fkey "
+        "FOREIGN KEY (product_id) REFERENCES products (id)"
+    )
+    op.execute("CREATE INDEX ix_order_items_order_id ON order_items (order_id)")
+    op.execute("CREATE INDEX ix_order_items_product_id ON order_items (product_id)")
+
+    op.execute(
+        "ALTER TABLE payments ADD CONSTRAINT payments_pkey PRIMARY KEY (id, order_created_at)"
+    )
+    op.execute(
+        "ALTER TABLE payments ADD CONSTRAINT uq_payments_order_id_idempotency_key "
+        "UNIQUE (order_id, order_created_at, idempotency_key)"
+    )
+    op.execute(
+        "ALTER TABLE payments ADD CONSTRAINT payments_order_id_fkey "
+        "FOREIGN KEY (order_id, order_created_at) REFERENCES orders (id, created_at) "
+        "ON DELETE CASCADE"
+    )
+    op.execute("CREATE INDEX ix_payments_order_id ON payments (order_id)")
+
+    for table in ("orders", "order_items", "payments"):
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+
+def downgrade() -> None:
+    # Back to plain tables; archived (detached) partitions are left alone
+    for table in ("orders", "order_items", "payments"):
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+    for constraint, table in (
+        ("order_items_order_id_fkey", "order_items"),
+        ("order_items_product_id_fkey", "order_items"),
+        ("payments_order_id_fkey", "payments"),
+        ("order_items_pkey", "order_items"),
+        ("uq_payments_order_id_idempotency_key", "payments"),
+        ("payments_pkey", "payments"),
+        ("orders_pkey", "orders"),
+    ):
+        op.execute(f"ALTER TABLE {table}_partitioned DROP CONSTRAINT {constraint}")
+    for index in (
+        "ix_orders_user_id_created_at",
+        "ix_order_items_order_id",
+        "ix_order_items_product_id",
+        "ix_payments_order_id",
+    ):
+        op.execute(f"DROP INDEX {index}")
+
+    op.execute(
+        """
+        CREATE TABLE orders (
+            id integer NOT NULL DEFAULT nextval('orders_id_seq') PRIMARY KEY,
+            user_id varchar(64) NOT NULL,
+            status varchar(32) NOT NULL DEFAULT 'CREATED',
+            total_cents integer NOT NULL DEFAULT 0,
+            currency varchar(8) NOT NULL DEFAULT 'USD',
+            idempotency_key varchar(128),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            snapshot jsonb,
+            CONSTRAINT uq_orders_user_id_idempotency_key UNIQUE (user_id, idempotency_key)
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE order_items (
+            id integer NOT NULL DEFAULT nextval('order_items_id_seq') PRIMARY KEY,
+            order_id integer NOT NULL REFERENCES orders (id) ON DELETE CASCADE,
+            product_id integer NOT NULL REFERENCES products (id),
+            sku varchar(64) NOT NULL,
+            name varchar(200) NOT NULL,
+            qty integer NOT NULL,
+            unit_price_cents integer NOT NULL,
+            line_total_cents integer NOT NULL
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE payments (
+            id integer NOT NULL DEFAULT nextval('payments_id_seq') PRIMARY KEY,
+            order_id integer NOT NULL REFERENCES orders (id) ON DELETE CASCADE,
+            amount numeric(10, 2) NOT NULL,
+            status varchar(32) NOT NULL DEFAULT 'PENDING',
+            idempotency_key varchar(128) NOT NULL,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            currency varchar(8) NOT NULL DEFAULT 'USD',
+            CONSTRAINT uq_payments_order_id_idempotency_key UNIQUE (order_id, idempotency_key)
+        )
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO orders
+            (id, user_id, status, total_cents, currency, idempotency_key, created_at, snapshot)
+        SELECT id, user_id, status, total_cents, currency, idempotency_key, created_at, snapshot
+        FROM orders_partitioned
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO order_items
+            (id, order_id, product_id, sku, name, qty, unit_price_cents, line_total_cents)
+        SELECT id, order_id, product_id, sku, name, qty, unit_price_cents, line_total_cents
+        FROM order_items_partitioned
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO payments
+            (id, order_id, amount, status, idempotency_key, created_at, currency)
+        SELECT id, order_id, amount, status, idempotency_key, created_at, currency
+        FROM payments_partitioned
+        """
+    )
+    op.execute("DROP TABLE payments_partitioned, order_items_partitioned, orders_partitioned")
+    op.execute("DROP TABLE order_idempotency_keys")
+    op.execute("CREATE INDEX ix_orders_user_id ON orders (user_id)")
+    op.execute("CREATE INDEX ix_order_items_order_id ON order_items (order_id)")
+    op.execute("CREATE INDEX ix_order_items_product_id ON order_items (product_id)")
+    for table in ("orders", "order_items", "payments"):
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.execute("DROP FUNCTION ensure_monthly_partitions(text, text, timestamptz, int)")
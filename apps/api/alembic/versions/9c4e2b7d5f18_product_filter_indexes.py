@@ -0,0 +1,47 @@
+"""product filter indexes
+
+Revision ID: 9c4e2b7d5f18
+Revises: 5a81c6e2f4d7
+Create Date: 2026-10-19 16:27:51.094362
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9c4e2b7d5f18"
+down_revision = "5a81c6e2f4d7"
+branch_labels = None
+depends_on = None
+
+# GET /products filters. All partial on is_active like the listing itself.
+INDEXES = [
+    # min_price_cents / max_price_cents
+    ("ix_products_active_price", ["price_cents"], "is_active"),
+    # currency, optionally with a price range
+    ("ix_products_active_currency_price", ["currency", "price_cents"], "is_active"),
+    # in_stock=true pages, already in listing order
+    ("ix_products_active_in_stock_id", [sa.text("id DESC")], "is_active AND stock_qty > 0"),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, columns, where in INDEXES:
+            op.create_index(
+                name,
+                "products",
+                columns,
+                unique=False,
+                postgresql_where=sa.text(where),
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name="products", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,28 @@
+"""add product version
+
+Revision ID: b6f1d3a8c2e5
+Revises: 9c4e2b7d5f18
+Create Date: 2026-10-19 17:03:36.218450
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b6f1d3a8c2e5"
+down_revision = "9c4e2b7d5f18"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # A constant default is stored in the catalog, so no table rewrite
+    op.add_column(
+        "products", sa.Column("version", sa.Integer(), server_default="1", nullable=False)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("products", "version")
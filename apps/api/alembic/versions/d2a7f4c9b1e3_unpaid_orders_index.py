@@ -0,0 +1,35 @@
+"""unpaid orders index
+
+Revision ID: d2a7f4c9b1e3
+Revises: b6f1d3a8c2e5
+Create Date: 2026-10-19 18:06:51.224107
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d2a7f4c9b1e3"
+down_revision = "b6f1d3a8c2e5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The unpaid order sweeper walks CREATED orders oldest first. Once the
+    # sweeper keeps up, they are a small, recent slice of the table, so the
+    # partial index stays small. orders is partitioned, so it cannot be built
+    # concurrently; each partition gets its own index.
+    op.create_index(
+        "ix_orders_unpaid_created_at",
+        "orders",
+        ["created_at", "id"],
+        unique=False,
+        postgresql_where=sa.text("status = 'CREATED'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_orders_unpaid_created_at", table_name="orders")
@@ -0,0 +1,42 @@
+"""create sales daily rollups
+
+Revision ID: e5b8c1f3a9d2
+Revises: d2a7f4c9b1e3
+Create Date: 2026-10-19 19:24:37.602915
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e5b8c1f3a9d2"
+down_revision = "d2a7f4c9b1e3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sales_daily_rollups",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("units", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("revenue_cents", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("paid_units", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("paid_revenue_cents", sa.BigInteger(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("day", "product_id"),
+    )
+    op.create_index(
+        "ix_sales_daily_rollups_product_day",
+        "sales_daily_rollups",
+        ["product_id", "day"],
+        unique=False,
+    )
+    # Existing orders are loaded with python -m src.modules.analytics.backfill
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sales_daily_rollups_product_day", table_name="sales_daily_rollups")
+    op.drop_table("sales_daily_rollups")
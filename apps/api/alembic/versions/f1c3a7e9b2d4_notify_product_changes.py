@@ -0,0 +1,56 @@
+"""notify product changes
+
+Revision ID: f1c3a7e9b2d4
+Revises: e5b8c1f3a9d2
+Create Date: 2026-10-19 21:12:05.418330
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f1c3a7e9b2d4"
+down_revision = "e5b8c1f3a9d2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Change feed for the in-process catalog snapshots
+    # (src/modules/catalog/snapshot.py): every statement that writes products
+    # sends the changed ids on the catalog_changes channel, or "*" when it
+    # changed too many rows to list (bulk loads), which means reload. pg_notify
+    # is delivered on commit and dropped on rollback.
+    op.execute(
+        """
+        CREATE FUNCTION notify_catalog_changes() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+          ids text;
+        BEGIN
+          SELECT CASE WHEN count(*) <= 500 THEN string_agg(id::text, ',') ELSE '*' END
+            INTO ids FROM changed;
+          IF ids IS NOT NULL THEN
+            PERFORM pg_notify('catalog_changes', ids);
+          END IF;
+          RETURN NULL;
+        END
+        $$
+        """
+    )
+    # A trigger with transition tables covers a single event
+    for event, table in (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD")):
+        op.execute(
+            f"""
+            CREATE TRIGGER products_notify_{event}
+            AFTER {event.upper()} ON products
+            REFERENCING {table} TABLE AS changed
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_changes()
+            """
+        )
+
+
+def downgrade() -> None:
+    for event in ("insert", "update", "delete"):
+        op.execute(f"DROP TRIGGER products_notify_{event} ON products")
+    op.execute("DROP FUNCTION notify_catalog_changes()")
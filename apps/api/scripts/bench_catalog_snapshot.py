@@ -0,0 +1,129 @@
+"""Memory and lookup latency of the in-process catalog snapshot.
+
+Builds a CatalogSnapshot from --products synthetic rows shaped like the
+products table (or, with --from-db, from the real table) and reports:
+
+- bytes per product (traced allocations) and the total per 1M products, next
+  to the same rows kept as one dict per product (what caching the
+  ProductResponse dicts in memory would cost);
+- get(id) latency for random ids, and page() latency for the first and a
+  deep page of the default listing.
+
+Usage:  python scripts/bench_catalog_snapshot.py [--products 1000000] [--from-db]
+"""
+
+import argparse
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import text
+
+from src.db.database import get_engine
+from src.modules.catalog.snapshot import _SELECT, CatalogSnapshot
+
+
+def sample_rows(count: int):
+    for i in range(1, count + 1):
+        yield (
+            i,
+            f"AMZL-SKU-{i:07d}",
+            f"Sample product {i}",
+            f"Durable everyday item #{i}, ships in 2 days." if i % 4 else None,
+            499 + (i * 37) % 20_000,
+            "USD" if i % 10 else "EUR",
+            (i * 13) % 250,
+            i % 50 != 0,
+            1,
+        )
+
+
+def db_rows():
+    with get_engine().connect() as conn:
+        result = conn.execute(
+            text(f"{_SELECT} ORDER BY id"), execution_options={"stream_results": True}
+        )
+        for row in result:
+            yield tuple(row)
+
+
+def traced_bytes(build):
+    """(object built, bytes allocated for it and still held)."""
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def as_dicts(rows) -> dict:
+    keys = (
+        "id",
+        "sku",
+        "name",
+        "description",
+        "price_cents",
+        "currency",
+        "stock_qty",
+        "is_active",
+        "version",
+    )
+    return {row[0]: dict(zip(keys, row)) for row in rows}
+
+
+def timed_us(fn, args_list) -> list[float]:
+    out = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        out.append((time.perf_counter() - t0) * 1e6)
+    return out
+
+
+def report(name: str, samples: list[float]) -> None:
+    samples.sort()
+    print(
+        f"{name:<26}{statistics.median(samples):>10.2f}"
+        f"{samples[int(len(samples) * 0.99)]:>10.2f}{samples[-1]:>10.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--from-db", action="store_true", help="load the products table")
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+
+    def rows():
+        # Rows are created while tracing, as when streamed from Postgres, so
+        # whatever a representation keeps of them is counted
+        return db_rows() if args.from_db else sample_rows(args.products)
+
+    snapshot = CatalogSnapshot()
+    _, snapshot_bytes = traced_bytes(lambda: snapshot.load(rows()))
+    dicts, dict_bytes = traced_bytes(lambda: as_dicts(rows()))
+    del dicts
+    ids = [row[0] for row in rows()]
+    count = len(ids)
+
+    print(f"{count} products ({'products table' if args.from_db else 'synthetic'})")
+    print(f"{'':<26}{'B/product':>10}{'MB per 1M':>12}")
+    for name, size in (("CatalogSnapshot", snapshot_bytes), ("dict per product", dict_bytes)):
+        per_product = size / count
+        print(f"{name:<26}{per_product:>10.0f}{per_product * 1_000_000 / 2**20:>12.0f}")
+
+    rng = random.Random(0)
+    print(f"\n{'latency (us)':<26}{'p50':>10}{'p99':>10}{'max':>10}")
+    report("get(id)", timed_us(snapshot.get, [(rng.choice(ids),) for _ in range(args.lookups)]))
+    report("get(unknown id)", timed_us(snapshot.get, [(-1,)] * args.lookups))
+    report("page(20, 0)", timed_us(snapshot.page, [(20, 0)] * 10_000))
+    report("page(20, 10000)", timed_us(snapshot.page, [(20, 10_000)] * 200))
+
+
+if __name__ == "__main__":
+    main()
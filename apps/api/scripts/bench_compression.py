@@ -0,0 +1,107 @@
+"""Compare response bytes and CPU per request across Content-Encodings.
+
+Offline part (always runs): builds product list pages like GET /products
+returns and, for each encoding, reports the encoded size and the CPU it costs
+to compress. With precompressed caching that cost is paid once per cache
+fill; with on-the-fly compression it is paid on every request.
+
+Live part (--live): requests /products?limit=100 from a running API with each
+Accept-Encoding and reports bytes on the wire, latency, and server CPU per
+request (from process_cpu_seconds_total on /metrics).
+
+Usage:  python scripts/bench_compression.py [--items 100] [--live --requests 500]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import time
+
+import httpx
+
+from src.core.compression import ENCODERS, encode
+
+BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+
+
+def sample_page(items: int) -> bytes:
+    products = [
+        {
+            "id": 100_000 - i,
+            "sku": f"AMZL-SKU-{i:06d}",
+            "name": f"Sample product {i}",
+            "description": f"Durable everyday item #{i}, ships in 2 days. Includes warranty card.",
+            "price_cents": 499 + (i * 37) % 20_000,
+            "currency": "USD",
+            "stock_qty": (i * 13) % 250,
+            "is_active": True,
+        }
+        for i in range(items)
+    ]
+    page = {"items": products, "limit": items, "offset": 0, "total": 100_000}
+    return json.dumps(page, separators=(",", ":")).encode()
+
+
+def cpu_ms(fn, repeat: int) -> float:
+    t0 = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - t0) * 1000 / repeat
+
+
+def offline(items: int, repeat: int) -> None:
+    body = sample_page(items)
+    serialize_ms = cpu_ms(lambda: json.dumps(json.loads(body)), repeat)
+    print(f"page: {items} items, {len(body)} bytes raw JSON")
+    print(f"{'encoding':<10}{'bytes':>9}{'ratio':>8}{'compress ms/req':>17}")
+    print(f"{'identity':<10}{len(body):>9}{1.0:>8.2f}{0.0:>17.3f}")
+    for encoding in ENCODERS:
+        encoded = encode(body, encoding)
+        ms = cpu_ms(lambda e=encoding: encode(body, e), repeat)
+        print(f"{encoding:<10}{len(encoded):>9}{len(body) / len(encoded):>8.2f}{ms:>17.3f}")
+    print(f"(decoding + re-serializing a cached page costs ~{serialize_ms:.3f} ms/req;")
+    print(" hits served from stored bytes pay neither that nor the compression cost)")
+
+
+def server_cpu_seconds(client: httpx.Client) -> float | None:
+    text = client.get("/metrics").text
+    match = re.search(r"^process_cpu_seconds_total ([0-9.e+-]+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def live(requests: int) -> None:
+    print(f"\nlive: {BASE_URL}/products?limit=100, {requests} requests per encoding")
+    print(f"{'encoding':<10}{'wire bytes':>11}{'p50 ms':>9}{'server cpu ms/req':>19}")
+    with httpx.Client(base_url=BASE_URL, timeout=10.0) as client:
+        for encoding in ["identity", *ENCODERS]:
+            headers = {"Accept-Encoding": encoding}
+            client.get("/products?limit=100", headers=headers)  # warm the cache entry
+            cpu0 = server_cpu_seconds(client)
+            latencies, size = [], 0
+            for _ in range(requests):
+                t0 = time.perf_counter()
+                with client.stream("GET", "/products?limit=100", headers=headers) as r:
+                    size = sum(len(chunk) for chunk in r.iter_raw())
+                latencies.append((time.perf_counter() - t0) * 1000)
+            cpu1 = server_cpu_seconds(client)
+            cpu = f"{(cpu1 - cpu0) * 1000 / requests:.3f}" if cpu0 is not None else "n/a"
+            print(f"{encoding:<10}{size:>11}{statistics.median(latencies):>9.2f}{cpu:>19}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    offline(args.items, args.repeat)
+    if args.live:
+        live(args.requests)
+
+
+if __name__ == "__main__":
+    main()
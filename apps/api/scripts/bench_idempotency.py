@@ -0,0 +1,102 @@
+"""Concurrent duplicate requests: checkout and pay with a shared Idempotency-Key.
+
+Each round fills a fresh user's cart, fires --duplicates concurrent checkouts
+with one Idempotency-Key, then --duplicates concurrent payments of the
+resulting order with one key. A round succeeds when every duplicate gets a
+2xx answer with the same order (payment) id. Reports, per endpoint, the
+success rate, errors, and latency percentiles of the duplicates.
+
+Usage:  python scripts/bench_idempotency.py --rounds 50 --duplicates 16
+
+Start the API with IDEMPOTENCY_WAIT_MS=0, so duplicates don't wait on the
+Redis idempotency lock and all race on the database constraints, and with
+RATE_LIMIT_ENABLED=false (all load comes from one client IP).
+"""
+
+import argparse
+import statistics
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from bench_payments import BASE_URL, first_product_id, percentile
+
+
+def fire(client: httpx.Client, pool: ThreadPoolExecutor, url: str, key: str, id_field: str, n: int):
+    """n concurrent POSTs; returns (distinct ids, error count, latencies)."""
+
+    def one(_):
+        r = client.post(url, headers={"Idempotency-Key": key})
+        if r.status_code >= 300:
+            return None, r.elapsed.total_seconds()
+        return r.json()[id_field], r.elapsed.total_seconds()
+
+    results = list(pool.map(one, range(n)))
+    ids = {rid for rid, _ in results if rid is not None}
+    errors = sum(1 for rid, _ in results if rid is None)
+    return ids, errors, [lat for _, lat in results]
+
+
+def report(name: str, ok: int, rounds: int, errors: int, latencies: list[float]) -> None:
+    print(
+        f"{name:<10}{ok / rounds:>10.1%}{errors:>8}"
+        f"{statistics.median(latencies) * 1000:>9.1f}"
+        f"{percentile(latencies, 0.99) * 1000:>9.1f}"
+        f"{max(latencies) * 1000:>9.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--duplicates", type=int, default=16)
+    args = parser.parse_args()
+
+    stats = {name: {"ok": 0, "errors": 0, "latencies": []} for name in ("checkout", "pay")}
+    limits = httpx.Limits(max_connections=args.duplicates)
+    with (
+        httpx.Client(base_url=BASE_URL, timeout=30.0, limits=limits) as client,
+        ThreadPoolExecutor(max_workers=args.duplicates) as pool,
+    ):
+        product_id = first_product_id(client)
+        for _ in range(args.rounds):
+            user_id = f"bench_{uuid.uuid4().hex[:10]}"
+            client.post(
+                f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 1}
+            ).raise_for_status()
+
+            order_ids, errors, latencies = fire(
+                client,
+                pool,
+                f"/orders/checkout?user_id={user_id}",
+                f"bench_{user_id}",
+                "id",
+                args.duplicates,
+            )
+            stats["checkout"]["ok"] += not errors and len(order_ids) == 1
+            stats["checkout"]["errors"] += errors
+            stats["checkout"]["latencies"] += latencies
+            if not order_ids:
+                continue
+
+            payment_ids, errors, latencies = fire(
+                client,
+                pool,
+                f"/payments/pay?order_id={min(order_ids)}",
+                f"bench_pay_{user_id}",
+                "payment_id",
+                args.duplicates,
+            )
+            stats["pay"]["ok"] += not errors and len(payment_ids) == 1
+            stats["pay"]["errors"] += errors
+            stats["pay"]["latencies"] += latencies
+
+    print(f"{args.rounds} rounds x {args.duplicates} concurrent duplicates")
+    print(f"{'':<10}{'success':>10}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, s in stats.items():
+        if s["latencies"]:
+            report(name, s["ok"], args.rounds, s["errors"], s["latencies"])
+
+
+if __name__ == "__main__":
+    main()
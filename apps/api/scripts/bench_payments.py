@@ -0,0 +1,110 @@
+"""Sustained payments/s benchmark for the async authorize/capture pipeline.
+
+Creates N orders through the public API (not timed), then fires
+POST /payments/pay for all of them concurrently and polls until every payment
+reaches a terminal status. Reports:
+
+- accepted/s: how fast the API hands payments to the queue
+- settled/s:  end-to-end throughput of the payments worker(s)
+
+Usage:  python scripts/bench_payments.py --orders 500 --concurrency 32
+Requires the API and at least one payments worker to be running. All load
+comes from one client IP, so run the API with RATE_LIMIT_ENABLED=false.
+"""
+
+import argparse
+import os
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+TERMINAL = {"SUCCEEDED", "FAILED"}
+
+
+def first_product_id(client: httpx.Client) -> int:
+    r = client.get("/products")
+    r.raise_for_status()
+    items = r.json().get("items") or []
+    if not items:
+        client.post("/products/seed").raise_for_status()
+        items = client.get("/products").json()["items"]
+    return int(items[0]["id"])
+
+
+def create_order(client: httpx.Client, product_id: int) -> int:
+    user_id = f"bench_{uuid.uuid4().hex[:10]}"
+    client.post(
+        f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 1}
+    ).raise_for_status()
+    r = client.post(
+        f"/orders/checkout?user_id={user_id}", headers={"Idempotency-Key": f"bench_{user_id}"}
+    )
+    r.raise_for_status()
+    return int(r.json()["id"])
+
+
+def pay(client: httpx.Client, order_id: int) -> tuple[int, float]:
+    t0 = time.perf_counter()
+    r = client.post(
+        f"/payments/pay?order_id={order_id}",
+        headers={"Idempotency-Key": f"bench_pay_{order_id}"},
+    )
+    r.raise_for_status()
+    return int(r.json()["payment_id"]), time.perf_counter() - t0
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    with httpx.Client(base_url=BASE_URL, timeout=30.0, limits=limits) as client:
+        product_id = first_product_id(client)
+        with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+            order_ids = list(ex.map(lambda _: create_order(client, product_id), range(args.orders)))
+
+            t0 = time.perf_counter()
+            results = list(ex.map(lambda oid: pay(client, oid), order_ids))
+            accepted_s = time.perf_counter() - t0
+
+            pending = {pid for pid, _ in results}
+            statuses: dict[str, int] = {}
+            deadline = time.perf_counter() + args.timeout
+            while pending and time.perf_counter() < deadline:
+                bodies = list(ex.map(lambda pid: client.get(f"/payments/{pid}").json(), pending))
+                for body in bodies:
+                    if body["status"] in TERMINAL:
+                        pending.discard(body["payment_id"])
+                        statuses[body["status"]] = statuses.get(body["status"], 0) + 1
+                if pending:
+                    time.sleep(0.05)
+            settled_s = time.perf_counter() - t0
+
+    latencies = [lat for _, lat in results]
+    settled = args.orders - len(pending)
+    print(f"orders:            {args.orders} (concurrency={args.concurrency})")
+    print(f"accepted/s:        {args.orders / accepted_s:.1f}")
+    print(
+        f"pay latency ms:    p50={statistics.median(latencies) * 1000:.1f} "
+        f"p95={percentile(latencies, 0.95) * 1000:.1f} p99={percentile(latencies, 0.99) * 1000:.1f}"
+    )
+    print(f"settled:           {settled}/{args.orders} {statuses}")
+    print(f"settled payments/s: {settled / settled_s:.1f}")
+    if pending:
+        print(f"timed out waiting for {len(pending)} payments")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Throughput of the multi-process server at different worker counts.
+
+For each worker count, starts `python -m src.serve --workers N` on a spare
+port (rate limiting off, same DB/Redis as the environment), waits for
+/ready, then drives GET <path> from several load-generator processes, each
+with its own keep-alive connections, for --duration seconds. Reports
+requests/s, latency percentiles, errors, and the speedup over the first
+worker count.
+
+The load generator needs CPU too: on a machine with K cores, compare worker
+counts up to about K/2 and give the generator the rest (--load-procs).
+
+Usage:  python scripts/bench_workers.py [--workers 1,2,4] [--path /products]
+            [--concurrency 64] [--duration 10] [--load-procs 2]
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+PORT = int(os.getenv("BENCH_PORT", "8100"))
+
+
+def start_server(workers: int) -> subprocess.Popen:
+    env = {**os.environ, "RATE_LIMIT_ENABLED": "false"}
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "src.serve",
+            "--workers",
+            str(workers),
+            "--bind",
+            f"127.0.0.1:{PORT}",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{PORT}/ready", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    stop_server(proc)
+    raise RuntimeError(f"server with {workers} workers did not become ready")
+
+
+def stop_server(proc: subprocess.Popen) -> None:
+    os.killpg(proc.pid, signal.SIGTERM)
+    proc.wait(timeout=30)
+
+
+async def _drive(path: str, concurrency: int, duration: float) -> tuple[list[float], int]:
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits) as client:
+
+        async def loop() -> None:
+            nonlocal errors
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    r = await client.get(path, timeout=10)
+                    ok = r.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def load_process(path: str, concurrency: int, duration: float) -> tuple[list[float], int]:
+    return asyncio.run(_drive(path, concurrency, duration))
+
+
+def run(workers: int, args: argparse.Namespace) -> dict:
+    proc = start_server(workers)
+    try:
+        # Warm the page cache and connections before measuring
+        load_process(args.path, 4, 1.0)
+        per_proc = max(1, args.concurrency // args.load_procs)
+        with ProcessPoolExecutor(args.load_procs) as pool:
+            futures = [
+                pool.submit(load_process, args.path, per_proc, args.duration)
+                for _ in range(args.load_procs)
+            ]
+            results = [f.result() for f in futures]
+    finally:
+        stop_server(proc)
+
+    latencies = sorted(lat for lats, _ in results for lat in lats)
+    errors = sum(err for _, err in results)
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {
+        "workers": workers,
+        "rps": len(latencies) / args.duration,
+        "p50_ms": q[49] * 1000,
+        "p99_ms": q[98] * 1000,
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--path", default="/products")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--load-procs", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    args = parser.parse_args()
+
+    print(f"GET {args.path}, {args.concurrency} connections, {args.load_procs} load procs")
+    print(f"{'workers':>8}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}{'speedup':>9}")
+    baseline = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        row = run(workers, args)
+        if baseline is None:
+            baseline = row["rps"] or 1.0
+        print(
+            f"{row['workers']:>8}{row['rps']:>10.0f}{row['p50_ms']:>9.1f}"
+            f"{row['p99_ms']:>9.1f}{row['errors']:>8}{row['rps'] / baseline:>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
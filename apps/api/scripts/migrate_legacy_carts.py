@@ -0,0 +1,52 @@
+"""Fold carts stored in the old format into the current one, once.
+
+Carts used to be one JSON string under cart:{user_id}; they are now a hash
+under carts:{user_id} (src/modules/cart/service.py). This takes each old key
+with GETDEL, so a concurrent run can't fold a cart twice, and adds its
+quantities to the hash (bumping its version, as any cart change does).
+
+Run once after deploying the hash carts:
+
+    python scripts/migrate_legacy_carts.py [--dry-run]
+
+Old keys expire after CART_TTL_SECONDS, so running it later finds nothing.
+"""
+
+import argparse
+import json
+
+from src.db.redis_client import get_redis, redis_batch
+from src.modules.cart.service import CART_TTL_SECONDS, VERSION_FIELD, _cart_key
+
+LEGACY_PREFIX = "cart:"
+
+
+def fold(legacy_key: str) -> bool:
+    """Fold one old cart into its hash. False if it was already gone."""
+    raw = get_redis().getdel(legacy_key)
+    if raw is None:
+        return False
+    key = _cart_key(legacy_key[len(LEGACY_PREFIX) :])
+    with redis_batch() as batch:
+        for pid, qty in json.loads(raw).items():
+            batch.hincrby(key, pid, int(qty))
+        batch.hincrby(key, VERSION_FIELD, 1)
+        batch.expire(key, CART_TTL_SECONDS)
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dry-run", action="store_true", help="only count the old carts")
+    args = parser.parse_args()
+
+    found = folded = 0
+    for legacy_key in get_redis().scan_iter(match=f"{LEGACY_PREFIX}*", count=1000):
+        found += 1
+        if not args.dry_run and fold(legacy_key):
+            folded += 1
+    print(f"{found} old carts found, {folded} folded")
+
+
+if __name__ == "__main__":
+    main()
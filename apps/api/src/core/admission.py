@@ -0,0 +1,159 @@
+"""Admission control: per-client token buckets plus priority load shedding.
+
+Two checks run before a request reaches the app:
+
+1. Load shedding (local, no I/O). Each process counts its in-flight requests.
+   As that count nears ADMISSION_MAX_IN_FLIGHT, low-priority routes (catalog
+   listing/search) are rejected first, then normal ones. High-priority routes
+   (checkout, pay) are shed only at the hard limit. Rejections are 503 with
+   Retry-After.
+
+2. Rate limiting. A token bucket per client IP lives in Redis and is updated
+   by a Lua script, so each request costs one round trip. Over-limit requests
+   get 429 with Retry-After. If Redis is slow or unavailable, the check fails
+   open.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+from enum import Enum
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.core.config import settings
+from src.core.metrics import HTTP_IN_FLIGHT, HTTP_RATE_LIMITED, HTTP_SHED
+from src.db.redis_client import get_async_redis
+
+EXEMPT_PATHS = {"/health", "/ready", "/metrics", "/docs", "/openapi.json"}
+
+# Returns {allowed, retry_after_ms}. Uses Redis TIME so all API processes
+# share one clock.
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+local allowed = 0
+local retry_ms = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+else
+  retry_ms = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return {allowed, retry_ms}
+"""
+
+
+class Priority(str, Enum):
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
+
+# Export every series from the start (at 0), also when metrics are
+# aggregated across worker processes, where unused labels would be missing
+for _priority in Priority:
+    HTTP_SHED.labels(_priority.value)
+    HTTP_RATE_LIMITED.labels(_priority.value)
+
+
+HIGH_PRIORITY_ROUTES = {("POST", "/orders/checkout"), ("POST", "/payments/pay")}
+LOW_PRIORITY_ROUTES = {("GET", "/products"), ("GET", "/products/top"), ("GET", "/analytics/sales")}
+
+
+def classify(method: str, path: str) -> Priority:
+    route = (method, path.rstrip("/") or "/")
+    if route in HIGH_PRIORITY_ROUTES:
+        return Priority.HIGH
+    if route in LOW_PRIORITY_ROUTES:
+        return Priority.LOW
+    return Priority.NORMAL
+
+
+def in_flight_limit(priority: Priority) -> int:
+    limit = settings.ADMISSION_MAX_IN_FLIGHT
+    if priority == Priority.LOW:
+        return max(1, int(limit * settings.ADMISSION_LOW_PRIORITY_SHARE))
+    if priority == Priority.NORMAL:
+        return max(1, int(limit * settings.ADMISSION_NORMAL_PRIORITY_SHARE))
+    return limit
+
+
+def client_identity(scope: Scope) -> str:
+    # Not the user_id query param: the caller picks it, so one client could
+    # spread its requests over as many buckets as it makes up ids
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # Only touched from the event loop, so a plain int is safe
+        self.in_flight = 0
+        self._script = None
+
+    async def _take_token(self, identity: str) -> int:
+        """Returns 0 if admitted, else the suggested retry delay in ms."""
+        if not settings.RATE_LIMIT_ENABLED:
+            return 0
+        try:
+            if self._script is None:
+                self._script = get_async_redis().register_script(_TOKEN_BUCKET_LUA)
+            allowed, retry_ms = await asyncio.wait_for(
+                self._script(
+                    keys=[f"rl:{identity}"],
+                    args=[settings.RATE_LIMIT_PER_SECOND, settings.RATE_LIMIT_BURST],
+                ),
+                timeout=settings.RATE_LIMIT_REDIS_TIMEOUT_MS / 1000,
+            )
+        except Exception:
+            # Fail open: an unavailable limiter must not take the API down
+            return 0
+        return 0 if allowed else max(1, int(retry_ms))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        priority = classify(scope["method"], scope["path"])
+
+        if self.in_flight >= in_flight_limit(priority):
+            HTTP_SHED.labels(priority.value).inc()
+            response = JSONResponse(
+                {"detail": "Server busy, retry later"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        retry_ms = await self._take_token(client_identity(scope))
+        if retry_ms:
+            HTTP_RATE_LIMITED.labels(priority.value).inc()
+            response = JSONResponse(
+                {"detail": "Too many requests"},
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(retry_ms / 1000))},
+            )
+            await response(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            HTTP_IN_FLIGHT.dec()
@@ -0,0 +1,132 @@
+"""Consecutive-failure circuit breaker for calls to a shared dependency.
+
+CLOSED:    calls go through. Each failure, and each call slower than
+           `slow_call_s`, adds to a consecutive count; a fast success resets
+           it. At `failure_threshold` the breaker opens.
+OPEN:      calls are refused without touching the dependency until
+           `reset_timeout_s` has passed.
+HALF_OPEN: one probe call is let through. If it is fast and succeeds the
+           breaker closes; otherwise it opens again for another timeout.
+
+The state is exported as circuit_breaker_state{name} (0/1/2 as below).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Iterator
+
+from src.core.metrics import CIRCUIT_BREAKER_REJECTED, CIRCUIT_BREAKER_STATE
+
+
+class BreakerState(IntEnum):
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+
+class CallTimer:
+    """How long a tracked call took. restart() leaves out local setup before
+    the dependency is reached (e.g. waiting for a pooled connection)."""
+
+    def __init__(self) -> None:
+        self.start = time.monotonic()
+
+    def restart(self) -> None:
+        self.start = time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        slow_call_s: float,
+        reset_timeout_s: float,
+        failure_exceptions: tuple[type[BaseException], ...] = (Exception,),
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_s = slow_call_s
+        self.reset_timeout_s = reset_timeout_s
+        self.failure_exceptions = failure_exceptions
+        self._lock = threading.Lock()
+        self._state = BreakerState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        CIRCUIT_BREAKER_STATE.labels(name).set(BreakerState.CLOSED)
+
+    @property
+    def state(self) -> BreakerState:
+        return self._state
+
+    def _set_state(self, state: BreakerState) -> None:
+        self._state = state
+        CIRCUIT_BREAKER_STATE.labels(self.name).set(state)
+
+    def _trip(self) -> None:
+        self._set_state(BreakerState.OPEN)
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Whether a call may go to the dependency now."""
+        with self._lock:
+            if self._state == BreakerState.CLOSED:
+                return True
+            if (
+                self._state == BreakerState.OPEN
+                and time.monotonic() - self._opened_at >= self.reset_timeout_s
+            ):
+                self._set_state(BreakerState.HALF_OPEN)
+            if self._state == BreakerState.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+        CIRCUIT_BREAKER_REJECTED.labels(self.name).inc()
+        return False
+
+    def record_success(self, elapsed_s: float) -> None:
+        if elapsed_s >= self.slow_call_s:
+            self.record_failure()
+            return
+        with self._lock:
+            if self._state == BreakerState.HALF_OPEN:
+                self._set_state(BreakerState.CLOSED)
+                self._probe_in_flight = False
+            if self._state == BreakerState.CLOSED:
+                self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == BreakerState.HALF_OPEN:
+                self._trip()
+            elif self._state == BreakerState.CLOSED:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._failures = 0
+                    self._trip()
+
+    @contextmanager
+    def track(self) -> Iterator[CallTimer]:
+        """Time the wrapped call and record its outcome. Call allow() first.
+
+        Exceptions outside `failure_exceptions` (e.g. an error reply) mean the
+        dependency answered, so they count as a success.
+        """
+        timer = CallTimer()
+        try:
+            yield timer
+        except self.failure_exceptions:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.record_success(timer.elapsed())
+            raise
+        self.record_success(timer.elapsed())
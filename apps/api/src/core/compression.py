@@ -0,0 +1,122 @@
+"""Content-Encoding negotiation and codecs for precompressed responses.
+
+gzip is always available; brotli ("br") and zstandard ("zstd") are used when
+their packages are installed. Levels are on the high side because cached
+bodies are compressed once per cache fill and encoding, not per request.
+
+GZipMiddleware gzips, per request, the responses an endpoint left unencoded
+and without an ETag.
+"""
+
+from __future__ import annotations
+
+import gzip
+from typing import Callable
+
+from fastapi import Response
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware as StarletteGZipMiddleware
+from starlette.middleware.gzip import GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None  # type: ignore
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None  # type: ignore
+
+ENCODERS: dict[str, Callable[[bytes], bytes]] = {
+    "gzip": lambda data: gzip.compress(data, compresslevel=9, mtime=0),
+}
+if brotli is not None:
+    ENCODERS["br"] = lambda data: brotli.compress(data, quality=9)
+if zstandard is not None:
+    ENCODERS["zstd"] = lambda data: zstandard.compress(data, 10)
+
+# Server preference when the client accepts several encodings equally
+PREFERENCE = ("br", "zstd", "gzip")
+
+
+def _weights(accept_encoding: str) -> dict[str, float]:
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token.strip().lower()] = q
+    return weights
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """Pick the best available encoding for an Accept-Encoding header (None = identity)."""
+    if not accept_encoding:
+        return None
+
+    weights = _weights(accept_encoding)
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in PREFERENCE:
+        if encoding not in ENCODERS:
+            continue
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def accepts(accept_encoding: str | None, encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows `encoding` (q above 0)."""
+    if not accept_encoding:
+        return False
+    weights = _weights(accept_encoding)
+    return weights.get(encoding, weights.get("*", 0.0)) > 0
+
+
+def encode(data: bytes, encoding: str) -> bytes:
+    return ENCODERS[encoding](data)
+
+
+def json_response(
+    body: bytes, encoding: str | None, headers: dict[str, str] | None = None
+) -> Response:
+    """Response for an already-serialized (and possibly already-encoded) JSON body."""
+    out = {"Vary": "Accept-Encoding", **(headers or {})}
+    if encoding:
+        out["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=out)
+
+
+class GZipMiddleware(StarletteGZipMiddleware):
+    """Starlette's GZipMiddleware, with two differences:
+
+    - Accept-Encoding is parsed, so "gzip;q=0" gets identity;
+    - responses with an ETag pass through like already encoded ones: gzip and
+      identity bodies must not share a strong ETag, and the endpoints that
+      set one either tag each encoding themselves (listings) or serve small
+      bodies (product, order, facets).
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and accepts(Headers(scope=scope).get("accept-encoding"), "gzip"):
+            responder = _GZipResponder(
+                self.app, self.minimum_size, compresslevel=self.compresslevel
+            )
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class _GZipResponder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            self.content_encoding_set |= "etag" in Headers(raw=message["headers"])
@@ -0,0 +1,35 @@
+"""Helpers for ETag / conditional GET handling."""
+
+from fastapi import Response
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison (RFC 9110, section 13.1.2)
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def set_validators(response: Response, etag: str, cache_control: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, etag, cache_control)
+    return response
+
+
+# warn-code 110 (RFC 7234): served from a last-known copy while the origin
+# data is unavailable. no-cache, so clients don't keep reusing it.
+STALE_WARNING = '110 - "Response is Stale"'
+
+
+def mark_stale(response: Response) -> None:
+    if "etag" in response.headers:
+        del response.headers["etag"]
+    response.headers["Warning"] = STALE_WARNING
+    response.headers["Cache-Control"] = "no-cache"
@@ -0,0 +1,95 @@
+"""Redis-backed idempotency for endpoints that accept an Idempotency-Key.
+
+The first request for (scope, owner, key) takes a short Redis lock and runs
+the handler; its JSON response is stored with a TTL. Duplicates get the stored
+response straight from Redis, or wait for the in-flight request to finish.
+Errors are never stored, so a failed attempt can be retried with the same key.
+
+Redis is an accelerator only: if it is unavailable, or a waiter gives up, the
+handler runs anyway and the unique DB constraints remain the backstop.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import uuid
+from typing import Any, Callable
+
+from src.core.config import settings
+from src.db.redis_client import get_redis
+
+# Returns {1, response} if a response is stored, {2, ""} if we took the lock,
+# {0, ""} if another request holds it. One round trip either way.
+_ACQUIRE_LUA = """
+local cached = redis.call('GET', KEYS[1])
+if cached then return {1, cached} end
+if redis.call('SET', KEYS[2], ARGV[1], 'NX', 'PX', ARGV[2]) then return {2, ''} end
+return {0, ''}
+"""
+
+# Stores the response (if any) and releases the lock only if we still own it.
+_COMPLETE_LUA = """
+if ARGV[2] ~= '' then redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3]) end
+if redis.call('GET', KEYS[2]) == ARGV[1] then redis.call('DEL', KEYS[2]) end
+return 1
+"""
+
+_POLL_INTERVAL_S = 0.05
+
+_scripts: dict[str, Any] = {}
+
+
+def _script(name: str, body: str):
+    if name not in _scripts:
+        _scripts[name] = get_redis().register_script(body)
+    return _scripts[name]
+
+
+def _keys(scope: str, owner: str, key: str) -> list[str]:
+    base = f"idem:{scope}:{owner}:{key}"
+    return [base, f"{base}:lock"]
+
+
+def run_idempotent(
+    scope: str,
+    owner: str,
+    key: str | None,
+    handler: Callable[[], dict[str, Any]],
+) -> dict[str, Any]:
+    if not key:
+        return handler()
+
+    keys = _keys(scope, owner, key)
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_MS / 1000
+
+    while True:
+        try:
+            state, cached = _script("acquire", _ACQUIRE_LUA)(
+                keys=keys, args=[token, settings.IDEMPOTENCY_LOCK_TTL_MS]
+            )
+        except Exception:
+            # Redis unavailable: fall back to the DB-backed idempotency path
+            return handler()
+
+        if state == 1:
+            return json.loads(cached)
+        if state == 2:
+            break
+        if time.monotonic() >= deadline:
+            return handler()
+        time.sleep(_POLL_INTERVAL_S)
+
+    stored = ""
+    try:
+        result = handler()
+        stored = json.dumps(result)
+        return result
+    finally:
+        try:
+            _script("complete", _COMPLETE_LUA)(
+                keys=keys, args=[token, stored, settings.IDEMPOTENCY_TTL_S]
+            )
+        except Exception:
+            pass
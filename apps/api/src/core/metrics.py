@@ -0,0 +1,103 @@
+"""Process-wide Prometheus metrics, exposed at GET /metrics.
+
+Under the multi-process server (src/serve.py) PROMETHEUS_MULTIPROC_DIR is
+set, every worker writes its samples there, and /metrics aggregates all of
+them, whichever worker answers the scrape.
+"""
+
+import os
+from contextvars import ContextVar
+
+from fastapi import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Admission control
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being served", multiprocess_mode="livesum"
+)
+HTTP_SHED = Counter(
+    "http_requests_shed_total", "Requests rejected with 503 by load shedding", ["priority"]
+)
+HTTP_RATE_LIMITED = Counter(
+    "http_requests_rate_limited_total", "Requests rejected with 429 by rate limiting", ["priority"]
+)
+
+# Redis usage (a pipeline counts as one round trip carrying several commands)
+REDIS_COMMANDS = Counter("redis_commands_total", "Redis commands sent")
+REDIS_ROUND_TRIPS = Counter("redis_round_trips_total", "Redis network round trips")
+REDIS_ROUND_TRIPS_PER_REQUEST = Histogram(
+    "redis_round_trips_per_request",
+    "Redis round trips made while serving one HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 32),
+)
+
+# Circuit breakers (0 = closed, 1 = open, 2 = half-open)
+CIRCUIT_BREAKER_STATE = Gauge(
+    "circuit_breaker_state", "Circuit breaker state", ["name"], multiprocess_mode="livemax"
+)
+CIRCUIT_BREAKER_REJECTED = Counter(
+    "circuit_breaker_rejected_total", "Calls refused while a circuit breaker was open", ["name"]
+)
+
+# Catalog list page cache: "warmed_hit" is a hit on a page the cache warmer
+# rendered, so warmed hit ratio = warmed_hit / sum over results
+CATALOG_CACHE_LOOKUPS = Counter(
+    "catalog_list_cache_lookups_total", "Catalog list page cache lookups", ["result"]
+)
+for _result in ("hit", "warmed_hit", "miss"):
+    CATALOG_CACHE_LOOKUPS.labels(_result)
+
+# Round trips made by the current request; None outside a request
+_request_round_trips: ContextVar[list[int] | None] = ContextVar("request_round_trips", default=None)
+
+
+def record_redis_round_trip(commands: int = 1) -> None:
+    REDIS_COMMANDS.inc(commands)
+    REDIS_ROUND_TRIPS.inc()
+    counter = _request_round_trips.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class RequestMetricsMiddleware:
+    """Observes per-request Redis round trips, labelled by route template.
+
+    Sync endpoints run in a thread pool; the context (and so the counter) is
+    copied into the worker thread, so their round trips are counted too.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = [0]
+        token = _request_round_trips.set(counter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_round_trips.reset(token)
+            route = scope.get("route")
+            label = getattr(route, "path", None) or "unmatched"
+            REDIS_ROUND_TRIPS_PER_REQUEST.labels(label).observe(counter[0])
+
+
+def metrics_response() -> Response:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -4,16 +4,21 @@ from decimal import Decimal
 from enum import Enum
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
+    Date,
     DateTime,
-    ForeignKey,
+    ForeignKeyConstraint,
+    Index,
     Integer,
     Numeric,
     String,
     Text,
     UniqueConstraint,
     func,
+    text,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.db.base import Base
@@ -32,6 +37,22 @@ class User(Base):
 class Product(Base):
     __tablename__ = "products"
 
+    __table_args__ = (
+        Index("ix_products_active_id", text("id DESC"), postgresql_where=text("is_active")),
+        Index("ix_products_active_price", "price_cents", postgresql_where=text("is_active")),
+        Index(
+            "ix_products_active_currency_price",
+            "currency",
+            "price_cents",
+            postgresql_where=text("is_active"),
+        ),
+        Index(
+            "ix_products_active_in_stock_id",
+            text("id DESC"),
+            postgresql_where=text("is_active AND stock_qty > 0"),
+        ),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     sku: Mapped[str] = mapped_column(String(64), unique=True, index=True, nullable=False)
     name: Mapped[str] = mapped_column(String(200), index=True, nullable=False)
@@ -40,6 +61,9 @@ class Product(Base):
     currency: Mapped[str] = mapped_column(String(8), nullable=False, server_default="USD")
     stock_qty: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
     is_active: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default="true")
+    # Bumped on every update; cached product snapshots carry it, so checkout
+    # can confirm a snapshot is current without re-reading the row
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
@@ -47,23 +71,41 @@ class OrderStatus(str, Enum):
     CREATED = "CREATED"
     PAID = "PAID"
     CANCELLED = "CANCELLED"
+    # Never paid; set by the unpaid order sweeper
+    EXPIRED = "EXPIRED"
 
 
 class PaymentStatus(str, Enum):
     PENDING = "PENDING"
+    AUTHORIZED = "AUTHORIZED"
     SUCCEEDED = "SUCCEEDED"
     FAILED = "FAILED"
 
 
+# orders, order_items and payments are range-partitioned by month on the
+# order's creation time (see src/db/partitions.py). Postgres requires the
+# partition key in every primary key and unique constraint, so keys are
+# (id, created_at), and the children carry order_created_at, so an order and
+# everything hanging off it live in the same month's partitions.
 class Order(Base):
     __tablename__ = "orders"
 
     __table_args__ = (
-        UniqueConstraint("user_id", "idempotency_key", name="uq_orders_user_id_idempotency_key"),
+        Index("ix_orders_user_id_created_at", "user_id", text("created_at DESC"), text("id DESC")),
+        Index(
+            "ix_orders_unpaid_created_at",
+            "created_at",
+            "id",
+            postgresql_where=text("status = 'CREATED'"),
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
+    # created_at is part of the primary key and set by the server, so it has
+    # to come back in the INSERT's RETURNING clause
+    __mapper_args__ = {"eager_defaults": True}
 
-    id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[str] = mapped_column(String(64), index=True, nullable=False)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[str] = mapped_column(String(64), nullable=False)
 
     status: Mapped[str] = mapped_column(
         String(32),
@@ -74,8 +116,17 @@ class Order(Base):
     total_cents: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
     currency: Mapped[str] = mapped_column(String(8), nullable=False, server_default="USD")
 
-    idempotency_key: Mapped[str | None] = mapped_column(String(128), index=True, nullable=True)
-    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # Uniqueness per user is enforced by order_idempotency_keys
+    idempotency_key: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    created_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, server_default=func.now()
+    )
+
+    # Read model: the order's line items, written in the checkout transaction,
+    # so order reads don't join order_items. Status and totals stay in their
+    # columns on this same row. NULL only for orders not yet backfilled
+    # (python -m src.modules.orders.snapshots).
+    snapshot: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
 
     items: Mapped[list["OrderItem"]] = relationship(
         "OrderItem",
@@ -92,17 +143,38 @@ class Order(Base):
     )
 
 
+class OrderIdempotencyKey(Base):
+    """Checkout Idempotency-Keys, unique per user.
+
+    Not partitioned, so the uniqueness holds across all months and a retry is
+    a single primary-key lookup that then points at the order's partition.
+    """
+
+    __tablename__ = "order_idempotency_keys"
+
+    user_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    idempotency_key: Mapped[str] = mapped_column(String(128), primary_key=True)
+    order_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    order_created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
 class OrderItem(Base):
     __tablename__ = "order_items"
 
-    id: Mapped[int] = mapped_column(primary_key=True)
-
-    order_id: Mapped[int] = mapped_column(
-        ForeignKey("orders.id", ondelete="CASCADE"),
-        index=True,
-        nullable=False,
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["order_id", "order_created_at"],
+            ["orders.id", "orders.created_at"],
+            ondelete="CASCADE",
+        ),
+        {"postgresql_partition_by": "RANGE (order_created_at)"},
     )
 
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    order_id: Mapped[int] = mapped_column(Integer, index=True, nullable=False)
+    order_created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), primary_key=True)
+
     product_id: Mapped[int] = mapped_column(Integer, nullable=False)
     sku: Mapped[str] = mapped_column(String(64), nullable=False)
     name: Mapped[str] = mapped_column(String(200), nullable=False)
@@ -119,17 +191,28 @@ class Payment(Base):
 
     __table_args__ = (
         UniqueConstraint(
-            "order_id", "idempotency_key", name="uq_payments_order_id_idempotency_key"
+            "order_id",
+            "order_created_at",
+            "idempotency_key",
+            name="uq_payments_order_id_idempotency_key",
+        ),
+        Index(
+            "ix_payments_in_flight",
+            "id",
+            postgresql_where=text("status IN ('PENDING', 'AUTHORIZED')"),
         ),
+        ForeignKeyConstraint(
+            ["order_id", "order_created_at"],
+            ["orders.id", "orders.created_at"],
+            ondelete="CASCADE",
+        ),
+        {"postgresql_partition_by": "RANGE (order_created_at)"},
     )
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
 
-    order_id: Mapped[int] = mapped_column(
-        ForeignKey("orders.id", ondelete="CASCADE"),
-        index=True,
-        nullable=False,
-    )
+    order_id: Mapped[int] = mapped_column(Integer, index=True, nullable=False)
+    order_created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), primary_key=True)
 
     status: Mapped[str] = mapped_column(
         String(32),
@@ -144,3 +227,66 @@ class Payment(Base):
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     order: Mapped["Order"] = relationship("Order", back_populates="payments")
+
+
+class OutboxStatus(str, Enum):
+    PENDING = "PENDING"
+    DEAD = "DEAD"
+
+
+class OutboxEvent(Base):
+    """Side effect recorded in the same transaction as the write that caused it.
+
+    Drained by the outbox dispatcher; rows are deleted once handled and marked
+    DEAD after OUTBOX_MAX_ATTEMPTS failures.
+    """
+
+    __tablename__ = "outbox_events"
+
+    __table_args__ = (
+        Index(
+            "ix_outbox_events_pending",
+            "available_at",
+            "id",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    event_type: Mapped[str] = mapped_column(String(64), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False, server_default="{}")
+
+    status: Mapped[str] = mapped_column(
+        String(16),
+        nullable=False,
+        server_default=OutboxStatus.PENDING.value,
+    )
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    available_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class SalesDailyRollup(Base):
+    """Sales per product per day (UTC day of the order), kept current by the
+    order transitions themselves (src/modules/analytics/service.py).
+
+    units/revenue_cents count booked orders (CREATED or PAID): added at
+    checkout, taken back on cancel or expiry. paid_units/paid_revenue_cents
+    count PAID orders only, added when a payment captures.
+    """
+
+    __tablename__ = "sales_daily_rollups"
+
+    __table_args__ = (Index("ix_sales_daily_rollups_product_day", "product_id", "day"),)
+
+    day: Mapped[Date] = mapped_column(Date, primary_key=True)
+    product_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    units: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+    revenue_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+    paid_units: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+    paid_revenue_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
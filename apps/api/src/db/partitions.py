@@ -0,0 +1,214 @@
+"""Monthly partition maintenance for orders, order_items and payments.
+
+The three tables are range-partitioned by month on the order's creation time
+(order_items and payments on the copied order_created_at), so one month of
+orders and everything attached to them live in matching partitions:
+orders_pYYYYMM, order_items_pYYYYMM and payments_pYYYYMM.
+
+ensure   creates partitions up to ORDER_PARTITION_MONTHS_AHEAD months ahead,
+         via the ensure_monthly_partitions() SQL function. Rows for a missing
+         month would land in <table>_default, which is a safety net only.
+archive  detaches the partitions of months before a cutoff: children first
+         (their foreign keys to orders are dropped on the detached tables),
+         then orders. Detached tables can be exported to gzipped CSV and
+         dropped. Idempotency keys of archived orders are deleted.
+run      ensure every hour and, if ORDER_RETENTION_MONTHS is set, archive
+         months older than that, until stopped.
+
+    python -m src.db.partitions ensure [--months-ahead 3]
+    python -m src.db.partitions archive --before 2025-01 [--export-dir DIR] [--drop]
+    python -m src.db.partitions run
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import logging
+import re
+import signal
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import Connection, text
+
+from src.core.config import settings
+from src.db.database import get_engine
+
+log = logging.getLogger("db.partitions")
+
+# (table, partition key); orders first so the children never get ahead of it
+PARTITIONED = (
+    ("orders", "created_at"),
+    ("order_items", "order_created_at"),
+    ("payments", "order_created_at"),
+)
+CHILDREN = ("order_items", "payments")
+
+ENSURE_EVERY_S = 3600
+
+
+def _month_start(month: str) -> datetime:
+    return datetime.strptime(month, "%Y%m").replace(tzinfo=timezone.utc)
+
+
+def _next_month(month: str) -> str:
+    year, mon = int(month[:4]), int(month[4:])
+    return f"{year + mon // 12:04d}{mon % 12 + 1:02d}"
+
+
+def _months_before(now: datetime, months: int) -> str:
+    index = now.year * 12 + (now.month - 1) - months
+    return f"{index // 12:04d}{index % 12 + 1:02d}"
+
+
+def ensure_partitions(months_ahead: int) -> int:
+    """Create missing partitions from this month on. Returns how many were created."""
+    created = 0
+    with get_engine().begin() as conn:
+        for table, key in PARTITIONED:
+            created += conn.execute(
+                text("SELECT ensure_monthly_partitions(:table, :key, now(), :ahead)"),
+                {"table": table, "key": key, "ahead": months_ahead},
+            ).scalar_one()
+    return created
+
+
+def attached_months(conn: Connection, parent: str) -> list[str]:
+    """YYYYMM of the monthly partitions currently attached to `parent`."""
+    names = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": parent},
+    ).scalars()
+    pattern = re.compile(rf"^{parent}_p(\d{{6}})$")
+    return sorted(m.group(1) for name in names if (m := pattern.match(name)))
+
+
+def detach_month(month: str) -> list[str]:
+    """Detach one month from all three tables. Returns the detached table names."""
+    detached: list[str] = []
+    with get_engine().begin() as conn:
+        # Wait briefly for the parent locks rather than queueing behind (and
+        # blocking) live traffic for long
+        conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        for child in CHILDREN:
+            part = f"{child}_p{month}"
+            if month not in attached_months(conn, child):
+                continue
+            conn.execute(text(f"ALTER TABLE {child} DETACH PARTITION {part}"))
+            # The detached table keeps a foreign key to orders, which would
+            # block detaching the orders partition its rows point at
+            fks = conn.execute(
+                text(
+                    "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:part AS regclass) "
+                    "AND contype = 'f' AND confrelid = CAST('orders' AS regclass)"
+                ),
+                {"part": part},
+            ).scalars()
+            for fk in list(fks):
+                conn.execute(text(f'ALTER TABLE {part} DROP CONSTRAINT "{fk}"'))
+            detached.append(part)
+
+        if month in attached_months(conn, "orders"):
+            conn.execute(text(f"ALTER TABLE orders DETACH PARTITION orders_p{month}"))
+            detached.append(f"orders_p{month}")
+
+        conn.execute(
+            text(
+                "DELETE FROM order_idempotency_keys "
+                "WHERE order_created_at >= :lo AND order_created_at < :hi"
+            ),
+            {"lo": _month_start(month), "hi": _month_start(_next_month(month))},
+        )
+    return detached
+
+
+def export_table(table: str, export_dir: Path) -> Path:
+    """COPY a (detached) table to <export_dir>/<table>.csv.gz."""
+    export_dir.mkdir(parents=True, exist_ok=True)
+    path = export_dir / f"{table}.csv.gz"
+    raw = get_engine().raw_connection()
+    try:
+        cur = raw.cursor()
+        with gzip.open(path, "wb") as out:
+            with cur.copy(f"COPY {table} TO STDOUT (FORMAT csv, HEADER)") as copy:
+                for chunk in copy:
+                    out.write(chunk)
+        raw.commit()
+    finally:
+        raw.close()
+    return path
+
+
+def archive_before(cutoff: str, export_dir: Path | None, drop: bool) -> list[str]:
+    """Detach (and optionally export and drop) every month before YYYYMM `cutoff`."""
+    with get_engine().connect() as conn:
+        months = [m for m in attached_months(conn, "orders") if m < cutoff]
+    archived: list[str] = []
+    for month in months:
+        tables = detach_month(month)
+        for table in tables:
+            if export_dir is not None:
+                path = export_table(table, export_dir)
+                log.info("exported %s to %s", table, path)
+            if drop:
+                with get_engine().begin() as conn:
+                    conn.execute(text(f"DROP TABLE {table}"))
+        log.info("archived %s (%s)", month, ", ".join(tables))
+        archived.append(month)
+    return archived
+
+
+def run(stopping: threading.Event) -> None:
+    log.info("partition maintenance started")
+    while not stopping.is_set():
+        try:
+            created = ensure_partitions(settings.ORDER_PARTITION_MONTHS_AHEAD)
+            if created:
+                log.info("created %s partitions", created)
+            if settings.ORDER_RETENTION_MONTHS > 0:
+                cutoff = _months_before(datetime.now(timezone.utc), settings.ORDER_RETENTION_MONTHS)
+                export_dir = (
+                    Path(settings.ORDER_ARCHIVE_DIR) if settings.ORDER_ARCHIVE_DIR else None
+                )
+                archive_before(cutoff, export_dir, drop=export_dir is not None)
+        except Exception:
+            log.exception("partition maintenance failed")
+        stopping.wait(ENSURE_EVERY_S)
+    log.info("partition maintenance stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain monthly order partitions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ensure = sub.add_parser("ensure", help="create upcoming monthly partitions")
+    ensure.add_argument("--months-ahead", type=int, default=settings.ORDER_PARTITION_MONTHS_AHEAD)
+    archive = sub.add_parser("archive", help="detach months before a cutoff")
+    archive.add_argument("--before", required=True, help="first month to keep, YYYY-MM")
+    archive.add_argument("--export-dir", type=Path, help="write detached tables as .csv.gz")
+    archive.add_argument("--drop", action="store_true", help="drop detached tables afterwards")
+    sub.add_parser("run", help="keep partitions ensured (and archived) until stopped")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    if args.command == "ensure":
+        log.info("created %s partitions", ensure_partitions(args.months_ahead))
+    elif args.command == "archive":
+        if args.drop and args.export_dir is None:
+            parser.error("--drop requires --export-dir")
+        cutoff = args.before.replace("-", "")
+        archived = archive_before(cutoff, args.export_dir, args.drop)
+        log.info("archived %s months", len(archived))
+    else:
+        stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+        signal.signal(signal.SIGINT, lambda *_: stopping.set())
+        run(stopping)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,227 @@
+import asyncio
 import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
 
 import redis
+import redis.asyncio
+import redis.client
 
-try:
-    # Optional: if your project has settings, we use it as fallback
-    from src.core.config import settings  # type: ignore
-except Exception:
-    settings = None  # type: ignore
+from src.core.circuit_breaker import CallTimer, CircuitBreaker
+from src.core.config import settings
+from src.core.metrics import record_redis_round_trip
 
 _redis_client = None
+_binary_redis_client = None
+_async_redis_client = None
+
+
+class RedisUnavailable(redis.exceptions.ConnectionError):
+    """Raised without a network call while the Redis circuit breaker is open."""
+
+
+# Shared by every request-path client: they all talk to the same server
+redis_breaker = CircuitBreaker(
+    "redis",
+    failure_threshold=settings.REDIS_BREAKER_FAILURE_THRESHOLD,
+    slow_call_s=settings.REDIS_BREAKER_SLOW_CALL_MS / 1000,
+    reset_timeout_s=settings.REDIS_BREAKER_RESET_MS / 1000,
+    failure_exceptions=(
+        redis.exceptions.ConnectionError,
+        redis.exceptions.TimeoutError,
+        asyncio.CancelledError,  # e.g. abandoned by asyncio.wait_for
+    ),
+)
+
+
+# The breaker-tracked call in progress in this thread (or task), if any
+_tracked_call: ContextVar[CallTimer | None] = ContextVar("redis_tracked_call", default=None)
+
+
+@contextmanager
+def _guard(breaker: CircuitBreaker | None) -> Iterator[None]:
+    if breaker is None:
+        yield
+        return
+    if not breaker.allow():
+        raise RedisUnavailable("Redis circuit breaker is open")
+    with breaker.track() as timer:
+        token = _tracked_call.set(timer)
+        try:
+            yield
+        finally:
+            _tracked_call.reset(token)
+
+
+def _sending(commands: int = 1) -> None:
+    # Called once a connection is checked out, right before the commands go
+    # out: a round trip for the metrics, and the breaker's slow-call clock
+    # starts here rather than before the wait for a pooled connection
+    record_redis_round_trip(commands)
+    timer = _tracked_call.get()
+    if timer is not None:
+        timer.restart()
 
 
 def _redis_url() -> str:
-    # 1) Prefer environment variable (docker-compose already sets this)
-    env_url = os.getenv("REDIS_URL")
-    if env_url:
-        return env_url
+    # Prefer the environment variable (docker-compose sets it), then settings
+    return os.getenv("REDIS_URL") or settings.REDIS_URL
+
+
+def _pool_kwargs(**overrides: Any) -> dict[str, Any]:
+    # Bounded pool with explicit timeouts: a slow or unreachable Redis fails a
+    # call within ~REDIS_SOCKET_TIMEOUT_MS instead of hanging the request.
+    kwargs = {
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "timeout": settings.REDIS_POOL_TIMEOUT_MS / 1000,
+        "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT_MS / 1000,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT_MS / 1000,
+        "socket_keepalive": True,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL_S,
+    }
+    kwargs.update(overrides)
+    return kwargs
+
+
+class _CountingPipeline(redis.client.Pipeline):
+    breaker: CircuitBreaker | None = None
+
+    def execute(self, raise_on_error: bool = True):
+        if not self.command_stack:
+            return super().execute(raise_on_error)
+        with _guard(self.breaker):
+            return super().execute(raise_on_error)
+
+    def _execute_pipeline(self, connection, commands, raise_on_error):
+        _sending(len(commands))
+        return super()._execute_pipeline(connection, commands, raise_on_error)
+
+    def _execute_transaction(self, connection, commands, raise_on_error):
+        _sending(len(commands))
+        return super()._execute_transaction(connection, commands, raise_on_error)
+
+    def _send_command_parse_response(self, conn, command_name, *args, **options):
+        _sending()
+        return super()._send_command_parse_response(conn, command_name, *args, **options)
+
+
+class _CountingRedis(redis.Redis):
+    """redis.Redis that reports commands and round trips to metrics and goes
+    through a circuit breaker, if given one."""
+
+    breaker: CircuitBreaker | None = None
+
+    def execute_command(self, *args, **options):
+        with _guard(self.breaker):
+            return super().execute_command(*args, **options)
 
-    # 2) Fallback to settings if it exists
-    if settings is not None and hasattr(settings, "REDIS_URL"):
-        return getattr(settings, "REDIS_URL")
+    def _send_command_parse_response(self, conn, command_name, *args, **options):
+        _sending()
+        return super()._send_command_parse_response(conn, command_name, *args, **options)
 
-    # 3) Last resort default
-    return "redis://redis:6379/0"
+    def pipeline(self, transaction: bool = True, shard_hint: Any = None) -> _CountingPipeline:
+        pipe = _CountingPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+        pipe.breaker = self.breaker
+        return pipe
+
+
+class _CountingAsyncRedis(redis.asyncio.Redis):
+    breaker: CircuitBreaker | None = None
+
+    async def execute_command(self, *args, **options):
+        with _guard(self.breaker):
+            return await super().execute_command(*args, **options)
+
+    async def _send_command_parse_response(self, conn, command_name, *args, **options):
+        _sending()
+        return await super()._send_command_parse_response(conn, command_name, *args, **options)
+
+
+def create_redis(
+    decode_responses: bool = True, breaker: CircuitBreaker | None = None, **overrides: Any
+) -> redis.Redis:
+    """A new client with its own pool, e.g. for blocking reads that need a
+    longer socket timeout than request-path calls (and no breaker, since they
+    are slow by design)."""
+    pool = redis.BlockingConnectionPool.from_url(
+        _redis_url(), decode_responses=decode_responses, **_pool_kwargs(**overrides)
+    )
+    client = _CountingRedis(connection_pool=pool)
+    client.breaker = breaker
+    return client
 
 
 def get_redis():
     global _redis_client
     if _redis_client is None:
-        _redis_client = redis.Redis.from_url(_redis_url(), decode_responses=True)
+        _redis_client = create_redis(decode_responses=True, breaker=redis_breaker)
     return _redis_client
 
 
+def get_binary_redis():
+    # Same server, but values come back as bytes (compressed payloads)
+    global _binary_redis_client
+    if _binary_redis_client is None:
+        _binary_redis_client = create_redis(decode_responses=False, breaker=redis_breaker)
+    return _binary_redis_client
+
+
+def get_async_redis():
+    # For code running on the event loop (e.g. middleware), where a blocking
+    # client would stall every request on the worker.
+    global _async_redis_client
+    if _async_redis_client is None:
+        pool = redis.asyncio.BlockingConnectionPool.from_url(
+            _redis_url(), decode_responses=True, **_pool_kwargs()
+        )
+        _async_redis_client = _CountingAsyncRedis(connection_pool=pool)
+        _async_redis_client.breaker = redis_breaker
+    return _async_redis_client
+
+
+def _after_fork_in_child() -> None:
+    # Each process needs its own connections (the async pool is also bound
+    # to the parent's event loop); new clients are created on first use
+    global _redis_client, _binary_redis_client, _async_redis_client
+    _redis_client = _binary_redis_client = _async_redis_client = None
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class RedisBatch:
+    """Commands queued on a non-transactional pipeline.
+
+    Call client methods on the batch as usual; they are sent together when the
+    `with redis_batch()` block exits and their replies land in `results`, in
+    order.
+    """
+
+    def __init__(self, pipe: redis.client.Pipeline):
+        self.pipe = pipe
+        self.results: list[Any] = []
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.pipe, name)
+
+
+@contextmanager
+def redis_batch(binary: bool = False) -> Iterator[RedisBatch]:
+    """Send several (possibly multi-key) commands in one round trip.
+
+    with redis_batch() as batch:
+        batch.get("a")
+        batch.hgetall("b")
+    a, b = batch.results
+    """
+    client = get_binary_redis() if binary else get_redis()
+    batch = RedisBatch(client.pipeline(transaction=False))
+    yield batch
+    batch.results = batch.pipe.execute() if batch.pipe.command_stack else []
+
+
 def ping_redis():
     return get_redis().ping()
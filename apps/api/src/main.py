@@ -1,22 +1,110 @@
-from fastapi import FastAPI
+"""ASGI app factory: uvicorn --factory src.main:create_app"""
 
+import asyncio
+import math
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator
+
+import redis
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from src.core.admission import AdmissionControlMiddleware
+from src.core.compression import GZipMiddleware
+from src.core.config import settings
+from src.core.metrics import RequestMetricsMiddleware, metrics_response
+from src.db.database import UNAVAILABLE_ERRORS
+from src.modules.analytics.router import router as analytics_router
 from src.modules.auth.router import router as auth_router
 from src.modules.cart.router import router as cart_router
 from src.modules.catalog.router import router as catalog_router
 from src.modules.orders.router import router as orders_router
 from src.modules.payments.router import router as payments_router
+from src.warmup import check_dependencies, warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Warm up in the background: the process serves /health (liveness) right
+    # away, and /ready flips once warm-up has finished
+    app.state.ready = False
+    task = asyncio.create_task(warm_up(app))
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+def redis_unavailable(request: Request, exc: Exception):
+    # Reached only by paths that need Redis (e.g. the cart); cache reads fall
+    # back to Postgres. Includes fast failures while the breaker is open.
+    return JSONResponse(
+        {"detail": "Temporarily unavailable, retry later"},
+        status_code=503,
+        headers={"Retry-After": str(math.ceil(settings.REDIS_BREAKER_RESET_MS / 1000))},
+    )
+
 
-app = FastAPI(title="AmazonLite API", version="0.1.0")
+def database_unavailable(request: Request, exc: Exception):
+    # Postgres is down (or the breaker is open): fail fast instead of
+    # queueing on connection timeouts. Catalog reads fall back to cached
+    # copies before getting here.
+    return JSONResponse(
+        {"detail": "Temporarily unavailable, retry later"},
+        status_code=503,
+        headers={"Retry-After": str(math.ceil(settings.DB_BREAKER_RESET_MS / 1000))},
+    )
 
 
-@app.get("/health")
 def health():
     return {"ok": True}
 
 
-# routers MUST come after app is created
-app.include_router(auth_router)
-app.include_router(catalog_router)
-app.include_router(cart_router)
-app.include_router(orders_router)
-app.include_router(payments_router)
+def ready(request: Request):
+    if not request.app.state.ready:
+        return JSONResponse({"ready": False, "checks": {"warm_up": "pending"}}, status_code=503)
+    checks = check_dependencies()
+    healthy = [status == "ok" for status in checks.values()]
+    # One dependency down still leaves a useful (degraded) instance: without
+    # Postgres the catalog is served from cached copies and writes get a
+    # fast 503; without Redis everything but the cart works from Postgres.
+    ok = any(healthy)
+    return JSONResponse(
+        {"ready": ok, "degraded": not all(healthy), "checks": checks},
+        status_code=200 if ok else 503,
+    )
+
+
+def metrics():
+    return metrics_response()
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(title="AmazonLite API", version="0.1.0", lifespan=lifespan)
+    # On-the-fly gzip for uncached endpoints; responses that already carry a
+    # Content-Encoding (precompressed catalog pages) or an ETag pass through.
+    app.add_middleware(GZipMiddleware, minimum_size=settings.COMPRESSION_MIN_BYTES, compresslevel=5)
+    # Added last so it runs first: shed/limit before doing any other work
+    app.add_middleware(AdmissionControlMiddleware)
+    # Outermost, so the rate limiter's Redis round trip is counted too
+    app.add_middleware(RequestMetricsMiddleware)
+
+    app.add_exception_handler(redis.exceptions.ConnectionError, redis_unavailable)
+    app.add_exception_handler(redis.exceptions.TimeoutError, redis_unavailable)
+    for exc in UNAVAILABLE_ERRORS:
+        app.add_exception_handler(exc, database_unavailable)
+
+    # Liveness: the process is up. Readiness: warmed up and dependencies reachable.
+    app.add_api_route("/health", health, methods=["GET"])
+    app.add_api_route("/ready", ready, methods=["GET"])
+    app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+
+    app.include_router(auth_router)
+    app.include_router(catalog_router)
+    app.include_router(cart_router)
+    app.include_router(orders_router)
+    app.include_router(payments_router)
+    app.include_router(analytics_router)
+    return app
@@ -0,0 +1,91 @@
+"""Rebuild sales_daily_rollups from orders and order_items, a day at a time.
+
+Needed once for orders placed before the rollups existed, and to repair
+them. Each day is recomputed in its own transaction (delete the day's rows,
+aggregate its orders) under a SHARE ROW EXCLUSIVE lock on the rollups
+table. The lock waits for transactions that have already applied their
+lines, and holds back new ones until the day is written; those then apply
+their lines on top. So live traffic is neither lost nor counted twice. It
+only pauses order transitions for as long as one day takes.
+
+    python -m src.modules.analytics.backfill [--from 2025-01-01] [--to 2025-12-31]
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+from datetime import time as dtime
+
+from sqlalchemy import text
+
+from src.db.database import SessionLocal
+
+log = logging.getLogger("analytics.backfill")
+
+_REBUILD_DAY = text(
+    """
+    INSERT INTO sales_daily_rollups
+        (day, product_id, units, revenue_cents, paid_units, paid_revenue_cents)
+    SELECT :day, oi.product_id,
+           coalesce(sum(oi.qty) FILTER (WHERE o.status IN ('CREATED', 'PAID')), 0),
+           coalesce(sum(oi.line_total_cents) FILTER (WHERE o.status IN ('CREATED', 'PAID')), 0),
+           coalesce(sum(oi.qty) FILTER (WHERE o.status = 'PAID'), 0),
+           coalesce(sum(oi.line_total_cents) FILTER (WHERE o.status = 'PAID'), 0)
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.id AND oi.order_created_at = o.created_at
+    WHERE o.created_at >= :start AND o.created_at < :end
+      AND oi.order_created_at >= :start AND oi.order_created_at < :end
+    GROUP BY oi.product_id
+    """
+)
+
+
+def rebuild_day(day: date) -> int:
+    """Recompute one UTC day's rollups. Returns the product rows written."""
+    start = datetime.combine(day, dtime.min, tzinfo=timezone.utc)
+    with SessionLocal() as db:
+        db.execute(text("LOCK TABLE sales_daily_rollups IN SHARE ROW EXCLUSIVE MODE"))
+        db.execute(text("DELETE FROM sales_daily_rollups WHERE day = :day"), {"day": day})
+        written = db.execute(
+            _REBUILD_DAY, {"day": day, "start": start, "end": start + timedelta(days=1)}
+        ).rowcount
+        db.commit()
+    return written
+
+
+def first_order_day() -> date | None:
+    with SessionLocal() as db:
+        first = db.execute(text("SELECT min(created_at) FROM orders")).scalar()
+    return first.astimezone(timezone.utc).date() if first else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild daily sales rollups from orders")
+    parser.add_argument("--from", dest="from_day", type=date.fromisoformat)
+    parser.add_argument("--to", dest="to_day", type=date.fromisoformat)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    day = args.from_day or first_order_day()
+    last = args.to_day or datetime.now(timezone.utc).date()
+    if day is None:
+        log.info("no orders, nothing to backfill")
+        return
+
+    days = rows = 0
+    started = time.perf_counter()
+    while day <= last:
+        t0 = time.perf_counter()
+        written = rebuild_day(day)
+        log.info("%s: %s products (%.0f ms)", day, written, (time.perf_counter() - t0) * 1000)
+        days += 1
+        rows += written
+        day += timedelta(days=1)
+    log.info("rebuilt %s days, %s rows in %.1fs", days, rows, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from src.db.database import get_db
+from src.modules.analytics.schemas import SalesResponse
+from src.modules.analytics.service import SALES_COLUMNS, daily_sales, top_products
+from src.modules.catalog.service import load_products
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 366
+
+
+@router.get("/sales", response_model=SalesResponse)
+def get_sales(
+    db: Session = Depends(get_db),
+    from_day: date | None = Query(None, alias="from"),
+    to_day: date | None = Query(None, alias="to"),
+    product_id: int | None = Query(None),
+    top: int = Query(10, ge=0, le=100),
+    by: Literal["revenue", "units"] = Query("revenue"),
+):
+    # Served from sales_daily_rollups: at most one row per product and day
+    to_day = to_day or datetime.now(timezone.utc).date()
+    from_day = from_day or to_day - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if from_day > to_day:
+        raise HTTPException(status_code=422, detail="from must not be after to")
+    if (to_day - from_day).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=422, detail=f"at most {MAX_RANGE_DAYS} days at a time")
+
+    days = daily_sales(db, from_day, to_day, product_id)
+    totals = {c: sum(day[c] for day in days) for c in SALES_COLUMNS}
+
+    ranked = top_products(db, from_day, to_day, top, by) if top and product_id is None else []
+    products = load_products(db, [row["product_id"] for row in ranked])
+    for row in ranked:
+        product = products.get(row["product_id"])
+        if product:
+            row["sku"], row["name"] = product["sku"], product["name"]
+
+    return {
+        "from_day": from_day,
+        "to_day": to_day,
+        "product_id": product_id,
+        "totals": totals,
+        "days": days,
+        "top_products": ranked,
+    }
@@ -0,0 +1,30 @@
+from datetime import date
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class SalesTotals(BaseModel):
+    units: int = 0
+    revenue_cents: int = 0
+    paid_units: int = 0
+    paid_revenue_cents: int = 0
+
+
+class DailySales(SalesTotals):
+    day: date
+
+
+class ProductSales(SalesTotals):
+    product_id: int
+    sku: Optional[str] = None
+    name: Optional[str] = None
+
+
+class SalesResponse(BaseModel):
+    from_day: date
+    to_day: date
+    product_id: Optional[int] = None
+    totals: SalesTotals
+    days: List[DailySales]
+    top_products: List[ProductSales]
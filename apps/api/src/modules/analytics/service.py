@@ -0,0 +1,99 @@
+"""Daily sales rollups (sales_daily_rollups): writes and reads.
+
+Every order transition that changes what was sold applies its order's lines
+to the rollups in its own transaction, so they are always exactly as current
+as the orders: checkout books them, cancel and expiry take them back, a
+captured payment adds them to the paid columns. Reads then aggregate at most
+one row per product per day instead of order_items.
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Upserted in key order, so transitions touching the same products can't
+# deadlock on the rollup rows
+_APPLY_SALES = text(
+    """
+    INSERT INTO sales_daily_rollups AS r
+        (day, product_id, units, revenue_cents, paid_units, paid_revenue_cents)
+    SELECT (oi.order_created_at AT TIME ZONE 'UTC')::date, oi.product_id,
+           :booked * sum(oi.qty), :booked * sum(oi.line_total_cents),
+           :paid * sum(oi.qty), :paid * sum(oi.line_total_cents)
+    FROM unnest(CAST(:ids AS integer[]), CAST(:created_ats AS timestamptz[])) AS o(id, created_at)
+    JOIN order_items oi ON oi.order_id = o.id AND oi.order_created_at = o.created_at
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (day, product_id) DO UPDATE SET
+        units = r.units + excluded.units,
+        revenue_cents = r.revenue_cents + excluded.revenue_cents,
+        paid_units = r.paid_units + excluded.paid_units,
+        paid_revenue_cents = r.paid_revenue_cents + excluded.paid_revenue_cents
+    """
+)
+
+SALES_COLUMNS = ("units", "revenue_cents", "paid_units", "paid_revenue_cents")
+
+_SUMS = ", ".join(f"sum({c})::bigint AS {c}" for c in SALES_COLUMNS)
+
+TOP_ORDER = {"revenue": "revenue_cents", "units": "units"}
+
+
+def record_sales(
+    db: Session,
+    orders: Sequence[Tuple[int, datetime]],
+    booked: int = 0,
+    paid: int = 0,
+) -> None:
+    """Apply the lines of `orders` ((id, created_at) pairs) to the rollups, in
+    the caller's transaction. booked/paid: 1 adds them, -1 takes them back.
+
+    Reads order_items, so flush new items first.
+    """
+    if not orders:
+        return
+    db.execute(
+        _APPLY_SALES,
+        {
+            "ids": [order_id for order_id, _ in orders],
+            "created_ats": [created_at for _, created_at in orders],
+            "booked": booked,
+            "paid": paid,
+        },
+    )
+
+
+def daily_sales(
+    db: Session, start: date, end: date, product_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Totals per day in [start, end], for one product or all of them."""
+    product_filter = "AND product_id = :product_id" if product_id is not None else ""
+    rows = db.execute(
+        text(
+            f"SELECT day, {_SUMS} FROM sales_daily_rollups "
+            f"WHERE day BETWEEN :start AND :end {product_filter} "
+            "GROUP BY day ORDER BY day"
+        ),
+        {"start": start, "end": end, "product_id": product_id},
+    ).mappings()
+    return [dict(row) for row in rows]
+
+
+def top_products(
+    db: Session, start: date, end: date, limit: int, by: str = "revenue"
+) -> List[Dict[str, Any]]:
+    """The `limit` best-selling products over [start, end], by revenue or units."""
+    order = TOP_ORDER[by]
+    rows = db.execute(
+        text(
+            f"SELECT product_id, {_SUMS} FROM sales_daily_rollups "
+            "WHERE day BETWEEN :start AND :end "
+            f"GROUP BY product_id ORDER BY {order} DESC, product_id LIMIT :limit"
+        ),
+        {"start": start, "end": end, "limit": limit},
+    ).mappings()
+    return [dict(row) for row in rows]
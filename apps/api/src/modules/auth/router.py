@@ -1,96 +1,488 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import hashlib
+import json
+from dataclasses import asdict, replace
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from src.db.database import get_db
+from src.core.compression import ENCODERS, encode, json_response, negotiate
+from src.core.config import settings
+from src.core.http_cache import etag_matches, mark_stale, not_modified, set_validators
+from src.core.metrics import CATALOG_CACHE_LOOKUPS
+from src.db.database import UNAVAILABLE_ERRORS, get_db
 from src.db.models import Product
-from src.db.redis_client import get_redis
-from src.modules.catalog.cache import get_cache_json, set_cache_json
+from src.modules.catalog.bestsellers import Window, ranked_products
+from src.modules.catalog.cache import (
+    FACETS_CACHE_TTL_S,
+    add_cached_encoding,
+    get_cache_json,
+    get_cached_body,
+    get_cached_page,
+    get_catalog_generation,
+    get_stale_product,
+    invalidate_products_cache,
+    set_cache_json,
+    set_cached_body,
+)
 from src.modules.catalog.schemas import (
+    ProductBatchGetRequest,
+    ProductBatchGetResponse,
     ProductCreate,
+    ProductFacetsResponse,
     ProductListResponse,
     ProductResponse,
     ProductUpdate,
+    TopProductsResponse,
 )
+from src.modules.catalog.service import (
+    ProductFilters,
+    load_products,
+    product_facets,
+    product_page,
+)
+from src.modules.catalog.snapshot import CatalogSnapshot, get_catalog_snapshot
+from src.modules.outbox.service import CATALOG_INVALIDATE, enqueue_event
 
 router = APIRouter(prefix="/products", tags=["catalog"])
 
+DEFAULT_PAGE_SIZE = 20
+LIST_CACHE_TTL_S = 30
+
 
 # -------------------------
 # Cache invalidation helper
 # -------------------------
-def _invalidate_products_cache() -> None:
+def _invalidate_products_cache(db: Session, product_ids: list[int] | None = None) -> None:
+    # Recorded in the caller's transaction, so an invalidation can't be lost:
+    # the outbox dispatcher drops the cached pages (and the given products'
+    # entries) after commit, even if Redis was down when the write happened.
+    enqueue_event(db, CATALOG_INVALIDATE, {"product_ids": product_ids} if product_ids else None)
+
+
+def _invalidate_committed(product_ids: list[int] | None = None) -> None:
+    # Called right after the commit, so conditional GETs stop answering 304
+    # for the old catalog now rather than when the dispatcher next polls.
+    # Best effort: the outbox event above retries it (one extra bump).
     try:
-        r = get_redis()
-        keys = r.keys("products:list:*")
-        if keys:
-            r.delete(*keys)
+        invalidate_products_cache(product_ids)
     except Exception:
-        # Never break core functionality if Redis fails
         pass
 
 
+# -------------------------
+# Listing filters
+# -------------------------
+def product_filters(
+    q: str | None = Query(None, min_length=1, max_length=200),
+    active_only: bool = Query(True),
+    min_price_cents: int | None = Query(None, ge=0),
+    max_price_cents: int | None = Query(None, ge=0),
+    currency: str | None = Query(None, min_length=3, max_length=8),
+    in_stock: bool = Query(False),
+) -> ProductFilters:
+    if (
+        min_price_cents is not None
+        and max_price_cents is not None
+        and min_price_cents > max_price_cents
+    ):
+        raise HTTPException(
+            status_code=422, detail="min_price_cents must not be greater than max_price_cents"
+        )
+    return ProductFilters(
+        q=q,
+        active_only=active_only,
+        min_price_cents=min_price_cents,
+        max_price_cents=max_price_cents,
+        currency=currency.upper() if currency else None,
+        in_stock=in_stock,
+    )
+
+
 # -------------------------
 # List products (cached)
 # -------------------------
 @router.get("", response_model=ProductListResponse)
 def list_products(
     db: Session = Depends(get_db),
-    limit: int = Query(20, ge=1, le=100),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    q: str | None = Query(None, min_length=1, max_length=200),
-    active_only: bool = Query(True),
+    filters: ProductFilters = Depends(product_filters),
+    sort: Literal["newest", "popular"] = Query("newest"),
+    if_none_match: str | None = Header(None),
+    accept_encoding: str | None = Header(None),
 ):
-    cache_key = f"products:list:limit={limit}:offset={offset}:q={q}:active={active_only}"
+    if sort == "popular":
+        return _popular_page(db, limit, offset, filters)
+
+    encoding = negotiate(accept_encoding)
+
+    # From this worker's memory, if the catalog snapshot is enabled
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None and filters == ProductFilters():
+        return _snapshot_list_response(snapshot, limit, offset, encoding, if_none_match)
+
+    # The catalog generation is a cheap version stamp for every listing:
+    # a matching ETag is answered before touching the cache payload or DB.
+    generation = get_catalog_generation()
+    tag = None
+    if generation is not None:
+        tag = f"c{generation}"
+        not_modified_response = _list_not_modified(tag, encoding, if_none_match)
+        if not_modified_response is not None:
+            return not_modified_response
+
+    cache_key = _list_cache_key(generation, limit, offset, filters)
+
+    # Try Redis cache first (safe). Compressed variants are cached next to
+    # the raw JSON, so a hit is served without re-serializing or recompressing
+    # (counting the request for the cache warmer in the same round trip).
+    if generation is not None:
+        try:
+            body, encoded, warmed = get_cached_page(
+                cache_key, encoding, _popularity_member(limit, offset, filters)
+            )
+            CATALOG_CACHE_LOOKUPS.labels(
+                "miss" if body is None else "warmed_hit" if warmed else "hit"
+            ).inc()
+            if body is not None:
+                if encoding and encoded is None and len(body) >= settings.COMPRESSION_MIN_BYTES:
+                    encoded = encode(body, encoding)
+                    add_cached_encoding(cache_key, encoding, encoded)
+                return _list_response(body, encoding, encoded, tag)
+        except Exception:
+            pass
 
-    # Try Redis cache first (safe)
     try:
-        cached = get_cache_json(cache_key)
-        if cached:
-            return ProductListResponse(**cached)
-    except Exception:
-        pass
+        body = _list_page_body(db, filters, limit, offset)
+    except UNAVAILABLE_ERRORS:
+        # Degraded mode: Postgres is down, serve the last-known page if any
+        stale = _stale_list_response(limit, offset, filters, encoding)
+        if stale is None:
+            raise
+        return stale
+    encoded = None
+    if encoding and len(body) >= settings.COMPRESSION_MIN_BYTES:
+        encoded = encode(body, encoding)
+
+    # Store in Redis (safe)
+    if generation is not None:
+        try:
+            set_cached_body(
+                cache_key,
+                body,
+                ttl_seconds=LIST_CACHE_TTL_S,
+                encoded={encoding: encoded} if encoded is not None else None,
+                stale_key=_list_stale_key(limit, offset, filters),
+            )
+        except Exception:
+            pass
 
-    # DB query
-    query = db.query(Product)
+    return _list_response(body, encoding, encoded, tag)
 
-    if active_only:
-        query = query.filter(Product.is_active.is_(True))
 
-    if q:
-        like = f"%{q}%"
-        query = query.filter((Product.name.ilike(like)) | (Product.sku.ilike(like)))
+def _list_cache_key(
+    generation: int | None, limit: int, offset: int, filters: ProductFilters
+) -> str:
+    return f"products:list:g={generation}:limit={limit}:offset={offset}:{filters.cache_key()}"
+
+
+def _list_stale_key(limit: int, offset: int, filters: ProductFilters) -> str:
+    # Not per generation: the last page written for these parameters
+    return f"products:stale:list:limit={limit}:offset={offset}:{filters.cache_key()}"
+
+
+def _stale_list_response(
+    limit: int, offset: int, filters: ProductFilters, encoding: str | None
+) -> Response | None:
+    try:
+        body, encoded = get_cached_body(_list_stale_key(limit, offset, filters), encoding)
+    except Exception:
+        return None
+    if body is None:
+        return None
+    if encoding and encoded is None and len(body) >= settings.COMPRESSION_MIN_BYTES:
+        encoded = encode(body, encoding)
+    response = _list_response(body, encoding, encoded, None)
+    mark_stale(response)
+    return response
+
+
+def _list_page_body(db: Session, filters: ProductFilters, limit: int, offset: int) -> bytes:
+    query = filters.apply(db.query(Product))
 
     total = query.with_entities(func.count(Product.id)).scalar() or 0
-    items = query.order_by(Product.id.desc()).limit(limit).offset(offset).all()
+    items = product_page(query, limit, offset).all()
 
-    response = ProductListResponse(
-        items=items,
-        limit=limit,
-        offset=offset,
-        total=total,
+    return (
+        ProductListResponse(
+            items=items,
+            limit=limit,
+            offset=offset,
+            total=total,
+        )
+        .model_dump_json()
+        .encode()
     )
 
-    # Store in Redis (safe)
+
+def _snapshot_list_response(
+    snapshot: CatalogSnapshot,
+    limit: int,
+    offset: int,
+    encoding: str | None,
+    if_none_match: str | None,
+) -> Response:
+    items, total = snapshot.page(limit, offset)
+    body = json.dumps(
+        {"items": items, "limit": limit, "offset": offset, "total": total}, separators=(",", ":")
+    ).encode()
+    # Tagged by content, not by catalog generation: the snapshot follows the
+    # change feed, which doesn't wait for the generation bump (or vice versa)
+    tag = f"s{hashlib.blake2b(body, digest_size=8).hexdigest()}"
+    not_modified_response = _list_not_modified(tag, encoding, if_none_match)
+    if not_modified_response is not None:
+        return not_modified_response
+    encoded = None
+    if encoding and len(body) >= settings.COMPRESSION_MIN_BYTES:
+        encoded = encode(body, encoding)
+    return _list_response(body, encoding, encoded, tag)
+
+
+def _popular_page(
+    db: Session, limit: int, offset: int, filters: ProductFilters
+) -> ProductListResponse:
+    # Ranked by units sold in the last 24h: one ZREVRANGE for the page and a
+    # batched load of its products. The ranking can't be filtered in Redis,
+    # so only active_only applies (inactive products are left off the page).
+    if replace(filters, active_only=True) != ProductFilters():
+        raise HTTPException(status_code=422, detail="sort=popular does not support filters")
+    ranked, total = ranked_products("24h", offset, limit)
+    found = load_products(db, [pid for pid, _ in ranked])
+    items = [
+        found[pid]
+        for pid, _ in ranked
+        if pid in found and (found[pid]["is_active"] or not filters.active_only)
+    ]
+    return ProductListResponse(items=items, limit=limit, offset=offset, total=total)
+
+
+def _list_etag(tag: str, encoding: str | None) -> str:
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def _list_not_modified(
+    tag: str, encoding: str | None, if_none_match: str | None
+) -> Response | None:
+    # Either tag: a page under COMPRESSION_MIN_BYTES was sent as identity,
+    # and revalidates with the plain one whatever the client accepts
+    for etag in (_list_etag(tag, encoding), _list_etag(tag, None)):
+        if etag_matches(if_none_match, etag):
+            response = not_modified(etag, settings.CATALOG_CACHE_CONTROL)
+            response.headers["Vary"] = "Accept-Encoding"
+            return response
+    return None
+
+
+def _list_response(
+    body: bytes, encoding: str | None, encoded: bytes | None, tag: str | None
+) -> Response:
+    # The ETag names an encoding only if the body went out in it
+    headers: dict[str, str] = {}
+    if tag is not None:
+        etag = _list_etag(tag, encoding if encoded is not None else None)
+        headers = {"ETag": etag, "Cache-Control": settings.CATALOG_CACHE_CONTROL}
+    if encoded is not None:
+        return json_response(encoded, encoding, headers)
+    return json_response(body, None, headers)
+
+
+# -------------------------
+# Facet counts (cached)
+# -------------------------
+@router.get("/facets", response_model=ProductFacetsResponse)
+def get_product_facets(
+    response: Response,
+    db: Session = Depends(get_db),
+    filters: ProductFilters = Depends(product_filters),
+    if_none_match: str | None = Header(None),
+):
+    # Computed once per catalog generation and filter set, not per page view
+    generation = get_catalog_generation()
+    if generation is None:
+        return product_facets(db, filters)
+
+    etag = f'"f{generation}"'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, settings.CATALOG_CACHE_CONTROL)
+    set_validators(response, etag, settings.CATALOG_CACHE_CONTROL)
+
+    cache_key = _facets_cache_key(generation, filters)
     try:
-        set_cache_json(cache_key, response.model_dump(), ttl_seconds=30)
+        cached = get_cache_json(cache_key)
+        if cached is not None:
+            return cached
     except Exception:
         pass
 
-    return response
+    facets = product_facets(db, filters)
+    try:
+        set_cache_json(cache_key, facets, ttl_seconds=FACETS_CACHE_TTL_S)
+    except Exception:
+        pass
+    return facets
+
+
+def _facets_cache_key(generation: int, filters: ProductFilters) -> str:
+    return f"products:facets:g={generation}:{filters.cache_key()}"
+
+
+# -------------------------
+# Best sellers
+# -------------------------
+@router.get("/top", response_model=TopProductsResponse)
+def top_products(
+    db: Session = Depends(get_db),
+    window: Window = Query("24h"),
+    limit: int = Query(10, ge=1, le=100),
+):
+    # One ZREVRANGE of the window's ranking, then one batched product load
+    ranked, _ = ranked_products(window, 0, limit)
+    found = load_products(db, [pid for pid, _ in ranked])
+    items = [
+        {**found[pid], "units_sold": units}
+        for pid, units in ranked
+        if pid in found and found[pid]["is_active"]
+    ]
+    return {"window": window, "items": items}
+
+
+# -------------------------
+# Cache warm-up
+# -------------------------
+def prime_catalog_cache(db: Session, pages: int) -> int:
+    """Cache the first `pages` pages of the default listing, in every encoding,
+    plus their products and the default facets. Returns the pages cached.
+
+    Run at startup, so the first storefront requests after a deploy are hits.
+    """
+    generation = get_catalog_generation()
+    if generation is None:
+        return 0
+
+    filters = ProductFilters()
+    for page in range(pages):
+        render_list_page(db, generation, DEFAULT_PAGE_SIZE, page * DEFAULT_PAGE_SIZE, filters)
+
+    set_cache_json(
+        _facets_cache_key(generation, filters),
+        product_facets(db, filters),
+        ttl_seconds=FACETS_CACHE_TTL_S,
+    )
+    return pages
+
+
+def render_list_page(
+    db: Session,
+    generation: int,
+    limit: int,
+    offset: int,
+    filters: ProductFilters,
+    warmed: bool = False,
+) -> None:
+    """Cache one listing page for `generation`, in every encoding, and its products."""
+    body = _list_page_body(db, filters, limit, offset)
+    encoded = None
+    if len(body) >= settings.COMPRESSION_MIN_BYTES:
+        encoded = {name: encode(body, name) for name in ENCODERS}
+    set_cached_body(
+        _list_cache_key(generation, limit, offset, filters),
+        body,
+        ttl_seconds=LIST_CACHE_TTL_S,
+        encoded=encoded,
+        stale_key=_list_stale_key(limit, offset, filters),
+        warmed=warmed,
+    )
+    load_products(db, [item["id"] for item in json.loads(body)["items"]])
+
+
+def _popularity_member(limit: int, offset: int, filters: ProductFilters) -> str:
+    return json.dumps({"limit": limit, "offset": offset, **asdict(filters)}, sort_keys=True)
+
+
+def parse_popularity_member(member: str | bytes) -> tuple[int, int, ProductFilters]:
+    """(limit, offset, filters) of a listing page counted in the popularity set."""
+    params = json.loads(member)
+    return params.pop("limit"), params.pop("offset"), ProductFilters(**params)
+
+
+def list_cache_key(generation: int, member: str | bytes) -> str:
+    """Cache key of the page for a popularity set member."""
+    limit, offset, filters = parse_popularity_member(member)
+    return _list_cache_key(generation, limit, offset, filters)
 
 
 # -------------------------
 # Get single product
 # -------------------------
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+def get_product(
+    product_id: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    if_none_match: str | None = Header(None),
+):
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        product = snapshot.get(product_id)
+        if product is not None:
+            return _product_response(response, product, if_none_match)
+
+    # Through the product cache, which also keeps the last-known copy
+    try:
+        product = load_products(db, [product_id]).get(product_id)
+    except UNAVAILABLE_ERRORS:
+        try:
+            cached = get_stale_product(product_id)
+        except Exception:
+            cached = None
+        if cached is None:
+            raise
+        mark_stale(response)
+        return json.loads(cached)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    return _product_response(response, product, if_none_match)
+
+
+def _product_response(response: Response, product: dict, if_none_match: str | None):
+    # Tagged with the version of the copy being served (snapshot or cache),
+    # so an ETag never stands for a body other than the one sent with it
+    version = product.get("version")
+    if version is None:
+        return product  # cached before products were versioned
+    etag = f'"p{product["id"]}.v{version}"'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, settings.CATALOG_CACHE_CONTROL)
+    set_validators(response, etag, settings.CATALOG_CACHE_CONTROL)
     return product
 
 
+# -------------------------
+# Get many products by id
+# -------------------------
+@router.post(":batchGet", response_model=ProductBatchGetResponse)
+def batch_get_products(payload: ProductBatchGetRequest, db: Session = Depends(get_db)):
+    # One MGET, one IN query for cache misses, one pipelined backfill
+    ids = list(dict.fromkeys(payload.ids))
+    found = load_products(db, ids)
+    return ProductBatchGetResponse(
+        items=[found[pid] for pid in ids if pid in found],
+        missing=[pid for pid in ids if pid not in found],
+    )
+
+
 # -------------------------
 # Create product
 # -------------------------
@@ -111,10 +503,11 @@ def create_product(payload: ProductCreate, db: Session = Depends(get_db)):
     )
 
     db.add(product)
+    _invalidate_products_cache(db)
     db.commit()
+    _invalidate_committed()
     db.refresh(product)
 
-    _invalidate_products_cache()
     return product
 
 
@@ -134,11 +527,14 @@ def update_product(
     data = payload.model_dump(exclude_unset=True)
     for key, value in data.items():
         setattr(product, key, value)
+    # In SQL, so concurrent updates can't both write the same next version
+    product.version = Product.version + 1
 
+    _invalidate_products_cache(db, [product.id])
     db.commit()
+    _invalidate_committed([product.id])
     db.refresh(product)
 
-    _invalidate_products_cache()
     return product
 
 
@@ -182,7 +578,10 @@ def seed_products(db: Session = Depends(get_db)):
         db.add(Product(**s, is_active=True))
         created += 1
 
+    if created:
+        _invalidate_products_cache(db)
     db.commit()
-    _invalidate_products_cache()
+    if created:
+        _invalidate_committed()
 
     return {"seeded": created}
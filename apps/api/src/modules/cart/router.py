@@ -1,3 +1,5 @@
+from typing import Literal
+
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
@@ -8,8 +10,11 @@ from src.modules.cart.schemas import (
     CartItem,
     CartResponse,
     CartSetQtyRequest,
+    PricedCartItem,
+    PricedCartResponse,
 )
 from src.modules.cart.service import add_item, clear_cart, get_cart, set_qty
+from src.modules.catalog.service import load_products
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 
@@ -19,10 +24,46 @@ def _cart_response(user_id: str, cart_dict: dict[str, int]) -> CartResponse:
     return CartResponse(user_id=user_id, items=items)
 
 
-@router.get("", response_model=CartResponse)
-def read_cart(user_id: str = Query(..., min_length=1)):
-    cart = get_cart(user_id)
-    return _cart_response(user_id, {k: int(v) for k, v in cart.items()})
+def _priced_cart_response(db: Session, user_id: str, cart: dict[str, int]) -> PricedCartResponse:
+    products = load_products(db, (int(pid) for pid in cart))
+    items: list[PricedCartItem] = []
+    total = 0
+    for pid, qty in cart.items():
+        product = products.get(int(pid))
+        if product is None:
+            items.append(
+                PricedCartItem(product_id=int(pid), qty=qty, available=False, in_stock=False)
+            )
+            continue
+        line_total = product["price_cents"] * qty
+        total += line_total
+        items.append(
+            PricedCartItem(
+                product_id=int(pid),
+                qty=qty,
+                name=product["name"],
+                unit_price_cents=product["price_cents"],
+                line_total_cents=line_total,
+                available=product["is_active"],
+                in_stock=product["is_active"] and product["stock_qty"] >= qty,
+            )
+        )
+    # Same pricing as checkout, which charges in USD
+    return PricedCartResponse(user_id=user_id, items=items, total_cents=total, currency="USD")
+
+
+@router.get("", response_model=PricedCartResponse | CartResponse)
+def read_cart(
+    user_id: str = Query(..., min_length=1),
+    expand: Literal["products"] | None = Query(
+        None, description="products: include names, prices, line and cart totals"
+    ),
+    db: Session = Depends(get_db),
+):
+    cart = {k: int(v) for k, v in get_cart(user_id).items()}
+    if expand == "products":
+        return _priced_cart_response(db, user_id, cart)
+    return _cart_response(user_id, cart)
 
 
 @router.post("/items", response_model=CartResponse)
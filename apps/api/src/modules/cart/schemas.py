@@ -19,3 +19,17 @@ class CartItem(BaseModel):
 class CartResponse(BaseModel):
     user_id: str
     items: list[CartItem]
+
+
+class PricedCartItem(CartItem):
+    name: str | None = None
+    unit_price_cents: int | None = None
+    line_total_cents: int = 0
+    available: bool  # product exists and is active
+    in_stock: bool  # available with stock_qty >= qty
+
+
+class PricedCartResponse(CartResponse):
+    items: list[PricedCartItem]
+    total_cents: int
+    currency: str
@@ -1,47 +1,85 @@
-import json
-from typing import Dict
+from typing import Callable, Dict, Optional, Tuple
 
-from src.db.redis_client import get_redis
+from src.db.redis_client import RedisBatch, get_redis, redis_batch
 
 CART_TTL_SECONDS = 60 * 60 * 24  # 24 hours
 
+# Hash field counting the cart's mutations. Checkout records the version it
+# booked, so clearing that cart later can't drop items added since.
+VERSION_FIELD = "_v"
+
+# Empties the cart if it is still at version ARGV[1] ('' = any version). The
+# version survives the clear, so it never repeats while the cart is in use.
+_CLEAR_LUA = """
+local v = redis.call('HGET', KEYS[1], '_v') or '0'
+if ARGV[1] ~= '' and v ~= ARGV[1] then
+  return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], '_v', v)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+_clear_script = None
+
 
 def _cart_key(user_id: str) -> str:
-    return f"cart:{user_id}"
+    # Hash of product_id -> qty, so updates are single commands instead of
+    # read-modify-write of the whole cart
+    return f"carts:{user_id}"
+
+
+def _run(
+    user_id: str, queue: Callable[[RedisBatch, str], None] | None = None
+) -> Tuple[Dict[str, int], int]:
+    """Queue mutations, refresh the TTL and read the cart back in one round
+    trip. Returns (items, version)."""
+    key = _cart_key(user_id)
+    with redis_batch() as batch:
+        if queue is not None:
+            queue(batch, key)
+            batch.hincrby(key, VERSION_FIELD, 1)
+            batch.expire(key, CART_TTL_SECONDS)
+        batch.hgetall(key)
+    items = batch.results[-1]
+    version = int(items.pop(VERSION_FIELD, 0))
+    return {pid: int(qty) for pid, qty in items.items()}, version
 
 
 def get_cart(user_id: str) -> Dict[str, int]:
-    r = get_redis()
-    raw = r.get(_cart_key(user_id))
-    if not raw:
-        return {}
-    return json.loads(raw)
+    return _run(user_id)[0]
 
 
-def save_cart(user_id: str, cart: Dict[str, int]) -> None:
-    r = get_redis()
-    r.setex(_cart_key(user_id), CART_TTL_SECONDS, json.dumps(cart))
+def get_versioned_cart(user_id: str) -> Tuple[Dict[str, int], int]:
+    """(items, version): pass the version to clear_cart to clear exactly this cart."""
+    return _run(user_id)
 
 
 def add_item(user_id: str, product_id: int, qty: int) -> Dict[str, int]:
-    cart = get_cart(user_id)
-    key = str(product_id)
-    cart[key] = cart.get(key, 0) + qty
-    save_cart(user_id, cart)
-    return cart
+    return _run(user_id, lambda batch, key: batch.hincrby(key, str(product_id), qty))[0]
 
 
 def set_qty(user_id: str, product_id: int, qty: int) -> Dict[str, int]:
-    cart = get_cart(user_id)
-    key = str(product_id)
-    if qty <= 0:
-        cart.pop(key, None)
-    else:
-        cart[key] = qty
-    save_cart(user_id, cart)
-    return cart
-
-
-def clear_cart(user_id: str) -> None:
-    r = get_redis()
-    r.delete(_cart_key(user_id))
+    pid = str(product_id)
+
+    def queue(batch: RedisBatch, key: str) -> None:
+        if qty <= 0:
+            batch.hdel(key, pid)
+        else:
+            batch.hset(key, pid, qty)
+
+    return _run(user_id, queue)[0]
+
+
+def clear_cart(user_id: str, version: Optional[int] = None) -> bool:
+    """Empty the cart; with `version`, only if nothing changed it since that
+    version was read. Returns whether it was cleared."""
+    global _clear_script
+    if _clear_script is None:
+        _clear_script = get_redis().register_script(_CLEAR_LUA)
+    cleared = _clear_script(
+        keys=[_cart_key(user_id)],
+        args=["" if version is None else str(version), CART_TTL_SECONDS],
+    )
+    return bool(cleared)
@@ -0,0 +1,102 @@
+"""Best-seller ranking: units sold per product, in Redis sorted sets.
+
+Checkout records each order's lines through the outbox (bestsellers.record),
+so only committed orders count. The units are added to the bucket of the
+order's hour (UTC) and to every window that hour falls into, so rankings
+move as soon as the event is handled. An order is counted once: the same
+script sets a marker for its id, and a redelivered event (the dispatcher
+retries events whose batch failed to commit) finds it and adds nothing.
+
+The catalog warmer rebuilds each window from its hourly buckets every
+BESTSELLERS_MERGE_INTERVAL_S with one ZUNIONSTORE, so hours that slid out of
+the window drop out. A bucket expires once no window covers it. Cancelled
+and expired orders are not taken back out.
+
+A ranking read is one ZREVRANGE (and a ZCARD) of a window, in one round trip.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+
+from src.db.redis_client import get_redis, redis_batch
+
+Window = Literal["24h", "7d"]
+
+# Hourly buckets merged into each window, the current hour included
+WINDOW_HOURS: dict[str, int] = {"24h": 24, "7d": 7 * 24}
+
+# How long an order's marker is kept: far longer than the outbox retries an
+# event (OUTBOX_MAX_ATTEMPTS, backoff capped at a few minutes)
+SEEN_TTL_S = 24 * 60 * 60
+
+# KEYS: the order's marker, its hour's bucket, then the windows to add to.
+# ARGV: marker TTL, bucket expiry (unix time), then product id, units pairs.
+# Atomic, so a window rebuild sees all of an order's increments or none.
+_RECORD_LUA = """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+  return 0
+end
+for i = 3, #ARGV, 2 do
+  for k = 2, #KEYS do
+    redis.call('ZINCRBY', KEYS[k], ARGV[i + 1], ARGV[i])
+  end
+end
+redis.call('EXPIREAT', KEYS[2], ARGV[2])
+return 1
+"""
+
+_record_script = None
+
+
+def _bucket_key(hour: datetime) -> str:
+    return f"bestsellers:h:{hour:%Y%m%d%H}"
+
+
+def _window_key(window: str) -> str:
+    return f"bestsellers:{window}"
+
+
+def _hour(at: datetime) -> datetime:
+    return at.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def record_units(
+    order_id: int, units: dict[int, int], at: datetime, now: Optional[datetime] = None
+) -> bool:
+    """Count `units` (product id -> units sold) for order `order_id`, placed
+    at `at`. False if the order was already counted."""
+    global _record_script
+    if _record_script is None:
+        _record_script = get_redis().register_script(_RECORD_LUA)
+    hour = _hour(at)
+    age = _hour(now or datetime.now(timezone.utc)) - hour
+    windows = [_window_key(w) for w, hours in WINDOW_HOURS.items() if age < timedelta(hours=hours)]
+    expires_at = hour + timedelta(hours=max(WINDOW_HOURS.values()) + 1)
+    args: list[int] = [SEEN_TTL_S, int(expires_at.timestamp())]
+    for product_id, qty in units.items():
+        args += [product_id, qty]
+    recorded = _record_script(
+        keys=[f"bestsellers:seen:{order_id}", _bucket_key(hour), *windows], args=args
+    )
+    return bool(recorded)
+
+
+def merge_windows(now: Optional[datetime] = None) -> None:
+    """Rebuild every window from its hourly buckets."""
+    current = _hour(now or datetime.now(timezone.utc))
+    with redis_batch() as batch:
+        for window, hours in WINDOW_HOURS.items():
+            buckets = [_bucket_key(current - timedelta(hours=h)) for h in range(hours)]
+            batch.zunionstore(_window_key(window), buckets)
+
+
+def ranked_products(window: Window, offset: int, limit: int) -> tuple[list[tuple[int, int]], int]:
+    """((product id, units sold) best first, products ranked) for a window."""
+    key = _window_key(window)
+    with redis_batch() as batch:
+        batch.zrevrange(key, offset, offset + limit - 1, withscores=True)
+        batch.zcard(key)
+    ranked, total = batch.results
+    return [(int(member), int(score)) for member, score in ranked], total
@@ -1,7 +1,38 @@
 import json
 from typing import Any, Optional
 
-from src.db.redis_client import get_redis
+from src.db.redis_client import get_binary_redis, get_redis, redis_batch
+
+# Bumped on every catalog write; used for list cache keys and ETags
+CATALOG_GENERATION_KEY = "catalog:gen"
+
+# Single products, as ProductResponse JSON, for batched lookups by id. Dropped
+# by id on update; the TTL bounds staleness if a fill races an update.
+PRODUCT_CACHE_TTL_S = 60
+
+# Last-known copies of list pages and products, kept well past their normal
+# TTL and never invalidated: served (marked stale) only while Postgres is
+# unavailable. Written alongside each fresh entry, in the same round trip.
+STALE_COPY_TTL_S = 24 * 60 * 60
+
+# Facet counts are keyed by generation like list pages, so a catalog write
+# retires them at once; the TTL only clears out unused filter combinations.
+FACETS_CACHE_TTL_S = 300
+
+# Request counts per listing page (generation-free parameters), read by the
+# cache warmer (src/modules/catalog/warmer.py) to pick the pages to keep warm
+CATALOG_POPULARITY_KEY = "catalog:popular"
+
+# Hash field marking list pages written by the warmer rather than a request
+WARMED_FIELD = "warmed"
+
+
+def _product_key(product_id: int) -> str:
+    return f"products:item:{product_id}"
+
+
+def _stale_product_key(product_id: int) -> str:
+    return f"products:stale:item:{product_id}"
 
 
 def get_cache_json(key: str) -> Optional[Any]:
@@ -15,3 +46,104 @@ def get_cache_json(key: str) -> Optional[Any]:
 def set_cache_json(key: str, value: Any, ttl_seconds: int = 30) -> None:
     r = get_redis()
     r.setex(key, ttl_seconds, json.dumps(value))
+
+
+# Adds an encoding to an existing entry only, so a late write can't
+# recreate an expired entry without a TTL.
+_ADD_ENCODING_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+end
+return 1
+"""
+
+_add_encoding_script = None
+
+
+def get_cached_body(key: str, encoding: Optional[str]) -> tuple[Optional[bytes], Optional[bytes]]:
+    """Return (raw JSON, body pre-compressed with `encoding`) for a cached response."""
+    r = get_binary_redis()
+    if not encoding:
+        return r.hget(key, "json"), None
+    body, encoded = r.hmget(key, ["json", encoding])
+    return body, encoded
+
+
+def get_cached_page(
+    key: str, encoding: Optional[str], popularity_member: str
+) -> tuple[Optional[bytes], Optional[bytes], bool]:
+    """get_cached_body for a list page, plus whether the warmer wrote it.
+
+    Counts a request for `popularity_member` in the same round trip.
+    """
+    fields = ["json", WARMED_FIELD] + ([encoding] if encoding else [])
+    with redis_batch(binary=True) as batch:
+        batch.hmget(key, fields)
+        batch.zincrby(CATALOG_POPULARITY_KEY, 1, popularity_member)
+    values = batch.results[0]
+    return values[0], values[2] if encoding else None, values[1] is not None
+
+
+def set_cached_body(
+    key: str,
+    body: bytes,
+    ttl_seconds: int = 30,
+    encoded: Optional[dict[str, bytes]] = None,
+    stale_key: Optional[str] = None,
+    warmed: bool = False,
+) -> None:
+    mapping = {"json": body, **(encoded or {})}
+    with redis_batch(binary=True) as batch:
+        batch.hset(key, mapping=mapping)
+        if warmed:
+            batch.hset(key, WARMED_FIELD, b"1")
+        batch.expire(key, ttl_seconds)
+        if stale_key:
+            batch.delete(stale_key)
+            batch.hset(stale_key, mapping=mapping)
+            batch.expire(stale_key, STALE_COPY_TTL_S)
+
+
+def add_cached_encoding(key: str, encoding: str, data: bytes) -> None:
+    global _add_encoding_script
+    if _add_encoding_script is None:
+        _add_encoding_script = get_binary_redis().register_script(_ADD_ENCODING_LUA)
+    _add_encoding_script(keys=[key], args=[encoding, data])
+
+
+def get_cached_products(product_ids: list[int]) -> list[Optional[str]]:
+    """Cached product JSON for each id, in order (None = miss). One MGET."""
+    if not product_ids:
+        return []
+    return get_redis().mget([_product_key(pid) for pid in product_ids])
+
+
+def set_cached_products(products: dict[int, str]) -> None:
+    with redis_batch() as batch:
+        for pid, data in products.items():
+            batch.set(_product_key(pid), data, ex=PRODUCT_CACHE_TTL_S)
+            batch.set(_stale_product_key(pid), data, ex=STALE_COPY_TTL_S)
+
+
+def get_stale_product(product_id: int) -> Optional[str]:
+    """Last-known product JSON: the fresh entry if there is one, else the stale copy."""
+    fresh, stale = get_redis().mget([_product_key(product_id), _stale_product_key(product_id)])
+    return fresh or stale
+
+
+def get_catalog_generation() -> Optional[int]:
+    """Current catalog generation, or None if Redis is unavailable."""
+    try:
+        return int(get_redis().get(CATALOG_GENERATION_KEY) or 0)
+    except Exception:
+        return None
+
+
+def invalidate_products_cache(product_ids: Optional[list[int]] = None) -> None:
+    # Cached pages are keyed by generation, so bumping it retires all of them
+    # at once (old entries age out via their TTL) and changes every ETag.
+    # Single-product entries are dropped by id in the same round trip.
+    with redis_batch() as batch:
+        batch.incr(CATALOG_GENERATION_KEY)
+        if product_ids:
+            batch.delete(*[_product_key(pid) for pid in product_ids])
@@ -1,6 +1,9 @@
 from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+# Upper bound for POST /products:batchGet
+MAX_BATCH_GET_IDS = 500
 
 
 class ProductCreate(BaseModel):
@@ -30,6 +33,7 @@ class ProductResponse(BaseModel):
     currency: str
     stock_qty: int
     is_active: bool
+    version: int
 
     class Config:
         from_attributes = True
@@ -40,3 +44,39 @@ class ProductListResponse(BaseModel):
     limit: int
     offset: int
     total: int
+
+
+class TopProduct(ProductResponse):
+    units_sold: int
+
+
+class TopProductsResponse(BaseModel):
+    window: str
+    items: List[TopProduct]  # best first
+
+
+class ProductBatchGetRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_GET_IDS)
+
+
+class ProductBatchGetResponse(BaseModel):
+    items: List[ProductResponse]  # in request order, duplicates removed
+    missing: List[int]
+
+
+class CurrencyFacet(BaseModel):
+    currency: str
+    count: int
+
+
+class PriceBucketFacet(BaseModel):
+    min_cents: int
+    max_cents: Optional[int] = None  # exclusive; None for the open-ended top bucket
+    count: int
+
+
+class ProductFacetsResponse(BaseModel):
+    total: int
+    in_stock: int
+    currencies: List[CurrencyFacet]
+    price_buckets: List[PriceBucketFacet]
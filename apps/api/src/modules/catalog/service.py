@@ -0,0 +1,169 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import func, literal_column, tuple_
+from sqlalchemy.orm import Query, Session
+
+from src.db.models import Product
+from src.modules.catalog.cache import get_cached_products, set_cached_products
+from src.modules.catalog.schemas import ProductResponse
+
+
+def products_by_id(db: Session, product_ids: list[int]) -> Query:
+    return db.query(Product).filter(Product.id.in_(product_ids))
+
+
+def product_page(query: Query, limit: int, offset: int) -> Query:
+    """A page of a product listing query, newest first."""
+    return query.order_by(Product.id.desc()).limit(limit).offset(offset)
+
+
+def load_products(db: Session, product_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """Products by id as ProductResponse dicts; unknown ids are left out.
+
+    One MGET for cached entries, one IN query for the misses, and one
+    pipelined backfill, however many ids are asked for.
+    """
+    ids = list(dict.fromkeys(int(pid) for pid in product_ids))
+    if not ids:
+        return {}
+
+    found: Dict[int, Dict[str, Any]] = {}
+    try:
+        cached = get_cached_products(ids)
+    except Exception:
+        cached = [None] * len(ids)
+    for pid, raw in zip(ids, cached):
+        if raw:
+            found[pid] = json.loads(raw)
+
+    missing = [pid for pid in ids if pid not in found]
+    if missing:
+        fill: Dict[int, str] = {}
+        for product in products_by_id(db, missing):
+            data = ProductResponse.model_validate(product).model_dump(mode="json")
+            found[product.id] = data
+            fill[product.id] = json.dumps(data)
+        if fill:
+            try:
+                set_cached_products(fill)
+            except Exception:
+                pass
+
+    return found
+
+
+def load_current_products(db: Session, product_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """Like load_products, but every returned snapshot is confirmed current.
+
+    The cached snapshots are checked with one (id, version) IN (...) query in
+    the caller's transaction; only products whose version moved (or whose
+    snapshot predates versioning) are read in full, and re-cached.
+    """
+    found = load_products(db, product_ids)
+    versioned = {pid: data["version"] for pid, data in found.items() if "version" in data}
+
+    current = set()
+    if versioned:
+        current = {
+            pid
+            for (pid,) in db.query(Product.id).filter(
+                tuple_(Product.id, Product.version).in_(list(versioned.items()))
+            )
+        }
+
+    stale = [pid for pid in found if pid not in current]
+    if stale:
+        fill: Dict[int, str] = {}
+        for product in products_by_id(db, stale):
+            data = ProductResponse.model_validate(product).model_dump(mode="json")
+            found[product.id] = data
+            fill[product.id] = json.dumps(data)
+        for pid in set(stale) - set(fill):
+            del found[pid]  # deleted since it was cached
+        if fill:
+            try:
+                set_cached_products(fill)
+            except Exception:
+                pass
+
+    return found
+
+
+# Upper bounds of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKET_BOUNDS_CENTS = (1000, 2500, 5000, 10000)
+
+
+@dataclass(frozen=True)
+class ProductFilters:
+    q: Optional[str] = None
+    active_only: bool = True
+    min_price_cents: Optional[int] = None
+    max_price_cents: Optional[int] = None
+    currency: Optional[str] = None
+    in_stock: bool = False
+
+    def apply(self, query: Query) -> Query:
+        if self.active_only:
+            query = query.filter(Product.is_active.is_(True))
+        if self.q:
+            like = f"%{self.q}%"
+            query = query.filter((Product.name.ilike(like)) | (Product.sku.ilike(like)))
+        if self.min_price_cents is not None:
+            query = query.filter(Product.price_cents >= self.min_price_cents)
+        if self.max_price_cents is not None:
+            query = query.filter(Product.price_cents <= self.max_price_cents)
+        if self.currency:
+            query = query.filter(Product.currency == self.currency)
+        if self.in_stock:
+            query = query.filter(Product.stock_qty > 0)
+        return query
+
+    def cache_key(self) -> str:
+        return (
+            f"q={self.q}:active={self.active_only}:price={self.min_price_cents}-"
+            f"{self.max_price_cents}:currency={self.currency}:in_stock={self.in_stock}"
+        )
+
+
+def product_facets(db: Session, filters: ProductFilters) -> Dict[str, Any]:
+    """Facet counts for the filtered catalog, in one aggregate query.
+
+    GROUPING SETS yields one row per currency, one per price bucket and a
+    grand total row (with the in-stock count) from a single scan.
+    """
+    bounds = ",".join(str(b) for b in PRICE_BUCKET_BOUNDS_CENTS)
+    bucket = func.width_bucket(Product.price_cents, literal_column(f"ARRAY[{bounds}]"))
+    rows = filters.apply(
+        db.query(
+            Product.currency,
+            bucket,
+            func.count(),
+            func.count().filter(Product.stock_qty > 0),
+            func.grouping(Product.currency),
+            func.grouping(bucket),
+        )
+    ).group_by(func.grouping_sets(tuple_(Product.currency), tuple_(bucket), tuple_()))
+
+    total = in_stock = 0
+    currencies: Dict[str, int] = {}
+    buckets: Dict[int, int] = {}
+    for currency, index, count, stocked, currency_grouped, bucket_grouped in rows:
+        if currency_grouped and bucket_grouped:
+            total, in_stock = count, stocked
+        elif bucket_grouped:
+            currencies[currency] = count
+        else:
+            buckets[index] = count
+
+    edges = (0, *PRICE_BUCKET_BOUNDS_CENTS, None)
+    return {
+        "total": total,
+        "in_stock": in_stock,
+        "currencies": [{"currency": c, "count": n} for c, n in sorted(currencies.items())],
+        "price_buckets": [
+            {"min_cents": edges[i], "max_cents": edges[i + 1], "count": buckets.get(i, 0)}
+            for i in range(len(edges) - 1)
+        ],
+    }
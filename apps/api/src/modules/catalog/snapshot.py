@@ -0,0 +1,320 @@
+"""In-process catalog snapshot: products served from memory.
+
+Opt-in with CATALOG_SNAPSHOT_ENABLED. Each API worker then keeps every
+product in memory and answers GET /products/{id} and the default listing
+(active products, newest first, no filters) without Redis or Postgres.
+Filtered listings and misses (e.g. a product created a moment ago) take the
+usual cached path.
+
+Products are kept in columns, one slot per product in id order, rather than
+an object each:
+
+- ids, prices, stock and versions in array('q'); flags and currency codes in
+  a byte each (codes index a small table of currencies);
+- sku, name and description as UTF-8 in one shared buffer, located by an
+  offset and a length per slot.
+
+The sorted ids column is the id -> slot map (a binary search), so lookups
+cost no memory beyond the columns. Dicts are only built for the products a
+response needs. scripts/bench_catalog_snapshot.py reports the memory per
+product and lookup latency.
+
+Refresh: a thread per worker holds its own Postgres connection, outside the
+SQLAlchemy pool (src.serve takes it out of the worker's share of
+DB_CONNECTION_BUDGET), LISTENs on catalog_changes and then loads the table,
+so no change is missed. Every
+statement that writes products notifies the changed ids on commit (a
+trigger, see migration f1c3a7e9b2d4); the thread reads those rows again and
+updates their slots. A full reload happens instead after:
+
+- a bulk write ("*");
+- a new id lower than the newest one;
+- enough updates that most of the text buffer is replaced copies;
+- a lost connection.
+
+Until a reload is done, reads take the usual path.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Iterable, Optional
+
+import psycopg
+
+from src.core.config import settings
+from src.db.database import get_engine
+
+log = logging.getLogger("catalog.snapshot")
+
+CHANNEL = "catalog_changes"
+
+# Columns of a product row, as loaded from Postgres
+_SELECT = (
+    "SELECT id, sku, name, description, price_cents, currency, stock_qty, is_active, version "
+    "FROM products"
+)
+
+_ACTIVE = 1
+_DELETED = 2
+
+# Slots whose flags are counted at once when skipping to a deep page
+_SKIP_BLOCK = 4096
+
+# Notifications that arrive this soon after the first are applied together
+_BATCH_WAIT_S = 0.01
+RETRY_MAX_S = 10.0
+
+
+def _encode_text(sku: str, name: str, description: Optional[str]) -> bytes:
+    parts = [sku, name] if description is None else [sku, name, description]
+    return "\0".join(parts).encode()
+
+
+class CatalogSnapshot:
+    """Products in compact columns, looked up by id."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ids = array("q")
+        self._price_cents = array("q")
+        self._stock_qty = array("q")
+        self._version = array("q")
+        self._flags = bytearray()
+        self._currency = bytearray()
+        self._text = bytearray()
+        self._text_start = array("Q")
+        self._text_len = array("I")
+        self._text_garbage = 0
+        self._currencies: list[str] = []
+        self._currency_codes: dict[str, int] = {}
+        self._active = 0
+        self._deleted = 0
+        self.loaded = threading.Event()
+
+    def _currency_code(self, currency: str) -> int:
+        code = self._currency_codes.get(currency)
+        if code is None:
+            if len(self._currencies) == 256:
+                raise ValueError("more than 256 currencies")
+            code = self._currency_codes[currency] = len(self._currencies)
+            self._currencies.append(currency)
+        return code
+
+    def _set_text(self, slot: int, text: bytes) -> None:
+        # Appended: the previous copy, if any, is left behind until a reload
+        self._text_garbage += self._text_len[slot]
+        self._text_start[slot] = len(self._text)
+        self._text_len[slot] = len(text)
+        self._text += text
+
+    def _append(self, row: tuple) -> None:
+        pid, sku, name, description, price_cents, currency, stock_qty, is_active, version = row
+        text = _encode_text(sku, name, description)
+        self._ids.append(pid)
+        self._price_cents.append(price_cents)
+        self._stock_qty.append(stock_qty)
+        self._version.append(version)
+        self._flags.append(_ACTIVE if is_active else 0)
+        self._currency.append(self._currency_code(currency))
+        self._text_start.append(len(self._text))
+        self._text_len.append(len(text))
+        self._text += text
+        self._active += bool(is_active)
+
+    def _slot(self, product_id: int) -> Optional[int]:
+        slot = bisect_left(self._ids, product_id)
+        if slot == len(self._ids) or self._ids[slot] != product_id:
+            return None
+        return None if self._flags[slot] == _DELETED else slot
+
+    def load(self, rows: Iterable[tuple]) -> None:
+        """Replace the contents with `rows` (product columns, in id order)."""
+        fresh = CatalogSnapshot()
+        for row in rows:
+            fresh._append(row)
+        columns = {k: v for k, v in vars(fresh).items() if k.startswith("_") and k != "_lock"}
+        with self._lock:
+            vars(self).update(columns)
+        self.loaded.set()
+
+    def apply(self, ids: Iterable[int], rows: Iterable[tuple]) -> bool:
+        """Apply changes to products `ids`, whose current rows are `rows`
+        (ids without a row were deleted). False if a full reload is needed.
+        """
+        current = {row[0]: row for row in rows}
+        with self._lock:
+            for pid in sorted(set(ids)):
+                row = current.get(pid)
+                slot = self._slot(pid)
+                if slot is None:
+                    if row is None:
+                        continue
+                    # Slots are in id order; an id from an earlier transaction
+                    # that committed late (or a deleted one) would go in the middle
+                    if self._ids and pid <= self._ids[-1]:
+                        return False
+                    self._append(row)
+                    continue
+                self._active -= self._flags[slot] == _ACTIVE
+                if row is None:
+                    self._flags[slot] = _DELETED
+                    self._deleted += 1
+                    self._set_text(slot, b"")
+                    continue
+                _, sku, name, description, price_cents, currency, stock_qty, is_active, version = (
+                    row
+                )
+                self._price_cents[slot] = price_cents
+                self._stock_qty[slot] = stock_qty
+                self._version[slot] = version
+                self._flags[slot] = _ACTIVE if is_active else 0
+                self._currency[slot] = self._currency_code(currency)
+                self._set_text(slot, _encode_text(sku, name, description))
+                self._active += bool(is_active)
+            return self._text_garbage <= len(self._text) // 2
+
+    def _product(self, slot: int) -> dict[str, Any]:
+        start = self._text_start[slot]
+        text = self._text[start : start + self._text_len[slot]].decode()
+        sku, name, *description = text.split("\0", 2)
+        return {
+            "id": self._ids[slot],
+            "sku": sku,
+            "name": name,
+            "description": description[0] if description else None,
+            "price_cents": self._price_cents[slot],
+            "currency": self._currencies[self._currency[slot]],
+            "stock_qty": self._stock_qty[slot],
+            "is_active": self._flags[slot] == _ACTIVE,
+            "version": self._version[slot],
+        }
+
+    def get(self, product_id: int) -> Optional[dict[str, Any]]:
+        """The product as a ProductResponse dict, or None if it isn't in the snapshot."""
+        with self._lock:
+            slot = self._slot(product_id)
+            return None if slot is None else self._product(slot)
+
+    def page(self, limit: int, offset: int) -> tuple[list[dict[str, Any]], int]:
+        """(active products newest first, from `offset`; number of active products)."""
+        items: list[dict[str, Any]] = []
+        with self._lock:
+            flags = self._flags
+            # Skip whole blocks of slots by counting their active flags
+            end, skip = len(flags), offset
+            while skip and end:
+                start = max(0, end - _SKIP_BLOCK)
+                active = flags.count(_ACTIVE, start, end)
+                if active > skip:
+                    break
+                skip -= active
+                end = start
+            for slot in range(end - 1, -1, -1):
+                if flags[slot] != _ACTIVE:
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                items.append(self._product(slot))
+                if len(items) == limit:
+                    break
+            return items, self._active
+
+    def __len__(self) -> int:
+        return len(self._ids) - self._deleted
+
+
+def _listen_url() -> str:
+    # A plain libpq URL for psycopg, from the SQLAlchemy one
+    return get_engine().url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def _reload(conn: psycopg.Connection, snapshot: CatalogSnapshot) -> None:
+    started = time.perf_counter()
+    with conn.transaction(), conn.cursor(name="catalog_snapshot") as cur:
+        cur.itersize = 10_000
+        cur.execute(f"{_SELECT} ORDER BY id")
+        snapshot.load(cur)
+    log.info(
+        "catalog snapshot loaded: %s products in %.2fs",
+        len(snapshot),
+        time.perf_counter() - started,
+    )
+
+
+def _apply_changes(
+    conn: psycopg.Connection, snapshot: CatalogSnapshot, payloads: list[str]
+) -> None:
+    if "*" in payloads:
+        _reload(conn, snapshot)
+        return
+    ids = {int(pid) for payload in payloads for pid in payload.split(",")}
+    rows = conn.execute(f"{_SELECT} WHERE id = ANY(%s)", [list(ids)]).fetchall()
+    if not snapshot.apply(ids, rows):
+        _reload(conn, snapshot)
+
+
+def refresh(snapshot: CatalogSnapshot, stopping: threading.Event) -> None:
+    """Load the snapshot and keep it current until `stopping` is set."""
+    delay = 0.5
+    while not stopping.is_set():
+        try:
+            with psycopg.connect(
+                _listen_url(), autocommit=True, connect_timeout=settings.DB_CONNECT_TIMEOUT_S
+            ) as conn:
+                conn.execute(f"LISTEN {CHANNEL}")
+                _reload(conn, snapshot)
+                delay = 0.5
+                while not stopping.is_set():
+                    payloads = [n.payload for n in conn.notifies(timeout=1.0, stop_after=1)]
+                    if not payloads:
+                        continue
+                    payloads += [n.payload for n in conn.notifies(timeout=_BATCH_WAIT_S)]
+                    _apply_changes(conn, snapshot, payloads)
+        except Exception:
+            # Stale until reloaded: reads take the usual path meanwhile
+            snapshot.loaded.clear()
+            log.warning("catalog snapshot refresh failed, retrying in %.1fs", delay, exc_info=True)
+            stopping.wait(delay)
+            delay = min(delay * 2, RETRY_MAX_S)
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_stopping = threading.Event()
+_start_lock = threading.Lock()
+
+
+def start_catalog_snapshot() -> CatalogSnapshot:
+    """Start this process's snapshot and its refresh thread (once)."""
+    global _snapshot
+    with _start_lock:
+        if _snapshot is None:
+            _snapshot = CatalogSnapshot()
+            threading.Thread(
+                target=refresh, args=(_snapshot, _stopping), name="catalog-snapshot", daemon=True
+            ).start()
+    return _snapshot
+
+
+def get_catalog_snapshot() -> Optional[CatalogSnapshot]:
+    """This process's snapshot, if enabled and loaded (current up to the change feed)."""
+    snapshot = _snapshot
+    if snapshot is None or not snapshot.loaded.is_set():
+        return None
+    return snapshot
+
+
+def _after_fork_in_child() -> None:
+    # The refresh thread (and its connection) stays with the parent
+    global _snapshot, _stopping
+    _snapshot = None
+    _stopping = threading.Event()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
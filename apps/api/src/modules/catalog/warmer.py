@@ -0,0 +1,169 @@
+"""Catalog cache warmer: keeps the most requested listing pages cached.
+
+list_products counts requests per page (limit, offset, filters) in the
+catalog:popular sorted set. Every CATALOG_WARMER_INTERVAL_MS the warmer looks
+at the top CATALOG_WARM_TOP_N pages and re-renders those whose entry for the
+current catalog generation is missing (a write bumped the generation) or
+expires within CATALOG_WARM_AHEAD_MS. Their requests keep hitting the cache
+instead of all missing at once and arriving together at Postgres.
+
+Its own DB load is capped: pages are rendered one at a time, on one
+connection, at most CATALOG_WARMER_MAX_RENDERS_PER_S per second. Pages it
+doesn't get to are filled on demand, as without the warmer.
+
+Counts are halved every CATALOG_POPULARITY_HALF_LIFE_S, so popularity follows
+current traffic, and the set is trimmed to CATALOG_POPULARITY_MAX_KEYS.
+Hits on warmed pages are counted by the API as
+catalog_list_cache_lookups_total{result="warmed_hit"}.
+
+It also rebuilds the best-seller windows (src/modules/catalog/bestsellers.py)
+every BESTSELLERS_MERGE_INTERVAL_S.
+
+Run with:  python -m src.modules.catalog.warmer
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import signal
+import threading
+import time
+
+from src.core.config import settings
+from src.db.database import SessionLocal
+from src.db.redis_client import redis_batch
+from src.modules.auth.router import list_cache_key, parse_popularity_member, render_list_page
+from src.modules.catalog.bestsellers import merge_windows
+from src.modules.catalog.cache import CATALOG_POPULARITY_KEY, get_catalog_generation
+
+log = logging.getLogger("catalog.warmer")
+
+
+class RenderPacer:
+    """Spaces renders at least 1/per_second apart."""
+
+    def __init__(self, per_second: float):
+        self.interval = 1 / per_second
+        self.next_at = 0.0
+
+    def wait(self, stopping: threading.Event) -> bool:
+        """Block until the next render may start; False if stopping."""
+        delay = self.next_at - time.monotonic()
+        if delay > 0 and stopping.wait(delay):
+            return False
+        self.next_at = time.monotonic() + self.interval
+        return True
+
+
+def pages_due(generation: int, top_n: int, ahead_ms: int) -> list[tuple[bytes, str]]:
+    """(popularity member, reason) for the top pages that need rendering, most
+    popular first. Two round trips: the top members, then their entries' TTLs.
+    """
+    with redis_batch(binary=True) as batch:
+        batch.zrevrange(CATALOG_POPULARITY_KEY, 0, top_n - 1)
+    members = batch.results[0]
+
+    valid: list[bytes] = []
+    keys: list[str] = []
+    invalid: list[bytes] = []
+    for member in members:
+        try:
+            keys.append(list_cache_key(generation, member))
+            valid.append(member)
+        except (ValueError, TypeError, KeyError):
+            # Recorded by an older version with different parameters
+            invalid.append(member)
+
+    with redis_batch(binary=True) as batch:
+        for key in keys:
+            batch.pttl(key)
+        if invalid:
+            batch.zrem(CATALOG_POPULARITY_KEY, *invalid)
+    ttls = batch.results[: len(keys)]
+
+    due: list[tuple[bytes, str]] = []
+    for member, ttl in zip(valid, ttls):
+        if ttl == -2:
+            due.append((member, "missing"))
+        elif 0 <= ttl < ahead_ms:
+            due.append((member, "expiring"))
+    return due
+
+
+def warm_once(
+    stopping: threading.Event, pacer: RenderPacer, top_n: int, ahead_ms: int
+) -> dict[str, int]:
+    """Render the pages due for the current generation. Returns the pages
+    rendered, by reason.
+    """
+    rendered: dict[str, int] = {}
+    generation = get_catalog_generation()
+    if generation is None:
+        return rendered
+
+    for member, reason in pages_due(generation, top_n, ahead_ms):
+        if not pacer.wait(stopping):
+            break
+        # A write since the check retires this generation's pages; start over
+        if get_catalog_generation() != generation:
+            break
+        limit, offset, filters = parse_popularity_member(member)
+        with SessionLocal() as db:
+            render_list_page(db, generation, limit, offset, filters, warmed=True)
+        rendered[reason] = rendered.get(reason, 0) + 1
+    return rendered
+
+
+def decay_popularity(max_keys: int) -> None:
+    """Halve every count and keep only the `max_keys` most popular pages."""
+    with redis_batch() as batch:
+        batch.zunionstore(CATALOG_POPULARITY_KEY, {CATALOG_POPULARITY_KEY: 0.5})
+        batch.zremrangebyrank(CATALOG_POPULARITY_KEY, 0, -(max_keys + 1))
+
+
+def run(
+    stopping: threading.Event,
+    top_n: int,
+    interval_s: float,
+    max_renders_per_s: float,
+) -> None:
+    log.info("catalog warmer started (top %s pages, <= %s renders/s)", top_n, max_renders_per_s)
+    pacer = RenderPacer(max_renders_per_s)
+    next_decay = time.monotonic() + settings.CATALOG_POPULARITY_HALF_LIFE_S
+    next_merge = 0.0
+    while not stopping.is_set():
+        try:
+            rendered = warm_once(stopping, pacer, top_n, settings.CATALOG_WARM_AHEAD_MS)
+            if rendered:
+                log.info("warmed catalog pages: %s", rendered)
+            if time.monotonic() >= next_decay:
+                decay_popularity(settings.CATALOG_POPULARITY_MAX_KEYS)
+                next_decay = time.monotonic() + settings.CATALOG_POPULARITY_HALF_LIFE_S
+            if time.monotonic() >= next_merge:
+                merge_windows()
+                next_merge = time.monotonic() + settings.BESTSELLERS_MERGE_INTERVAL_S
+        except Exception:
+            log.exception("catalog warm-up failed")
+        stopping.wait(interval_s)
+    log.info("catalog warmer stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Keep the most requested catalog pages cached")
+    parser.add_argument("--top-n", type=int, default=settings.CATALOG_WARM_TOP_N)
+    parser.add_argument("--interval-ms", type=int, default=settings.CATALOG_WARMER_INTERVAL_MS)
+    parser.add_argument(
+        "--max-renders-per-s", type=float, default=settings.CATALOG_WARMER_MAX_RENDERS_PER_S
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+    run(stopping, args.top_n, args.interval_ms / 1000, args.max_renders_per_s)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,50 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, Header, HTTPException, Query
-from sqlalchemy.exc import IntegrityError
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Query as OrmQuery
 from sqlalchemy.orm import Session
 
+from src.core.config import settings
+from src.core.http_cache import etag_matches, not_modified, set_validators
+from src.core.idempotency import run_idempotent
 from src.db.database import get_db
-from src.db.models import Order, OrderItem, OrderStatus, Product
-from src.modules.cart.service import clear_cart
-from src.modules.cart.service import get_cart as get_cart_map
+from src.db.models import (
+    Order,
+    OrderIdempotencyKey,
+    OrderItem,
+    OrderStatus,
+    Payment,
+    PaymentStatus,
+)
+from src.modules.analytics.service import record_sales
+from src.modules.cart.service import clear_cart, get_versioned_cart
+from src.modules.catalog.service import load_current_products
+from src.modules.orders.snapshots import build_snapshot, item_snapshot
+from src.modules.outbox.service import BESTSELLERS_RECORD, CART_CLEAR, enqueue_event
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
+def _order_items_query(db: Session, order_id: int, created_at: datetime) -> OrmQuery:
+    return (
+        db.query(OrderItem)
+        .filter(OrderItem.order_id == order_id, OrderItem.order_created_at == created_at)
+        .order_by(OrderItem.id)
+    )
+
+
 def _serialize_order(db: Session, order: Order) -> Dict[str, Any]:
-    items: List[OrderItem] = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
+    if order.snapshot is not None:
+        items = order.snapshot["items"]
+    else:
+        # Not backfilled yet: fall back to order_items
+        rows: List[OrderItem] = _order_items_query(db, order.id, order.created_at).all()
+        items = [item_snapshot(it) for it in rows]
     return {
         "id": order.id,
         "user_id": order.user_id,
@@ -23,38 +52,51 @@ def _serialize_order(db: Session, order: Order) -> Dict[str, Any]:
         "total_cents": order.total_cents,
         "currency": order.currency,
         "created_at": str(order.created_at),
-        "items": [
-            {
-                "product_id": it.product_id,
-                "sku": it.sku,
-                "name": it.name,
-                "qty": it.qty,
-                "unit_price_cents": it.unit_price_cents,
-                "line_total_cents": it.line_total_cents,
-            }
-            for it in items
-        ],
+        "items": items,
     }
 
 
+def _order_for_key_query(db: Session, user_id: str, idempotency_key: str) -> OrmQuery:
+    # Primary-key lookup on the (unpartitioned) key table, then a join on the
+    # full order key, which the planner prunes to the order's partition
+    return (
+        db.query(Order)
+        .join(
+            OrderIdempotencyKey,
+            (Order.id == OrderIdempotencyKey.order_id)
+            & (Order.created_at == OrderIdempotencyKey.order_created_at),
+        )
+        .filter(
+            OrderIdempotencyKey.user_id == user_id,
+            OrderIdempotencyKey.idempotency_key == idempotency_key,
+        )
+    )
+
+
+def _order_for_key(db: Session, user_id: str, idempotency_key: str) -> Optional[Order]:
+    return _order_for_key_query(db, user_id, idempotency_key).first()
+
+
 @router.post("/checkout")
 def checkout(
     user_id: str,
     db: Session = Depends(get_db),
     idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
 ):
+    return run_idempotent(
+        "checkout", user_id, idempotency_key, lambda: _checkout(db, user_id, idempotency_key)
+    )
+
+
+def _checkout(db: Session, user_id: str, idempotency_key: Optional[str]) -> Dict[str, Any]:
     # ✅ 1) Idempotency FIRST (so retries work even if cart was cleared)
     if idempotency_key:
-        existing = (
-            db.query(Order)
-            .filter(Order.user_id == user_id, Order.idempotency_key == idempotency_key)
-            .first()
-        )
+        existing = _order_for_key(db, user_id, idempotency_key)
         if existing:
             return _serialize_order(db, existing)
 
     # ✅ 2) Then read cart
-    cart_dict = get_cart_map(user_id)  # Dict[str, int]
+    cart_dict, cart_version = get_versioned_cart(user_id)  # Dict[str, int], version
     if not cart_dict:
         raise HTTPException(status_code=400, detail="Cart is empty")
 
@@ -67,69 +109,132 @@ def checkout(
             idempotency_key=idempotency_key,
         )
         db.add(order)
-        db.flush()  # assigns order.id
+        db.flush()  # assigns order.id and created_at
+        if idempotency_key:
+            # Claim the key before doing any more work. A concurrent duplicate
+            # waits here for the first transaction to commit, then gets no row
+            # back (rather than a unique violation) and returns that order.
+            claimed = db.scalar(
+                pg_insert(OrderIdempotencyKey)
+                .values(
+                    user_id=user_id,
+                    idempotency_key=idempotency_key,
+                    order_id=order.id,
+                    order_created_at=order.created_at,
+                )
+                .on_conflict_do_nothing(index_elements=["user_id", "idempotency_key"])
+                .returning(OrderIdempotencyKey.order_id)
+            )
+            if claimed is None:
+                db.rollback()
+                existing = _order_for_key(db, user_id, idempotency_key)
+                if existing is None:
+                    raise HTTPException(status_code=409, detail="Idempotency-Key already used")
+                return _serialize_order(db, existing)
+
+        # Priced from cached product snapshots, confirmed current by version
+        products = load_current_products(db, [int(pid) for pid in cart_dict])
 
         total = 0
+        order_items: List[OrderItem] = []
         for pid_str, qty in cart_dict.items():
             product_id = int(pid_str)
             qty = int(qty)
 
-            product = db.query(Product).filter(Product.id == product_id).first()
+            product = products.get(product_id)
             if not product:
                 raise HTTPException(status_code=404, detail=f"Product {product_id} not found")
 
-            line_total = product.price_cents * qty
+            line_total = product["price_cents"] * qty
             total += line_total
 
-            db.add(
+            order_items.append(
                 OrderItem(
                     order_id=order.id,
-                    product_id=product.id,
-                    sku=product.sku,
-                    name=product.name,
+                    order_created_at=order.created_at,
+                    product_id=product_id,
+                    sku=product["sku"],
+                    name=product["name"],
                     qty=qty,
-                    unit_price_cents=product.price_cents,
+                    unit_price_cents=product["price_cents"],
                     line_total_cents=line_total,
                 )
             )
 
+        db.add_all(order_items)
         order.total_cents = total
+        order.snapshot = build_snapshot(order_items)
+        db.flush()
+        record_sales(db, [(order.id, order.created_at)], booked=1)
+        # Best-seller ranks are updated by the outbox dispatcher once this
+        # transaction commits (the order id keeps identical orders from being
+        # handled as one event). The cart is cleared right after commit; the
+        # event only retries that if Redis fails. Both clear this cart
+        # version only, never items added after checkout read the cart.
+        enqueue_event(db, CART_CLEAR, {"user_id": user_id, "cart_version": cart_version})
+        enqueue_event(
+            db,
+            BESTSELLERS_RECORD,
+            {
+                "order_id": order.id,
+                "at": order.created_at.isoformat(),
+                "units": {str(it.product_id): it.qty for it in order_items},
+            },
+        )
         db.commit()
-        db.refresh(order)
-
-        # Clear cart best-effort after successful commit
         try:
-            clear_cart(user_id)
+            # Right away, so a second checkout finds the cart empty
+            clear_cart(user_id, cart_version)
         except Exception:
             pass
+        db.refresh(order)
 
         return _serialize_order(db, order)
 
     except HTTPException:
         db.rollback()
         raise
-    except IntegrityError:
-        db.rollback()
-        # race: return existing if constraint hit
-        if idempotency_key:
-            existing = (
-                db.query(Order)
-                .filter(Order.user_id == user_id, Order.idempotency_key == idempotency_key)
-                .first()
-            )
-            if existing:
-                return _serialize_order(db, existing)
-        raise
     except Exception:
         db.rollback()
         raise
 
 
+def _versioned_order_query(db: Session, order_id: int, user_id: str) -> OrmQuery:
+    # xmin is Postgres' row version: it changes on every update of the order
+    # row (status transitions), and order items never change after checkout.
+    return db.query(Order, literal_column("orders.xmin::text")).filter(
+        Order.id == order_id, Order.user_id == user_id
+    )
+
+
+def _user_orders_query(db: Session, user_id: str, limit: int) -> OrmQuery:
+    return (
+        db.query(Order)
+        .filter(Order.user_id == user_id)
+        # Newest partitions first: with the LIMIT, older months are only
+        # visited if the newer ones don't hold enough of this user's orders
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .limit(limit)
+    )
+
+
 @router.get("/{order_id}")
-def get_order(order_id: int, user_id: str, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id, Order.user_id == user_id).first()
-    if not order:
+def get_order(
+    order_id: int,
+    user_id: str,
+    response: Response,
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    row = _versioned_order_query(db, order_id, user_id).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Order not found")
+
+    order, row_version = row
+    etag = f'"o{order.id}.{row_version}"'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, settings.ORDER_CACHE_CONTROL)
+    set_validators(response, etag, settings.ORDER_CACHE_CONTROL)
     return _serialize_order(db, order)
 
 
@@ -139,19 +244,18 @@ def list_orders(
     limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(get_db),
 ):
-    orders = (
-        db.query(Order)
-        .filter(Order.user_id == user_id)
-        .order_by(Order.id.desc())
-        .limit(limit)
-        .all()
-    )
+    orders = _user_orders_query(db, user_id, limit).all()
     return {"orders": [_serialize_order(db, o) for o in orders]}
 
 
 @router.post("/{order_id}/cancel")
 def cancel_order(order_id: int, user_id: str, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id, Order.user_id == user_id).first()
+    order = (
+        db.query(Order)
+        .filter(Order.id == order_id, Order.user_id == user_id)
+        .with_for_update()
+        .first()
+    )
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
@@ -161,7 +265,22 @@ def cancel_order(order_id: int, user_id: str, db: Session = Depends(get_db)):
         )
     if order.status == OrderStatus.CANCELLED.value:
         return {"detail": "Order already cancelled", "order_id": order.id}
+    if order.status == OrderStatus.EXPIRED.value:
+        raise HTTPException(status_code=409, detail="Order has expired")
+
+    in_flight = (
+        db.query(Payment.id)
+        .filter(
+            Payment.order_id == order.id,
+            Payment.order_created_at == order.created_at,
+            Payment.status.in_((PaymentStatus.PENDING.value, PaymentStatus.AUTHORIZED.value)),
+        )
+        .first()
+    )
+    if in_flight:
+        raise HTTPException(status_code=409, detail="Payment in progress")
 
     order.status = OrderStatus.CANCELLED.value
+    record_sales(db, [(order.id, order.created_at)], booked=-1)
     db.commit()
     return {"detail": "Order cancelled", "order_id": order.id}
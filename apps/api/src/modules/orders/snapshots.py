@@ -0,0 +1,97 @@
+"""Order read-model snapshots (orders.snapshot).
+
+Checkout writes the snapshot in the same transaction as the order, so it is
+never missing for new orders. This module also backfills (or, with --all,
+rebuilds) snapshots for existing orders in keyset-paginated batches:
+
+    python -m src.modules.orders.snapshots [--batch-size 1000] [--all]
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy.orm import Session
+
+from src.db.database import SessionLocal
+from src.db.models import Order, OrderItem
+
+log = logging.getLogger("orders.snapshots")
+
+
+def item_snapshot(item: OrderItem) -> Dict[str, Any]:
+    return {
+        "product_id": item.product_id,
+        "sku": item.sku,
+        "name": item.name,
+        "qty": item.qty,
+        "unit_price_cents": item.unit_price_cents,
+        "line_total_cents": item.line_total_cents,
+    }
+
+
+def build_snapshot(items: Iterable[OrderItem]) -> Dict[str, Any]:
+    return {"items": [item_snapshot(it) for it in items]}
+
+
+def rebuild_batch(
+    db: Session, after_id: int, batch_size: int, rebuild_all: bool
+) -> tuple[int, int] | None:
+    """Snapshot the next batch of orders with id > after_id.
+
+    Returns (last order id, orders snapshotted), or None when there are no more.
+    """
+    query = db.query(Order).filter(Order.id > after_id)
+    if not rebuild_all:
+        query = query.filter(Order.snapshot.is_(None))
+    orders: List[Order] = query.order_by(Order.id).limit(batch_size).with_for_update().all()
+    if not orders:
+        return None
+
+    items_by_order: Dict[int, List[OrderItem]] = {o.id: [] for o in orders}
+    for item in (
+        db.query(OrderItem)
+        .filter(
+            OrderItem.order_id.in_(list(items_by_order)),
+            # Lets the planner prune order_items to the batch's months
+            OrderItem.order_created_at.between(
+                min(o.created_at for o in orders), max(o.created_at for o in orders)
+            ),
+        )
+        .order_by(OrderItem.order_id, OrderItem.id)
+    ):
+        items_by_order[item.order_id].append(item)
+
+    for order in orders:
+        order.snapshot = build_snapshot(items_by_order[order.id])
+    db.commit()
+    return orders[-1].id, len(orders)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill orders.snapshot from order_items")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--all", action="store_true", help="rebuild every snapshot, not only missing ones"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    started = time.monotonic()
+    after_id, done = 0, 0
+    with SessionLocal() as db:
+        while True:
+            batch = rebuild_batch(db, after_id, args.batch_size, args.all)
+            if batch is None:
+                break
+            after_id, count = batch
+            done += count
+            log.info("snapshotted orders up to id %s", after_id)
+    log.info("done: %s orders in %.1fs", done, time.monotonic() - started)
+
+
+if __name__ == "__main__":
+    main()
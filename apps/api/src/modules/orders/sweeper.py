@@ -0,0 +1,188 @@
+"""Unpaid order sweeper: expires CREATED orders nobody paid for.
+
+Orders still CREATED ORDER_UNPAID_TTL_MINUTES after checkout become EXPIRED
+(they can no longer be paid or cancelled). Orders with a payment in flight
+are left alone: the payments worker settles them either way.
+
+Each batch is its own short transaction, so the sweeper runs next to live
+traffic without holding locks for long:
+
+1. lock up to ORDER_SWEEP_BATCH_SIZE candidates, oldest first, with
+   FOR UPDATE SKIP LOCKED: orders a checkout or payment is working on right
+   now are skipped, not waited for (a later run gets them);
+2. expire the locked ones that still have no payment in flight, and take
+   their lines back out of the sales rollups.
+
+Step 2 is a separate statement on purpose: it sees payments committed while
+step 1 waited for its locks, and a payment started after that blocks on our
+row lock and then finds the order EXPIRED. Batches walk (created_at, id)
+forward, so skipped orders don't come back within a run.
+
+Every run logs a report: orders expired and skipped, batches, orders/s and
+batch latency.
+
+    python -m src.modules.orders.sweeper [--once] [--older-than-minutes N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import signal
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+
+from src.core.config import settings
+from src.db.database import SessionLocal
+from src.modules.analytics.service import record_sales
+
+log = logging.getLogger("orders.sweeper")
+
+_LOCK_BATCH = text(
+    """
+    SELECT id, created_at FROM orders o
+    WHERE status = 'CREATED' AND created_at < :cutoff
+      AND (created_at, id) > (:after_created_at, :after_id)
+      AND NOT EXISTS (
+        SELECT 1 FROM payments p
+        WHERE p.order_id = o.id AND p.order_created_at = o.created_at
+          AND p.status IN ('PENDING', 'AUTHORIZED')
+      )
+    ORDER BY created_at, id
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+    """
+)
+
+_EXPIRE_LOCKED = text(
+    """
+    UPDATE orders o SET status = 'EXPIRED'
+    FROM unnest(CAST(:ids AS integer[]), CAST(:created_ats AS timestamptz[]))
+         AS b(id, created_at)
+    WHERE o.id = b.id AND o.created_at = b.created_at AND o.status = 'CREATED'
+      AND NOT EXISTS (
+        SELECT 1 FROM payments p
+        WHERE p.order_id = o.id AND p.order_created_at = o.created_at
+          AND p.status IN ('PENDING', 'AUTHORIZED')
+      )
+    RETURNING o.id, o.created_at
+    """
+)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class SweepReport:
+    expired: int = 0
+    skipped: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    batch_ms: list[float] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        rate = self.expired / self.seconds if self.seconds else 0.0
+        p50 = statistics.median(self.batch_ms) if self.batch_ms else 0.0
+        worst = max(self.batch_ms, default=0.0)
+        return (
+            f"expired {self.expired} orders ({self.skipped} skipped, payment in flight) "
+            f"in {self.batches} batches, {self.seconds:.2f}s, {rate:.0f} orders/s, "
+            f"batch p50 {p50:.1f} ms, max {worst:.1f} ms"
+        )
+
+
+def expire_batch(
+    cutoff: datetime, after: tuple[datetime, int], batch_size: int
+) -> tuple[int, int, Optional[tuple[datetime, int]]]:
+    """Expire one batch. Returns (expired, locked, last (created_at, id) locked)."""
+    with SessionLocal() as db:
+        rows = db.execute(
+            _LOCK_BATCH,
+            {
+                "cutoff": cutoff,
+                "after_created_at": after[0],
+                "after_id": after[1],
+                "limit": batch_size,
+            },
+        ).all()
+        if not rows:
+            db.rollback()
+            return 0, 0, None
+        expired = db.execute(
+            _EXPIRE_LOCKED,
+            {"ids": [r.id for r in rows], "created_ats": [r.created_at for r in rows]},
+        ).all()
+        record_sales(db, [tuple(r) for r in expired], booked=-1)
+        db.commit()
+    last = rows[-1]
+    return len(expired), len(rows), (last.created_at, last.id)
+
+
+def sweep(
+    older_than: timedelta,
+    batch_size: int,
+    stopping: Optional[threading.Event] = None,
+) -> SweepReport:
+    """Expire every CREATED order older than `older_than`, batch by batch."""
+    report = SweepReport()
+    cutoff = datetime.now(timezone.utc) - older_than
+    after = (_EPOCH, 0)
+    started = time.perf_counter()
+    while stopping is None or not stopping.is_set():
+        t0 = time.perf_counter()
+        expired, locked, last = expire_batch(cutoff, after, batch_size)
+        if last is None:
+            break
+        report.batch_ms.append((time.perf_counter() - t0) * 1000)
+        report.batches += 1
+        report.expired += expired
+        report.skipped += locked - expired
+        after = last
+        if locked < batch_size:
+            break
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def run(stopping: threading.Event, older_than: timedelta, batch_size: int, interval_s: float):
+    log.info("order sweeper started (unpaid after %s, batch_size=%s)", older_than, batch_size)
+    while not stopping.is_set():
+        try:
+            report = sweep(older_than, batch_size, stopping)
+            if report.batches:
+                log.info("%s", report)
+        except Exception:
+            log.exception("order sweep failed")
+        stopping.wait(interval_s)
+    log.info("order sweeper stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Expire CREATED orders that were never paid")
+    parser.add_argument(
+        "--older-than-minutes", type=float, default=settings.ORDER_UNPAID_TTL_MINUTES
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.ORDER_SWEEP_BATCH_SIZE)
+    parser.add_argument("--interval-s", type=float, default=settings.ORDER_SWEEP_INTERVAL_S)
+    parser.add_argument("--once", action="store_true", help="sweep once, print the report, exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    older_than = timedelta(minutes=args.older_than_minutes)
+    if args.once:
+        print(sweep(older_than, args.batch_size))
+        return
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+    run(stopping, older_than, args.batch_size, args.interval_s)
+
+
+if __name__ == "__main__":
+    main()
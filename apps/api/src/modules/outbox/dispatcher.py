@@ -0,0 +1,115 @@
+"""Outbox dispatcher: runs side effects recorded in outbox_events.
+
+Claims due events in batches with FOR UPDATE SKIP LOCKED, so several
+dispatchers can run side by side. Identical events in a batch (e.g. a burst of
+catalog invalidations) are handled once. Handled rows are deleted; failures
+are retried with exponential backoff and marked DEAD after
+OUTBOX_MAX_ATTEMPTS.
+
+Run with:  python -m src.modules.outbox.dispatcher
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import signal
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func
+from sqlalchemy.orm import Query, Session
+
+from src.core.config import settings
+from src.db.database import SessionLocal
+from src.db.models import OutboxEvent, OutboxStatus
+from src.modules.outbox import handlers  # noqa: F401  (registers handlers)
+from src.modules.outbox.service import HANDLERS
+
+log = logging.getLogger("outbox.dispatcher")
+
+MAX_BACKOFF_S = 300
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(MAX_BACKOFF_S, 2 ** (attempts - 1)))
+
+
+def _claim_query(db: Session, batch_size: int) -> Query:
+    return (
+        db.query(OutboxEvent)
+        .filter(
+            OutboxEvent.status == OutboxStatus.PENDING.value,
+            OutboxEvent.available_at <= func.now(),
+        )
+        .order_by(OutboxEvent.available_at, OutboxEvent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def dispatch_batch(batch_size: int) -> int:
+    """Handle one batch of due events. Returns the number of events claimed."""
+    with SessionLocal() as db:
+        events = _claim_query(db, batch_size).all()
+        if not events:
+            return 0
+
+        groups: dict[tuple[str, str], list[OutboxEvent]] = {}
+        for ev in events:
+            key = (ev.event_type, json.dumps(ev.payload, sort_keys=True))
+            groups.setdefault(key, []).append(ev)
+
+        done: list[int] = []
+        now = datetime.now(timezone.utc)
+        for (event_type, _), group in groups.items():
+            try:
+                HANDLERS[event_type](group[0].payload)
+            except Exception as e:
+                log.warning("outbox %s failed (%s events): %r", event_type, len(group), e)
+                for ev in group:
+                    ev.attempts += 1
+                    ev.last_error = repr(e)[:1000]
+                    if ev.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                        ev.status = OutboxStatus.DEAD.value
+                    else:
+                        ev.available_at = now + _backoff(ev.attempts)
+                continue
+            done.extend(ev.id for ev in group)
+
+        if done:
+            db.query(OutboxEvent).filter(OutboxEvent.id.in_(done)).delete(synchronize_session=False)
+        db.commit()
+        return len(events)
+
+
+def run(stopping: threading.Event, batch_size: int, poll_interval_s: float) -> None:
+    log.info("outbox dispatcher started (batch_size=%s)", batch_size)
+    while not stopping.is_set():
+        try:
+            claimed = dispatch_batch(batch_size)
+        except Exception:
+            log.exception("outbox dispatch failed")
+            claimed = 0
+        # Drain back-to-back while there is a backlog; otherwise poll
+        if claimed < batch_size:
+            stopping.wait(poll_interval_s)
+    log.info("outbox dispatcher stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Drain outbox_events and run their handlers")
+    parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE)
+    parser.add_argument("--poll-interval-ms", type=int, default=settings.OUTBOX_POLL_INTERVAL_MS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+    run(stopping, args.batch_size, args.poll_interval_ms / 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import Any, Dict
+
+from src.modules.cart.service import clear_cart
+from src.modules.catalog.bestsellers import record_units
+from src.modules.catalog.cache import invalidate_products_cache
+from src.modules.outbox.service import (
+    BESTSELLERS_RECORD,
+    CART_CLEAR,
+    CATALOG_INVALIDATE,
+    handler,
+)
+
+
+@handler(CART_CLEAR)
+def _clear_cart(payload: Dict[str, Any]) -> None:
+    # Payloads from before carts were versioned clear unconditionally
+    clear_cart(payload["user_id"], payload.get("cart_version"))
+
+
+@handler(CATALOG_INVALIDATE)
+def _invalidate_catalog(payload: Dict[str, Any]) -> None:
+    invalidate_products_cache(payload.get("product_ids"))
+
+
+@handler(BESTSELLERS_RECORD)
+def _record_bestsellers(payload: Dict[str, Any]) -> None:
+    units = {int(pid): qty for pid, qty in payload["units"].items()}
+    record_units(payload["order_id"], units, datetime.fromisoformat(payload["at"]))
@@ -0,0 +1,27 @@
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from src.db.models import OutboxEvent
+
+# Event types
+CART_CLEAR = "cart.clear"
+CATALOG_INVALIDATE = "catalog.invalidate"
+BESTSELLERS_RECORD = "bestsellers.record"
+
+Handler = Callable[[Dict[str, Any]], None]
+
+HANDLERS: Dict[str, Handler] = {}
+
+
+def handler(event_type: str) -> Callable[[Handler], Handler]:
+    def register(fn: Handler) -> Handler:
+        HANDLERS[event_type] = fn
+        return fn
+
+    return register
+
+
+def enqueue_event(db: Session, event_type: str, payload: Optional[Dict[str, Any]] = None) -> None:
+    """Record a side effect in the caller's transaction; it runs only if that commits."""
+    db.add(OutboxEvent(event_type=event_type, payload=payload or {}))
@@ -0,0 +1,40 @@
+import redis
+
+from src.core.config import settings
+from src.db.redis_client import get_redis
+
+# Job steps, processed in this order by the payments worker
+AUTHORIZE = "authorize"
+CAPTURE = "capture"
+
+
+def ensure_group() -> None:
+    try:
+        get_redis().xgroup_create(
+            settings.PAYMENTS_STREAM,
+            settings.PAYMENTS_CONSUMER_GROUP,
+            id="0",
+            mkstream=True,
+        )
+    except redis.ResponseError as e:
+        # Group already exists
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def enqueue_job(payment_id: int, step: str) -> str:
+    return get_redis().xadd(
+        settings.PAYMENTS_STREAM,
+        {"payment_id": str(payment_id), "step": step},
+        maxlen=settings.PAYMENTS_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+def dead_letter(fields: dict[str, str], error: str) -> None:
+    get_redis().xadd(
+        settings.PAYMENTS_DEAD_LETTER_STREAM,
+        {**fields, "error": error[:500]},
+        maxlen=settings.PAYMENTS_STREAM_MAXLEN,
+        approximate=True,
+    )
@@ -0,0 +1,228 @@
+"""Payment reconciliation: checks orders against their payments.
+
+For every order:
+
+- amount_mismatch     a SUCCEEDED payment's amount (dollars) is not the
+                      order's total_cents
+- currency_mismatch   a SUCCEEDED payment is in another currency
+- paid_without_payment   the order is PAID but has no SUCCEEDED payment
+- multiple_succeeded  the order has more than one SUCCEEDED payment
+- succeeded_unpaid    the order has a SUCCEEDED payment but is not PAID
+
+Mismatches are written to a CSV report; a summary with rows/s goes to stdout.
+
+Built to run against production data without getting in its way. Plain
+column tuples are streamed, never ORM objects. Orders are walked by id in
+chunks of RECONCILE_CHUNK_SIZE. Each chunk is one short REPEATABLE READ,
+READ ONLY transaction, so the orders and payments sides see the same
+snapshot (the payments worker marks payment and order in one transaction)
+and no snapshot is held for the whole run.
+
+In a chunk, both sides are read with server-side cursors, in batches:
+
+1. the chunk's SUCCEEDED payments, folded into per-order totals;
+2. its orders, checked a batch at a time against those totals.
+
+With RECONCILE_DATABASE_URL pointing at a replica the primary is not
+touched. On the primary, RECONCILE_CHUNK_PAUSE_MS spaces chunks out.
+--from-order-id resumes a run (or checks only recent orders).
+
+    python -m src.modules.payments.reconcile [--output reconcile.csv]
+        [--chunk-size N] [--pause-ms N] [--from-order-id ID]
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Iterator, Optional, TextIO
+
+from sqlalchemy import Connection, Engine, create_engine, text
+
+from src.core.config import settings
+from src.db.database import get_engine
+
+BATCH_SIZE = 2000
+
+# orders.id is an integer; the upper bound of the last chunk
+MAX_ORDER_ID = 2**31 - 1
+
+REPORT_COLUMNS = (
+    "order_id",
+    "order_created_at",
+    "check",
+    "order_status",
+    "total_cents",
+    "currency",
+    "succeeded_payments",
+    "paid_cents",
+    "payment_currencies",
+)
+
+_CHUNK_END = text("SELECT id FROM orders WHERE id > :after ORDER BY id OFFSET :offset LIMIT 1")
+
+_ORDERS = text(
+    """
+    SELECT id, created_at, status, total_cents, currency FROM orders
+    WHERE id > :after AND id <= :last
+    """
+)
+
+_SUCCEEDED_PAYMENTS = text(
+    """
+    SELECT order_id, amount, currency FROM payments
+    WHERE status = 'SUCCEEDED' AND order_id > :after AND order_id <= :last
+    """
+)
+
+
+@dataclass
+class PaidTotals:
+    count: int = 0
+    cents: int = 0
+    currencies: set[str] = field(default_factory=set)
+
+
+@dataclass
+class ReconcileStats:
+    orders: int = 0
+    payments: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    mismatches: dict[str, int] = field(default_factory=dict)
+
+    def __str__(self) -> str:
+        rows = self.orders + self.payments
+        rate = rows / self.seconds if self.seconds else 0.0
+        found = ", ".join(f"{k}={v}" for k, v in sorted(self.mismatches.items())) or "none"
+        return (
+            f"checked {self.orders} orders and {self.payments} payments in {self.chunks} "
+            f"chunks, {self.seconds:.2f}s, {rate:.0f} rows/s; mismatches: {found}"
+        )
+
+
+def _batches(conn: Connection, stmt, params: dict[str, Any]) -> Iterator[list[Any]]:
+    result = conn.execute(
+        stmt, params, execution_options={"stream_results": True, "max_row_buffer": BATCH_SIZE}
+    )
+    for batch in result.partitions(BATCH_SIZE):
+        yield batch
+
+
+def _to_cents(amount: Decimal) -> int:
+    return int(amount * 100)
+
+
+def check_orders(batch: list[Any], paid: dict[int, PaidTotals]) -> Iterator[tuple[str, tuple]]:
+    """(check, report row) for each mismatch in a batch of order rows."""
+    ids, created, statuses, totals, currencies = zip(*batch)
+    for i, order_id in enumerate(ids):
+        p = paid.get(order_id)
+        status = statuses[i]
+        problems = []
+        if p is None:
+            if status == "PAID":
+                problems.append("paid_without_payment")
+        else:
+            if p.count > 1:
+                problems.append("multiple_succeeded")
+            elif p.cents != totals[i]:
+                problems.append("amount_mismatch")
+            if p.currencies != {currencies[i]}:
+                problems.append("currency_mismatch")
+            if status != "PAID":
+                problems.append("succeeded_unpaid")
+        for check in problems:
+            yield check, (
+                order_id,
+                created[i].isoformat(),
+                check,
+                status,
+                totals[i],
+                currencies[i],
+                p.count if p else 0,
+                p.cents if p else 0,
+                " ".join(sorted(p.currencies)) if p else "",
+            )
+
+
+def reconcile_chunk(
+    conn: Connection, after: int, chunk_size: int, writer: Any, stats: ReconcileStats
+) -> Optional[int]:
+    """Check orders (after, after + chunk_size]. Returns the last order id, or
+    None when there are no more orders.
+    """
+    with conn.begin():
+        conn.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"))
+        last = conn.execute(_CHUNK_END, {"after": after, "offset": chunk_size - 1}).scalar()
+        params = {"after": after, "last": MAX_ORDER_ID if last is None else last}
+
+        paid: dict[int, PaidTotals] = {}
+        for batch in _batches(conn, _SUCCEEDED_PAYMENTS, params):
+            stats.payments += len(batch)
+            for order_id, amount, currency in batch:
+                totals = paid.setdefault(order_id, PaidTotals())
+                totals.count += 1
+                totals.cents += _to_cents(amount)
+                totals.currencies.add(currency)
+
+        max_id = None
+        for batch in _batches(conn, _ORDERS, params):
+            stats.orders += len(batch)
+            max_id = max(max_id or 0, max(row[0] for row in batch))
+            for check, row in check_orders(batch, paid):
+                stats.mismatches[check] = stats.mismatches.get(check, 0) + 1
+                writer.writerow(row)
+    if max_id is not None:
+        stats.chunks += 1
+    return max_id
+
+
+def reconcile(
+    engine: Engine,
+    out: TextIO,
+    chunk_size: int,
+    pause_s: float = 0.0,
+    from_order_id: int = 0,
+) -> ReconcileStats:
+    stats = ReconcileStats()
+    writer = csv.writer(out)
+    writer.writerow(REPORT_COLUMNS)
+    started = time.perf_counter()
+    after = from_order_id
+    with engine.connect() as conn:
+        while True:
+            last = reconcile_chunk(conn, after, chunk_size, writer, stats)
+            if last is None:
+                break
+            after = last
+            if pause_s:
+                time.sleep(pause_s)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reconcile orders against their payments")
+    parser.add_argument("--output", default="reconcile.csv", help="mismatch report (CSV)")
+    parser.add_argument("--chunk-size", type=int, default=settings.RECONCILE_CHUNK_SIZE)
+    parser.add_argument("--pause-ms", type=int, default=settings.RECONCILE_CHUNK_PAUSE_MS)
+    parser.add_argument("--from-order-id", type=int, default=0)
+    args = parser.parse_args()
+
+    engine = (
+        create_engine(settings.RECONCILE_DATABASE_URL)
+        if settings.RECONCILE_DATABASE_URL
+        else get_engine()
+    )
+    with open(args.output, "w", newline="") as out:
+        stats = reconcile(engine, out, args.chunk_size, args.pause_ms / 1000, args.from_order_id)
+    print(stats)
+    print(f"report: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
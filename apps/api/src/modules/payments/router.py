@@ -1,18 +1,58 @@
 from __future__ import annotations
 
 from decimal import Decimal
+from typing import Any
 
 from fastapi import APIRouter, Depends, Header, HTTPException
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Query, Session
 
+from src.core.idempotency import run_idempotent
 from src.db.models import Order, OrderStatus, Payment, PaymentStatus
 from src.db.session import get_db
+from src.modules.payments.queue import AUTHORIZE, enqueue_job
 
 router = APIRouter(prefix="/payments", tags=["payments"])
 
 
-@router.post("/pay")
+IN_FLIGHT_STATUSES = (PaymentStatus.PENDING.value, PaymentStatus.AUTHORIZED.value)
+
+
+def _serialize_payment(payment: Payment) -> dict[str, Any]:
+    return {
+        "payment_id": payment.id,
+        "order_id": payment.order_id,
+        "status": payment.status,
+        "amount": str(payment.amount),
+        "currency": payment.currency,
+        "idempotency_key": payment.idempotency_key,
+        "created_at": payment.created_at.isoformat() if payment.created_at else None,
+    }
+
+
+def _payment_for_key_query(db: Session, order_id: int, idempotency_key: str) -> Query:
+    return db.query(Payment).filter(
+        Payment.order_id == order_id, Payment.idempotency_key == idempotency_key
+    )
+
+
+def _payment_for_key(db: Session, order_id: int, idempotency_key: str) -> Payment | None:
+    return _payment_for_key_query(db, order_id, idempotency_key).first()
+
+
+def _key_or_in_flight_query(db: Session, order: Order, idempotency_key: str) -> Query:
+    return db.query(Payment).filter(
+        Payment.order_id == order.id,
+        Payment.order_created_at == order.created_at,
+        or_(
+            Payment.idempotency_key == idempotency_key,
+            Payment.status.in_(IN_FLIGHT_STATUSES),
+        ),
+    )
+
+
+@router.post("/pay", status_code=202)
 def pay_order(
     order_id: int,
     db: Session = Depends(get_db),
@@ -23,89 +63,83 @@ def pay_order(
     if not idempotency_key:
         raise HTTPException(status_code=400, detail="Idempotency-Key header is required")
 
-    # 1) Idempotent read first
-    existing = (
-        db.query(Payment)
-        .filter(Payment.order_id == order_id, Payment.idempotency_key == idempotency_key)
-        .first()
+    return run_idempotent(
+        "pay", str(order_id), idempotency_key, lambda: _pay_order(db, order_id, idempotency_key)
     )
+
+
+def _pay_order(db: Session, order_id: int, idempotency_key: str) -> dict[str, Any]:
+    # 1) Idempotent read first (a retry after the fact needs no lock)
+    existing = _payment_for_key(db, order_id, idempotency_key)
     if existing:
-        return {
-            "payment_id": existing.id,
-            "order_id": existing.order_id,
-            "status": existing.status,
-            "amount": str(existing.amount),
-            "currency": existing.currency,
-            "idempotency_key": existing.idempotency_key,
-            "created_at": existing.created_at.isoformat() if existing.created_at else None,
-        }
-
-    # 2) Validate order
-    order = db.query(Order).filter(Order.id == order_id).first()
+        return _serialize_payment(existing)
+
+    # 2) Validate order (row lock serializes concurrent pay attempts for the same order)
+    order = db.query(Order).filter(Order.id == order_id).with_for_update().first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
+    # Under the lock, one query for this key's payment and any in-flight one:
+    # a concurrent duplicate that waited on the lock finds the winner's row
+    # here and returns it, whatever the order's status is by now
+    payments = _key_or_in_flight_query(db, order, idempotency_key).all()
+    for payment in payments:
+        if payment.idempotency_key == idempotency_key:
+            return _serialize_payment(payment)
+
     if order.status == OrderStatus.CANCELLED.value:
         raise HTTPException(status_code=409, detail="Order is cancelled")
 
+    if order.status == OrderStatus.EXPIRED.value:
+        raise HTTPException(status_code=409, detail="Order has expired")
+
     # If already paid, only allow retry when same idempotency key existed (handled above)
     if order.status == OrderStatus.PAID.value:
         raise HTTPException(status_code=409, detail="Order is already paid")
 
-    # 3) Create payment (DB stores dollars in Numeric)
-    amount = (Decimal(order.total_cents) / Decimal("100")).quantize(Decimal("0.01"))
+    if payments:
+        raise HTTPException(status_code=409, detail="Payment already in progress")
 
-    payment = Payment(
-        order_id=order.id,
-        status=PaymentStatus.SUCCEEDED.value,
-        amount=amount,
-        currency=order.currency,
-        idempotency_key=idempotency_key,
-    )
+    # 3) Persist a PENDING payment (DB stores dollars in Numeric); the worker
+    #    authorizes/captures it and moves the order to PAID. ON CONFLICT keeps
+    #    a duplicate that got past the lock (none should) from failing.
+    amount = (Decimal(order.total_cents) / Decimal("100")).quantize(Decimal("0.01"))
 
     try:
-        db.add(payment)
-
-        # mark order paid in same transaction
-        order.status = OrderStatus.PAID.value
-
-        db.commit()
-        db.refresh(payment)
-
-    except IntegrityError:
-        # Another request likely inserted the same (order_id, idempotency_key).
-        # Return the winner row to keep behavior idempotent.
-        db.rollback()
-        winner = (
-            db.query(Payment)
-            .filter(Payment.order_id == order_id, Payment.idempotency_key == idempotency_key)
-            .first()
+        payment = db.scalar(
+            pg_insert(Payment)
+            .values(
+                order_id=order.id,
+                order_created_at=order.created_at,
+                status=PaymentStatus.PENDING.value,
+                amount=amount,
+                currency=order.currency,
+                idempotency_key=idempotency_key,
+            )
+            .on_conflict_do_nothing(
+                index_elements=["order_id", "order_created_at", "idempotency_key"]
+            )
+            .returning(Payment)
         )
-        if not winner:
-            raise
-        return {
-            "payment_id": winner.id,
-            "order_id": winner.order_id,
-            "status": winner.status,
-            "amount": str(winner.amount),
-            "currency": winner.currency,
-            "idempotency_key": winner.idempotency_key,
-            "created_at": winner.created_at.isoformat() if winner.created_at else None,
-        }
-
+        db.commit()
     except Exception:
         db.rollback()
         raise
 
-    return {
-        "payment_id": payment.id,
-        "order_id": payment.order_id,
-        "status": payment.status,
-        "amount": str(payment.amount),
-        "currency": payment.currency,
-        "idempotency_key": payment.idempotency_key,
-        "created_at": payment.created_at.isoformat() if payment.created_at else None,
-    }
+    if payment is None:
+        winner = _payment_for_key(db, order_id, idempotency_key)
+        if winner is None:
+            raise HTTPException(status_code=409, detail="Payment already in progress")
+        return _serialize_payment(winner)
+
+    # 4) Hand off to the worker. A lost enqueue is not fatal: the worker
+    #    periodically re-enqueues payments that stay PENDING for too long.
+    try:
+        enqueue_job(payment.id, AUTHORIZE)
+    except Exception:
+        pass
+
+    return _serialize_payment(payment)
 
 
 @router.get("/{payment_id}")
@@ -114,12 +148,4 @@ def get_payment(payment_id: int, db: Session = Depends(get_db)):
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
 
-    return {
-        "payment_id": payment.id,
-        "order_id": payment.order_id,
-        "status": payment.status,
-        "amount": str(payment.amount),
-        "currency": payment.currency,
-        "idempotency_key": payment.idempotency_key,
-        "created_at": payment.created_at.isoformat() if payment.created_at else None,
-    }
+    return _serialize_payment(payment)
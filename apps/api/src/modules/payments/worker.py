@@ -0,0 +1,297 @@
+"""Payments worker: authorizes and captures PENDING payments.
+
+Consumes jobs from the payments Redis stream through a consumer group, so
+several worker processes can share the load. Each job is acked only after its
+DB transaction commits; failed jobs stay pending and are reclaimed after
+PAYMENTS_RETRY_IDLE_MS, and are dead-lettered after PAYMENTS_MAX_DELIVERIES.
+
+Jobs are idempotent: every step re-reads the payment under a row lock and
+only acts when the payment is still in the state that step expects.
+
+Run with:  python -m src.modules.payments.worker
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import Query, Session
+
+from src.core.config import settings
+from src.db.database import SessionLocal
+from src.db.models import Order, OrderStatus, Payment, PaymentStatus
+from src.db.redis_client import create_redis, get_redis, redis_batch
+from src.modules.analytics.service import record_sales
+from src.modules.payments import provider
+from src.modules.payments.queue import (
+    AUTHORIZE,
+    CAPTURE,
+    dead_letter,
+    enqueue_job,
+    ensure_group,
+)
+
+log = logging.getLogger("payments.worker")
+
+RECLAIM_EVERY_S = 5
+STALE_SWEEP_EVERY_S = 60
+READ_BLOCK_MS = 1000
+
+
+def _amount_cents(payment: Payment) -> int:
+    return int(payment.amount * 100)
+
+
+def process_job(payment_id: int, step: str) -> None:
+    with SessionLocal() as db:
+        # SKIP LOCKED: a duplicate job for a payment another worker is busy
+        # with is simply dropped; that worker owns the transition.
+        payment = (
+            db.query(Payment)
+            .filter(Payment.id == payment_id)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if payment is None:
+            return
+
+        if step == AUTHORIZE:
+            if payment.status == PaymentStatus.AUTHORIZED.value:
+                # Authorized earlier but the capture job was never enqueued
+                enqueue_job(payment.id, CAPTURE)
+                return
+            if payment.status != PaymentStatus.PENDING.value:
+                return
+
+            ok, _ = provider.authorize(_amount_cents(payment))
+            payment.status = PaymentStatus.AUTHORIZED.value if ok else PaymentStatus.FAILED.value
+            db.commit()
+            if ok:
+                enqueue_job(payment.id, CAPTURE)
+            return
+
+        if step == CAPTURE:
+            if payment.status != PaymentStatus.AUTHORIZED.value:
+                return
+
+            ok, _ = provider.capture(_amount_cents(payment))
+            if ok:
+                order = (
+                    db.query(Order)
+                    .filter(
+                        Order.id == payment.order_id,
+                        Order.created_at == payment.order_created_at,
+                    )
+                    .with_for_update()
+                    .one()
+                )
+                payment.status = PaymentStatus.SUCCEEDED.value
+                order.status = OrderStatus.PAID.value
+                record_sales(db, [(order.id, order.created_at)], paid=1)
+            else:
+                payment.status = PaymentStatus.FAILED.value
+            db.commit()
+            return
+
+        raise ValueError(f"Unknown payment job step: {step!r}")
+
+
+def mark_failed(payment_id: int) -> None:
+    with SessionLocal() as db:
+        db.query(Payment).filter(
+            Payment.id == payment_id,
+            Payment.status.in_((PaymentStatus.PENDING.value, PaymentStatus.AUTHORIZED.value)),
+        ).update({Payment.status: PaymentStatus.FAILED.value}, synchronize_session=False)
+        db.commit()
+
+
+def _stale_payments_query(db: Session, cutoff: datetime, limit: int) -> Query:
+    return (
+        db.query(Payment.id, Payment.status)
+        .filter(
+            Payment.status.in_((PaymentStatus.PENDING.value, PaymentStatus.AUTHORIZED.value)),
+            Payment.created_at < cutoff,
+        )
+        .order_by(Payment.id)
+        .limit(limit)
+    )
+
+
+def requeue_stale_payments(limit: int = 500) -> int:
+    """Re-enqueue payments stuck in an in-flight state (e.g. a lost enqueue).
+
+    Each payment step is re-enqueued at most once per PAYMENTS_REQUEUE_AFTER_S
+    (a marker key per payment and step), so a backlog that is merely slow
+    isn't enqueued again on every sweep.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.PAYMENTS_STALE_AFTER_S)
+    with SessionLocal() as db:
+        rows = _stale_payments_query(db, cutoff, limit).all()
+    if not rows:
+        return 0
+    jobs = [
+        (payment_id, AUTHORIZE if status == PaymentStatus.PENDING.value else CAPTURE)
+        for payment_id, status in rows
+    ]
+    with redis_batch() as batch:
+        for payment_id, step in jobs:
+            batch.set(
+                f"payments:requeued:{payment_id}:{step}",
+                1,
+                nx=True,
+                ex=settings.PAYMENTS_REQUEUE_AFTER_S,
+            )
+    requeued = 0
+    for (payment_id, step), marked in zip(jobs, batch.results):
+        if marked:
+            enqueue_job(payment_id, step)
+            requeued += 1
+    return requeued
+
+
+class Worker:
+    def __init__(self, consumer: str, concurrency: int):
+        self.consumer = consumer
+        self.concurrency = concurrency
+        self.stopping = threading.Event()
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="pay")
+        self.in_flight: set[Future] = set()
+        self.processed = 0
+        self._processed_lock = threading.Lock()
+
+    def _handle(self, msg_id: str, fields: dict[str, str]) -> None:
+        r = get_redis()
+        try:
+            process_job(int(fields["payment_id"]), fields["step"])
+        except Exception:
+            # Leave the message pending; it is reclaimed and retried later
+            log.exception("payment job %s failed: %s", msg_id, fields)
+            return
+        r.xack(settings.PAYMENTS_STREAM, settings.PAYMENTS_CONSUMER_GROUP, msg_id)
+        # _handle runs on the pool's threads
+        with self._processed_lock:
+            self.processed += 1
+
+    def _dead_letter(self, msg_id: str, fields: dict[str, str], deliveries: int) -> None:
+        log.error(
+            "dead-lettering payment job %s after %s deliveries: %s", msg_id, deliveries, fields
+        )
+        if "payment_id" in fields:
+            mark_failed(int(fields["payment_id"]))
+        dead_letter(fields, f"exceeded {settings.PAYMENTS_MAX_DELIVERIES} deliveries")
+        get_redis().xack(settings.PAYMENTS_STREAM, settings.PAYMENTS_CONSUMER_GROUP, msg_id)
+
+    def _submit(self, messages: list[tuple[str, dict[str, str]]]) -> None:
+        for msg_id, fields in messages:
+            self.in_flight.add(self.pool.submit(self._handle, msg_id, fields))
+
+    def _reclaim(self, limit: int) -> None:
+        """Take over jobs whose consumer failed or crashed before acking them."""
+        r = get_redis()
+        _, messages, _ = r.xautoclaim(
+            settings.PAYMENTS_STREAM,
+            settings.PAYMENTS_CONSUMER_GROUP,
+            self.consumer,
+            min_idle_time=settings.PAYMENTS_RETRY_IDLE_MS,
+            start_id="0-0",
+            count=limit,
+        )
+        retry: list[tuple[str, dict[str, str]]] = []
+        for msg_id, fields in messages:
+            info = r.xpending_range(
+                settings.PAYMENTS_STREAM,
+                settings.PAYMENTS_CONSUMER_GROUP,
+                min=msg_id,
+                max=msg_id,
+                count=1,
+            )
+            deliveries = info[0]["times_delivered"] if info else 1
+            if deliveries > settings.PAYMENTS_MAX_DELIVERIES:
+                self._dead_letter(msg_id, fields or {}, deliveries)
+            elif fields:
+                retry.append((msg_id, fields))
+        self._submit(retry)
+
+    def run(self) -> None:
+        # Blocking reads get their own connection with a socket timeout longer
+        # than the block, so they don't trip the request-path timeout.
+        reader = create_redis(
+            max_connections=1,
+            socket_timeout=(READ_BLOCK_MS + settings.REDIS_SOCKET_TIMEOUT_MS) / 1000,
+        )
+        ensure_group()
+        log.info("payments worker %s started (concurrency=%s)", self.consumer, self.concurrency)
+
+        last_reclaim = 0.0
+        last_stale_sweep = 0.0
+        while not self.stopping.is_set():
+            self.in_flight = {f for f in self.in_flight if not f.done()}
+            free = self.concurrency - len(self.in_flight)
+            if free <= 0:
+                wait(self.in_flight, timeout=1.0, return_when=FIRST_COMPLETED)
+                continue
+
+            try:
+                now = time.monotonic()
+                if now - last_stale_sweep >= STALE_SWEEP_EVERY_S:
+                    last_stale_sweep = now
+                    requeued = requeue_stale_payments()
+                    if requeued:
+                        log.warning("re-enqueued %s stale payments", requeued)
+                if now - last_reclaim >= RECLAIM_EVERY_S:
+                    last_reclaim = now
+                    self._reclaim(free)
+                    continue
+
+                resp = reader.xreadgroup(
+                    settings.PAYMENTS_CONSUMER_GROUP,
+                    self.consumer,
+                    {settings.PAYMENTS_STREAM: ">"},
+                    count=free,
+                    block=READ_BLOCK_MS,
+                )
+            except Exception:
+                log.exception("payments worker loop error")
+                time.sleep(1.0)
+                continue
+
+            for _stream, messages in resp or []:
+                self._submit(messages)
+
+        wait(self.in_flight)
+        self.pool.shutdown()
+        log.info("payments worker %s stopped (processed=%s)", self.consumer, self.processed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Authorize/capture worker for PENDING payments")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.PAYMENTS_WORKER_CONCURRENCY,
+        help="max jobs processed in parallel by this process",
+    )
+    parser.add_argument(
+        "--consumer",
+        default=f"{socket.gethostname()}-{os.getpid()}",
+        help="consumer name within the group (must be unique per process)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    worker = Worker(consumer=args.consumer, concurrency=args.concurrency)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: worker.stopping.set())
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Multi-process API server: gunicorn with uvicorn workers, app preloaded.
+
+The app is imported once in the master (preload) and worker processes are
+forked from it. Nothing that holds a connection is created at import: the
+engine and Redis clients are created lazily, and src.db drops any inherited
+ones in the child after fork (os.register_at_fork), so every worker opens its
+own pool. Warm-up runs per worker, in the app's lifespan.
+
+With DB_CONNECTION_BUDGET set, each worker's pool gets an equal share of it
+(pool_size = budget // workers, no overflow), so scaling out workers never
+exceeds what Postgres was provisioned for. With CATALOG_SNAPSHOT_ENABLED,
+each worker's share also pays for the snapshot's LISTEN connection, which
+is outside the pool: its pool gets one connection less.
+
+    python -m src.serve [--workers N] [--bind 0.0.0.0:8000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+from typing import Any
+
+from gunicorn.app.base import BaseApplication
+
+from src.core.config import settings
+
+log = logging.getLogger("serve")
+
+
+def worker_count(requested: int | None = None) -> int:
+    return requested or settings.WEB_CONCURRENCY or os.cpu_count() or 1
+
+
+def pool_limits(workers: int) -> tuple[int, int]:
+    """(pool_size, max_overflow) for each worker."""
+    if settings.DB_CONNECTION_BUDGET <= 0:
+        return settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
+    per_worker = settings.DB_CONNECTION_BUDGET // workers
+    # The catalog snapshot's LISTEN connection (src/modules/catalog/snapshot.py)
+    reserved = 1 if settings.CATALOG_SNAPSHOT_ENABLED else 0
+    if per_worker - reserved < 1:
+        raise SystemExit(
+            f"DB_CONNECTION_BUDGET={settings.DB_CONNECTION_BUDGET} is less than "
+            f"{1 + reserved} connection(s) per worker ({workers} workers)"
+        )
+    return per_worker - reserved, 0
+
+
+def _child_exit(server: Any, worker: Any) -> None:
+    # Drop the dead worker's live gauges (in-flight requests, breaker state)
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+class Server(BaseApplication):
+    def __init__(self, options: dict[str, Any]):
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from src.main import create_app
+
+        return create_app()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes")
+    parser.add_argument("--workers", type=int, help="default: WEB_CONCURRENCY, else CPU count")
+    parser.add_argument("--bind", default="0.0.0.0:8000")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    workers = worker_count(args.workers)
+    # Read by the lazily created engine in each worker
+    settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW = pool_limits(workers)
+
+    # Must be set before prometheus_client is first imported (by the app)
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+    else:
+        metrics_dir = tempfile.mkdtemp(prefix="amazonlite-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+    log.info(
+        "starting %s workers, db pool %s+%s each",
+        workers,
+        settings.DB_POOL_SIZE,
+        settings.DB_MAX_OVERFLOW,
+    )
+    Server(
+        {
+            "bind": args.bind,
+            "workers": workers,
+            "worker_class": "uvicorn.workers.UvicornWorker",
+            "preload_app": True,
+            "child_exit": _child_exit,
+            "graceful_timeout": 30,
+            "keepalive": 5,
+        }
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
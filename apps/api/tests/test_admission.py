@@ -0,0 +1,104 @@
+import asyncio
+import os
+import uuid
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from src.core.admission import (
+    AdmissionControlMiddleware,
+    Priority,
+    classify,
+    client_identity,
+    in_flight_limit,
+)
+from src.core.config import settings
+
+
+def test_metrics_expose_admission_counters(client):
+    r = client.get("/metrics")
+    r.raise_for_status()
+    assert "http_requests_in_flight" in r.text
+    assert "http_requests_shed_total" in r.text
+    assert "http_requests_rate_limited_total" in r.text
+
+
+def test_health_is_not_rate_limited(client):
+    for _ in range(5):
+        assert client.get("/health").status_code == 200
+
+
+def test_classify():
+    assert classify("POST", "/orders/checkout") == Priority.HIGH
+    assert classify("POST", "/payments/pay/") == Priority.HIGH
+    assert classify("GET", "/products") == Priority.LOW
+    assert classify("GET", "/products/42") == Priority.NORMAL
+    assert classify("POST", "/products") == Priority.NORMAL
+
+
+def test_in_flight_limit(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_IN_FLIGHT", 64)
+    monkeypatch.setattr(settings, "ADMISSION_NORMAL_PRIORITY_SHARE", 0.75)
+    monkeypatch.setattr(settings, "ADMISSION_LOW_PRIORITY_SHARE", 0.5)
+    assert in_flight_limit(Priority.HIGH) == 64
+    assert in_flight_limit(Priority.NORMAL) == 48
+    assert in_flight_limit(Priority.LOW) == 32
+
+    # Every priority keeps at least one slot
+    monkeypatch.setattr(settings, "ADMISSION_MAX_IN_FLIGHT", 1)
+    assert in_flight_limit(Priority.LOW) == 1
+
+
+def test_client_identity_is_the_client_address():
+    scope = {"client": ("10.0.0.7", 50123), "query_string": b"user_id=alice"}
+    assert client_identity(scope) == "ip:10.0.0.7"
+    assert client_identity({**scope, "query_string": b"user_id=bob"}) == "ip:10.0.0.7"
+
+
+def _app() -> AdmissionControlMiddleware:
+    async def ok(request):
+        return PlainTextResponse("ok")
+
+    routes = [
+        Route("/products", ok, methods=["GET"]),
+        Route("/orders/checkout", ok, methods=["POST"]),
+    ]
+    return AdmissionControlMiddleware(Starlette(routes=routes))
+
+
+async def _send(app, requests: list[tuple[str, str]], client_ip: str) -> list[httpx.Response]:
+    transport = httpx.ASGITransport(app=app, client=(client_ip, 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        return [await c.request(method, path) for method, path in requests]
+
+
+def test_low_priority_is_shed_first(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    app = _app()
+    app.in_flight = in_flight_limit(Priority.LOW)
+
+    listing, checkout = asyncio.run(
+        _send(app, [("GET", "/products"), ("POST", "/orders/checkout")], "10.0.0.1")
+    )
+    assert listing.status_code == 503
+    assert listing.headers["retry-after"] == "1"
+    assert checkout.status_code == 200
+
+
+@pytest.mark.skipif(not os.getenv("REDIS_URL"), reason="REDIS_URL is not set")
+def test_rate_limit_answers_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_PER_SECOND", 1.0)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 3)
+    # A fresh bucket: an address no other test uses
+    client_ip = f"test-{uuid.uuid4().hex[:8]}"
+
+    responses = asyncio.run(_send(_app(), [("GET", "/products")] * 10, client_ip))
+    statuses = [r.status_code for r in responses]
+    assert statuses[0] == 200
+    assert 429 in statuses, statuses
+    limited = next(r for r in responses if r.status_code == 429)
+    assert limited.headers["retry-after"] == "1"
@@ -0,0 +1,84 @@
+import time
+import uuid
+from datetime import datetime, timezone
+
+
+def _create_product(client, price_cents: int) -> int:
+    r = client.post(
+        "/products",
+        json={
+            "sku": f"SALES-{uuid.uuid4().hex[:10]}",
+            "name": "Sales test product",
+            "price_cents": price_cents,
+            "stock_qty": 100,
+        },
+    )
+    r.raise_for_status()
+    return r.json()["id"]
+
+
+def _checkout(client, user_id: str, product_id: int, qty: int) -> int:
+    client.post(
+        f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": qty}
+    ).raise_for_status()
+    r = client.post(f"/orders/checkout?user_id={user_id}")
+    r.raise_for_status()
+    return r.json()["id"]
+
+
+def _product_sales(client, product_id: int) -> dict:
+    r = client.get(f"/analytics/sales?product_id={product_id}")
+    r.raise_for_status()
+    return r.json()["totals"]
+
+
+def test_rollups_follow_checkout_cancel_and_payment(client, user_id):
+    product_id = _create_product(client, 1500)
+
+    cancelled = _checkout(client, f"{user_id}_a", product_id, 2)
+    paid = _checkout(client, f"{user_id}_b", product_id, 3)
+    totals = _product_sales(client, product_id)
+    assert (totals["units"], totals["revenue_cents"]) == (5, 7500)
+    assert totals["paid_units"] == 0
+
+    client.post(f"/orders/{cancelled}/cancel?user_id={user_id}_a").raise_for_status()
+    assert _product_sales(client, product_id)["units"] == 3
+
+    r = client.post(f"/payments/pay?order_id={paid}", headers={"Idempotency-Key": user_id})
+    r.raise_for_status()
+    payment_id = r.json()["payment_id"]
+    deadline = time.time() + 20
+    while (status := client.get(f"/payments/{payment_id}").json()["status"]) not in (
+        "SUCCEEDED",
+        "FAILED",
+    ):
+        assert time.time() < deadline, "payment did not settle"
+        time.sleep(0.2)
+
+    totals = _product_sales(client, product_id)
+    assert (totals["units"], totals["revenue_cents"]) == (3, 4500)
+    if status == "SUCCEEDED":
+        assert (totals["paid_units"], totals["paid_revenue_cents"]) == (3, 4500)
+
+
+def test_top_products_and_daily_series(client, user_id):
+    # Outsells anything else booked today, including earlier runs of this test
+    now = datetime.now(timezone.utc)
+    price = 10_000_000 + now.hour * 3600 + now.minute * 60 + now.second
+    product_id = _create_product(client, price)
+    _checkout(client, user_id, product_id, 1)
+
+    today = now.date().isoformat()
+    r = client.get(f"/analytics/sales?from={today}&to={today}&top=5")
+    r.raise_for_status()
+    body = r.json()
+    assert [d["day"] for d in body["days"]] == [today]
+    top = body["top_products"][0]
+    assert top["product_id"] == product_id
+    assert top["sku"].startswith("SALES-")
+    assert top["revenue_cents"] == price
+
+
+def test_rejects_bad_ranges(client):
+    assert client.get("/analytics/sales?from=2026-02-01&to=2026-01-01").status_code == 422
+    assert client.get("/analytics/sales?from=2020-01-01&to=2026-01-01").status_code == 422
@@ -0,0 +1,72 @@
+import time
+
+from tests.conftest import ensure_product_id
+
+
+def _qty(body: dict, product_id: int) -> int:
+    return next((i["qty"] for i in body["items"] if i["product_id"] == product_id), 0)
+
+
+def test_cart_add_set_and_clear(client, user_id):
+    product_id = ensure_product_id(client)
+
+    client.post(f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 2})
+    r = client.post(f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 3})
+    r.raise_for_status()
+    assert _qty(r.json(), product_id) == 5
+
+    r = client.put(f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 1})
+    r.raise_for_status()
+    assert _qty(r.json(), product_id) == 1
+    assert _qty(client.get(f"/cart?user_id={user_id}").json(), product_id) == 1
+
+    client.delete(f"/cart?user_id={user_id}").raise_for_status()
+    assert client.get(f"/cart?user_id={user_id}").json()["items"] == []
+
+
+def test_metrics_expose_redis_round_trips_per_request(client, user_id):
+    client.get(f"/cart?user_id={user_id}").raise_for_status()
+    text = client.get("/metrics").text
+    assert 'redis_round_trips_per_request_count{route="/cart"}' in text
+    assert "redis_commands_total" in text
+    assert 'circuit_breaker_state{name="redis"}' in text
+
+
+def test_cart_expand_products_prices_lines(client, user_id):
+    product_id = ensure_product_id(client)
+    product = client.get(f"/products/{product_id}").json()
+    client.post(f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 2})
+
+    plain = client.get(f"/cart?user_id={user_id}").json()
+    assert set(plain) == {"user_id", "items"}
+
+    # Twice: the second read is served from the product cache
+    for _ in range(2):
+        r = client.get(f"/cart?user_id={user_id}&expand=products")
+        r.raise_for_status()
+        body = r.json()
+        (line,) = body["items"]
+        assert line["name"] == product["name"]
+        assert line["unit_price_cents"] == product["price_cents"]
+        assert line["line_total_cents"] == 2 * product["price_cents"]
+        assert body["total_cents"] == 2 * product["price_cents"]
+        assert line["available"] is True
+
+
+def test_cart_expand_reflects_product_updates(client, user_id):
+    r = client.post(
+        "/products",
+        json={"sku": f"SKU-{user_id}", "name": "Cart price test", "price_cents": 500},
+    )
+    r.raise_for_status()
+    product_id = r.json()["id"]
+    client.post(f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 1})
+    url = f"/cart?user_id={user_id}&expand=products"
+    assert client.get(url).json()["total_cents"] == 500
+
+    client.patch(f"/products/{product_id}", json={"price_cents": 700}).raise_for_status()
+    # Cache entries are dropped by the outbox dispatcher shortly after commit
+    deadline = time.time() + 5
+    while client.get(url).json()["total_cents"] != 700:
+        assert time.time() < deadline, "cached product was not invalidated"
+        time.sleep(0.1)
@@ -0,0 +1,86 @@
+import time
+import uuid
+
+
+def _ensure_large_catalog(client) -> None:
+    # Enough products with descriptions to push a page over the compression threshold
+    for _ in range(5):
+        sku = f"TEST-CMP-{uuid.uuid4().hex[:8]}"
+        client.post(
+            "/products",
+            json={
+                "sku": sku,
+                "name": f"Compression test {sku}",
+                "description": "A long, repetitive product description. " * 20,
+                "price_cents": 1234,
+                "stock_qty": 5,
+            },
+        ).raise_for_status()
+
+
+def test_product_list_is_served_compressed(client):
+    _ensure_large_catalog(client)
+
+    identity = client.get("/products?limit=100", headers={"Accept-Encoding": "identity"})
+    identity.raise_for_status()
+    assert "content-encoding" not in identity.headers
+
+    gz = client.get("/products?limit=100", headers={"Accept-Encoding": "gzip"})
+    gz.raise_for_status()
+    assert gz.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in gz.headers["vary"]
+    assert gz.json()["items"]
+
+    # Representations differ, so their ETags must too
+    assert gz.headers["etag"] != identity.headers["etag"]
+
+
+def test_gzip_refused_with_q_zero(client):
+    # openapi.json: large, and without validators, so gzipped on the fly
+    gz = client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["content-encoding"] == "gzip"
+
+    refused = client.get("/openapi.json", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    refused.raise_for_status()
+    assert "content-encoding" not in refused.headers
+
+
+def test_responses_with_etag_are_not_gzipped_on_the_fly(client):
+    sku = f"TEST-CMP-{uuid.uuid4().hex[:8]}"
+    created = client.post(
+        "/products",
+        json={
+            "sku": sku,
+            "name": f"Compression test {sku}",
+            "description": "A long, repetitive product description. " * 60,
+            "price_cents": 1234,
+            "stock_qty": 5,
+        },
+    )
+    created.raise_for_status()
+
+    r = client.get(f"/products/{created.json()['id']}", headers={"Accept-Encoding": "gzip"})
+    r.raise_for_status()
+    assert len(r.content) > 1024
+    assert "content-encoding" not in r.headers
+    assert r.headers["etag"].startswith('"p')
+
+
+def test_small_page_etag_names_no_encoding(client):
+    # No matches: a page far under the compression threshold
+    url = f"/products?q=no-such-product-{uuid.uuid4().hex}"
+    for _ in range(20):
+        r = client.get(url, headers={"Accept-Encoding": "gzip"})
+        r.raise_for_status()
+        assert "content-encoding" not in r.headers
+        assert not r.headers["etag"].endswith('-gzip"')
+
+        again = client.get(
+            url, headers={"Accept-Encoding": "gzip", "If-None-Match": r.headers["etag"]}
+        )
+        if again.status_code == 304:
+            break
+        # The catalog generation moved in between (an earlier test's product
+        # invalidated by the outbox): revalidate the new page
+        time.sleep(0.1)
+    assert again.status_code == 304
@@ -0,0 +1,27 @@
+def test_ready_reports_dependency_checks(client):
+    r = client.get("/ready")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["ready"] is True
+    assert body["degraded"] is False
+    assert body["checks"] == {"postgres": "ok", "redis": "ok"}
+
+
+def test_health_is_liveness_only(client):
+    r = client.get("/health")
+    r.raise_for_status()
+    assert r.json() == {"ok": True}
+
+
+def test_warm_up_primes_first_catalog_page(client):
+    # Answered from the cache the warm-up filled (the page is cached in every
+    # encoding, so a compressed hit needs no work either)
+    r = client.get("/products", headers={"Accept-Encoding": "gzip"})
+    r.raise_for_status()
+    assert r.json()["limit"] == 20
+
+
+def test_metrics_expose_postgres_breaker(client):
+    client.get("/products").raise_for_status()
+    r = client.get("/metrics")
+    assert 'circuit_breaker_state{name="postgres"} 0.0' in r.text
@@ -0,0 +1,93 @@
+import time
+import uuid
+
+from tests.conftest import ensure_product_id
+
+
+def test_product_list_conditional_get(client):
+    ensure_product_id(client)
+
+    r1 = client.get("/products")
+    r1.raise_for_status()
+    etag = r1.headers["etag"]
+    assert "max-age" in r1.headers["cache-control"]
+
+    r2 = client.get("/products", headers={"If-None-Match": etag})
+    assert r2.status_code == 304
+    assert r2.headers["etag"] == etag
+    assert r2.content == b""
+
+
+def test_product_list_etag_changes_with_the_write(client):
+    ensure_product_id(client)
+    etag = client.get("/products").headers["etag"]
+
+    sku = f"TEST-ETAG-{uuid.uuid4().hex[:8]}"
+    created = client.post(
+        "/products",
+        json={"sku": sku, "name": f"ETag test {sku}", "price_cents": 500, "stock_qty": 1},
+    )
+    created.raise_for_status()
+
+    # No wait for the outbox: the write's response comes after the bump
+    r = client.get("/products", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert r.json()["items"][0]["sku"] == sku
+
+
+def test_product_conditional_get(client):
+    product_id = ensure_product_id(client)
+
+    r1 = client.get(f"/products/{product_id}")
+    r1.raise_for_status()
+
+    r2 = client.get(f"/products/{product_id}", headers={"If-None-Match": r1.headers["etag"]})
+    assert r2.status_code == 304
+
+
+def test_product_etag_follows_version(client):
+    r = client.post(
+        "/products",
+        json={"sku": f"ETAG-{uuid.uuid4().hex[:10]}", "name": "ETag test", "price_cents": 100},
+    )
+    r.raise_for_status()
+    product_id = r.json()["id"]
+    etag = client.get(f"/products/{product_id}").headers["etag"]
+
+    client.patch(f"/products/{product_id}", json={"price_cents": 150}).raise_for_status()
+    # The old ETag validates until the served copy is the new version, and
+    # then never again
+    for _ in range(50):
+        r = client.get(f"/products/{product_id}", headers={"If-None-Match": etag})
+        if r.status_code == 200:
+            break
+        time.sleep(0.1)
+    assert r.status_code == 200
+    assert r.json()["price_cents"] == 150
+    assert r.headers["etag"] != etag
+
+
+def test_order_etag_changes_with_status(client, user_id):
+    product_id = ensure_product_id(client)
+    client.post(
+        f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 1}
+    ).raise_for_status()
+    order = client.post(
+        f"/orders/checkout?user_id={user_id}", headers={"Idempotency-Key": f"etag_{user_id}"}
+    ).json()
+    url = f"/orders/{order['id']}?user_id={user_id}"
+
+    r1 = client.get(url)
+    r1.raise_for_status()
+    etag = r1.headers["etag"]
+    assert r1.headers["cache-control"].startswith("private")
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    client.post(f"/orders/{order['id']}/cancel?user_id={user_id}").raise_for_status()
+
+    r3 = client.get(url, headers={"If-None-Match": etag})
+    assert r3.status_code == 200
+    assert r3.headers["etag"] != etag
+    assert r3.json()["status"] == "CANCELLED"
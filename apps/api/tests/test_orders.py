@@ -1,3 +1,11 @@
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
 from tests.conftest import ensure_product_id
 
 
@@ -38,3 +46,131 @@ def test_checkout_idempotency_per_user(client, user_id):
 
     assert order1["id"] == order2["id"]
     assert order2["user_id"] == user_id
+
+
+def test_concurrent_checkout_duplicates_return_same_order(client, user_id):
+    product_id = ensure_product_id(client)
+    client.post(
+        f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 1}
+    ).raise_for_status()
+
+    idem = f"order_key_race_{user_id}"
+
+    def checkout(_):
+        r = client.post(f"/orders/checkout?user_id={user_id}", headers={"Idempotency-Key": idem})
+        r.raise_for_status()
+        return r.json()["id"]
+
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        ids = list(ex.map(checkout, range(8)))
+
+    assert len(set(ids)) == 1
+
+
+def test_checkout_clears_cart_after_commit(client, user_id):
+    product_id = ensure_product_id(client)
+    client.post(
+        f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 1}
+    ).raise_for_status()
+
+    client.post(
+        f"/orders/checkout?user_id={user_id}", headers={"Idempotency-Key": f"clear_{user_id}"}
+    ).raise_for_status()
+
+    # Cleared before checkout returns: a second checkout has nothing to book
+    assert client.get(f"/cart?user_id={user_id}").json()["items"] == []
+    assert client.post(f"/orders/checkout?user_id={user_id}").status_code == 400
+
+    # The outbox's retry of the clear only applies to the cart checkout read,
+    # so items added right after checkout stay
+    client.post(
+        f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 2}
+    ).raise_for_status()
+    time.sleep(1)
+    items = client.get(f"/cart?user_id={user_id}").json()["items"]
+    assert [(i["product_id"], i["qty"]) for i in items] == [(product_id, 2)]
+
+
+def test_order_reads_return_checkout_lines(client, user_id):
+    product_id = ensure_product_id(client)
+    client.post(f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 3})
+    r = client.post(
+        f"/orders/checkout?user_id={user_id}", headers={"Idempotency-Key": f"snap_{user_id}"}
+    )
+    r.raise_for_status()
+    order = r.json()
+    assert [(i["product_id"], i["qty"]) for i in order["items"]] == [(product_id, 3)]
+
+    fetched = client.get(f"/orders/{order['id']}?user_id={user_id}").json()
+    listed = client.get(f"/orders?user_id={user_id}").json()["orders"]
+    assert fetched["items"] == order["items"]
+    assert [o["id"] for o in listed] == [order["id"]]
+    assert listed[0]["items"] == order["items"]
+
+
+def test_checkout_prices_from_current_product_version(client, user_id):
+    r = client.post(
+        "/products",
+        json={"sku": f"VER-{user_id}", "name": "Versioned", "price_cents": 1000, "stock_qty": 5},
+    )
+    r.raise_for_status()
+    product = r.json()
+    assert product["version"] == 1
+
+    # Cache the version-1 snapshot, then reprice. The cached entry is dropped
+    # asynchronously, so checkout may still find the old one in the cache.
+    client.post("/products:batchGet", json={"ids": [product["id"]]}).raise_for_status()
+    r = client.patch(f"/products/{product['id']}", json={"price_cents": 1500})
+    r.raise_for_status()
+    assert r.json()["version"] == 2
+
+    client.post(
+        f"/cart/items?user_id={user_id}", json={"product_id": product["id"], "qty": 2}
+    ).raise_for_status()
+    r = client.post(f"/orders/checkout?user_id={user_id}")
+    r.raise_for_status()
+    order = r.json()
+    assert order["total_cents"] == 3000
+    assert order["items"][0]["unit_price_cents"] == 1500
+
+
+def _checkout(client, user_id: str, product_id: int) -> int:
+    client.post(
+        f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 1}
+    ).raise_for_status()
+    r = client.post(f"/orders/checkout?user_id={user_id}")
+    r.raise_for_status()
+    return r.json()["id"]
+
+
+@pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="DATABASE_URL is not set")
+def test_sweeper_expires_unpaid_orders(client, user_id):
+    product_id = ensure_product_id(client)
+    unpaid = _checkout(client, user_id, product_id)
+    paying = _checkout(client, f"{user_id}_p", product_id)
+    r = client.post(
+        f"/payments/pay?order_id={paying}", headers={"Idempotency-Key": f"sweep_{user_id}"}
+    )
+    r.raise_for_status()
+    payment_id = r.json()["payment_id"]
+
+    # Everything unpaid counts as stale with a zero age
+    out = subprocess.run(
+        [sys.executable, "-m", "src.modules.orders.sweeper", "--once", "--older-than-minutes", "0"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert "orders/s" in out
+
+    order = client.get(f"/orders/{unpaid}?user_id={user_id}").json()
+    assert order["status"] == "EXPIRED"
+    assert client.post(f"/orders/{unpaid}/cancel?user_id={user_id}").status_code == 409
+    r = client.post(f"/payments/pay?order_id={unpaid}", headers={"Idempotency-Key": user_id})
+    assert r.status_code == 409
+
+    # Its payment was in flight or has succeeded since, so it was left alone
+    # (unless the simulated provider declined it, which leaves it unpaid)
+    if client.get(f"/payments/{payment_id}").json()["status"] != "FAILED":
+        order = client.get(f"/orders/{paying}?user_id={user_id}_p").json()
+        assert order["status"] != "EXPIRED"
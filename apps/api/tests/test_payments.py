@@ -1,3 +1,13 @@
+import csv
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine, text
+
 from tests.conftest import ensure_product_id
 
 
@@ -30,7 +40,108 @@ def test_payment_idempotency_per_order(client, user_id):
     pay2 = p2.json()
 
     assert pay1["payment_id"] == pay2["payment_id"]
-    assert pay2["status"] in (
-        "SUCCEEDED",
-        "FAILED",
-    )  # depending on fail_rate default, usually SUCCEEDED
+    # Authorize/capture runs in the payments worker, so the payment may still be in flight
+    assert pay2["status"] in ("PENDING", "AUTHORIZED", "SUCCEEDED", "FAILED")
+
+
+def test_concurrent_payment_duplicates_return_same_payment(client, user_id):
+    product_id = ensure_product_id(client)
+    client.post(
+        f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 1}
+    ).raise_for_status()
+    r = client.post(
+        f"/orders/checkout?user_id={user_id}", headers={"Idempotency-Key": f"race_{user_id}"}
+    )
+    r.raise_for_status()
+    order_id = r.json()["id"]
+
+    idem = f"pay_key_race_{user_id}"
+
+    def pay(_):
+        r = client.post(f"/payments/pay?order_id={order_id}", headers={"Idempotency-Key": idem})
+        r.raise_for_status()
+        return r.json()["payment_id"]
+
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        ids = list(ex.map(pay, range(8)))
+
+    assert len(set(ids)) == 1
+
+
+def test_payment_settles_asynchronously(client, user_id):
+    product_id = ensure_product_id(client)
+
+    client.post(
+        f"/cart/items?user_id={user_id}", json={"product_id": product_id, "qty": 1}
+    ).raise_for_status()
+    order_resp = client.post(
+        f"/orders/checkout?user_id={user_id}", headers={"Idempotency-Key": f"settle_{user_id}"}
+    )
+    order_resp.raise_for_status()
+    order_id = int(order_resp.json()["id"])
+
+    p = client.post(
+        f"/payments/pay?order_id={order_id}", headers={"Idempotency-Key": f"pay_{user_id}"}
+    )
+    assert p.status_code == 202
+    assert p.json()["status"] == "PENDING"
+    payment_id = p.json()["payment_id"]
+
+    # Poll until the worker settles the payment
+    status = None
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        status = client.get(f"/payments/{payment_id}").json()["status"]
+        if status in ("SUCCEEDED", "FAILED"):
+            break
+        time.sleep(0.2)
+    assert status in ("SUCCEEDED", "FAILED")
+
+    order = client.get(f"/orders/{order_id}?user_id={user_id}").json()
+    assert order["status"] == ("PAID" if status == "SUCCEEDED" else "CREATED")
+
+
+@pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="DATABASE_URL is not set")
+def test_reconcile_reports_paid_order_without_payment(client, user_id, tmp_path):
+    product_id = ensure_product_id(client)
+    order_ids = []
+    for n in range(3):
+        # A buyer (and cart) per order
+        buyer = f"{user_id}_{n}"
+        client.post(
+            f"/cart/items?user_id={buyer}", json={"product_id": product_id, "qty": 1}
+        ).raise_for_status()
+        r = client.post(f"/orders/checkout?user_id={buyer}")
+        r.raise_for_status()
+        order_ids.append(r.json()["id"])
+
+    # Marked PAID behind the payments pipeline's back
+    engine = create_engine(os.environ["DATABASE_URL"])
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE orders SET status = 'PAID' WHERE id = :id"), {"id": order_ids[1]})
+    engine.dispose()
+
+    report = tmp_path / "reconcile.csv"
+    out = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "src.modules.payments.reconcile",
+            "--output",
+            str(report),
+            "--chunk-size",
+            "2",
+            "--from-order-id",
+            str(order_ids[0] - 1),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert "rows/s" in out
+
+    with report.open() as f:
+        rows = [row for row in csv.DictReader(f) if int(row["order_id"]) in order_ids]
+    assert [(int(r["order_id"]), r["check"]) for r in rows] == [
+        (order_ids[1], "paid_without_payment")
+    ]
@@ -0,0 +1,164 @@
+import os
+import re
+import time
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+
+from tests.conftest import ensure_product_id
+
+
+def test_batch_get_keeps_request_order_and_reports_missing(client):
+    ensure_product_id(client)
+    ids = [p["id"] for p in client.get("/products?limit=3").json()["items"]]
+    assert ids
+    wanted = [*reversed(ids), 999_999_999, ids[0]]
+
+    # Twice: the second call is served from the product cache
+    for _ in range(2):
+        r = client.post("/products:batchGet", json={"ids": wanted})
+        r.raise_for_status()
+        body = r.json()
+        assert [p["id"] for p in body["items"]] == list(reversed(ids))
+        assert body["missing"] == [999_999_999]
+
+
+def test_batch_get_limits_ids(client):
+    assert client.post("/products:batchGet", json={"ids": []}).status_code == 422
+    assert client.post("/products:batchGet", json={"ids": list(range(1, 502))}).status_code == 422
+
+
+def _create_in_currency(client, currency: str, price_cents: int, stock_qty: int) -> int:
+    r = client.post(
+        "/products",
+        json={
+            "sku": f"FACET-{uuid.uuid4().hex[:10]}",
+            "name": "Facet test product",
+            "price_cents": price_cents,
+            "currency": currency,
+            "stock_qty": stock_qty,
+        },
+    )
+    r.raise_for_status()
+    return r.json()["id"]
+
+
+def test_filters_and_facets(client):
+    # A currency of its own keeps the counts independent of other products
+    currency = f"T{uuid.uuid4().hex[:5]}".upper()
+    cheap = _create_in_currency(client, currency, 500, 3)
+    mid = _create_in_currency(client, currency, 3000, 0)
+    dear = _create_in_currency(client, currency, 20000, 7)
+
+    r = client.get(f"/products?currency={currency.lower()}&min_price_cents=1000")
+    r.raise_for_status()
+    assert [p["id"] for p in r.json()["items"]] == [dear, mid]
+    assert r.json()["total"] == 2
+
+    r = client.get(f"/products?currency={currency}&in_stock=true&max_price_cents=25000")
+    assert [p["id"] for p in r.json()["items"]] == [dear, cheap]
+
+    r = client.get(f"/products/facets?currency={currency}")
+    r.raise_for_status()
+    facets = r.json()
+    assert facets["total"] == 3
+    assert facets["in_stock"] == 2
+    assert facets["currencies"] == [{"currency": currency, "count": 3}]
+    counts = {(b["min_cents"], b["max_cents"]): b["count"] for b in facets["price_buckets"]}
+    assert counts[(0, 1000)] == 1
+    assert counts[(2500, 5000)] == 1
+    assert counts[(10000, None)] == 1
+
+    # A catalog write moves the generation, so cached facets are not reused
+    _create_in_currency(client, currency, 600, 1)
+    deadline = time.time() + 5
+    while client.get(f"/products/facets?currency={currency}").json()["total"] != 4:
+        assert time.time() < deadline, "facets did not pick up the new product"
+        time.sleep(0.1)
+
+
+def test_rejects_inverted_price_range(client):
+    r = client.get("/products?min_price_cents=500&max_price_cents=100")
+    assert r.status_code == 422
+
+
+def _warmed_hits(client) -> float:
+    text = client.get("/metrics").text
+    match = re.search(r'catalog_list_cache_lookups_total\{result="warmed_hit"\} (\S+)', text)
+    return float(match.group(1))
+
+
+def test_warmer_rerenders_popular_page_after_invalidation(client):
+    currency = f"W{uuid.uuid4().hex[:5]}".upper()
+    _create_in_currency(client, currency, 1000, 1)
+    url = f"/products?currency={currency}"
+    # Requested often enough to be among the pages the warmer keeps cached
+    for _ in range(20):
+        client.get(url).raise_for_status()
+
+    # A write retires every cached page; the warmer renders this one again
+    # before it is next requested. A request that beats the warmer fills the
+    # page itself, so allow a few rounds.
+    for _ in range(3):
+        before = _warmed_hits(client)
+        product_id = _create_in_currency(client, currency, 2000, 1)
+        time.sleep(2)
+        r = client.get(url)
+        r.raise_for_status()
+        if _warmed_hits(client) > before:
+            assert product_id in [p["id"] for p in r.json()["items"]]
+            return
+    raise AssertionError("no hit on a warmed page")
+
+
+def test_best_sellers_follow_checkouts(client):
+    product_id = _create_in_currency(client, "USD", 100, 1000)
+    # Two full carts from different buyers: more units than other tests sell
+    for _ in range(2):
+        buyer = f"test_{uuid.uuid4().hex[:8]}"
+        client.post(
+            f"/cart/items?user_id={buyer}", json={"product_id": product_id, "qty": 50}
+        ).raise_for_status()
+        client.post(f"/orders/checkout?user_id={buyer}").raise_for_status()
+
+    # Counted by the outbox dispatcher once the checkouts commit
+    top = {}
+    for _ in range(50):
+        r = client.get("/products/top", params={"window": "7d", "limit": 100})
+        r.raise_for_status()
+        top = {p["id"]: p["units_sold"] for p in r.json()["items"]}
+        if top.get(product_id) == 100:
+            break
+        time.sleep(0.1)
+    assert top.get(product_id) == 100
+
+    r = client.get("/products", params={"sort": "popular", "limit": 100})
+    r.raise_for_status()
+    assert product_id in [p["id"] for p in r.json()["items"]]
+    assert client.get("/products", params={"sort": "popular", "q": "x"}).status_code == 422
+
+
+def test_product_reads_follow_updates(client):
+    # Through the product cache, or the catalog snapshot when it is enabled
+    product_id = _create_in_currency(client, "USD", 100, 1)
+    assert client.get(f"/products/{product_id}").json()["price_cents"] == 100
+    client.patch(f"/products/{product_id}", json={"price_cents": 250}).raise_for_status()
+    for _ in range(50):
+        if client.get(f"/products/{product_id}").json()["price_cents"] == 250:
+            return
+        time.sleep(0.1)
+    raise AssertionError("update not visible")
+
+
+@pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="DATABASE_URL is not set")
+def test_product_writes_notify_changed_ids(client):
+    engine = create_engine(os.environ["DATABASE_URL"])
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        listener = conn.connection.driver_connection
+        listener.execute("LISTEN catalog_changes")
+        product_id = _create_in_currency(client, "USD", 100, 1)
+        client.patch(f"/products/{product_id}", json={"stock_qty": 5}).raise_for_status()
+        payloads = [n.payload for n in listener.notifies(timeout=2)]
+    engine.dispose()
+    assert payloads.count(str(product_id)) == 2
@@ -0,0 +1,298 @@
+"""EXPLAIN-based regression tests for the hot queries.
+
+Seeds a realistic amount of data in a transaction that is rolled back at the
+end, ANALYZEs it, and checks the plan of every query the hot endpoints and
+workers run: it must use indexes, must not sort more rows than it returns,
+and must estimate a bounded number of rows. A schema or query change that
+drops an index or breaks an ordering fails here instead of in production.
+
+The statements are the app's own: ORM queries are built by the functions
+the endpoints use and compiled with their parameters inlined, and raw SQL is
+imported from the module that runs it. Talks to Postgres directly via
+DATABASE_URL (set in the api container).
+"""
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import TextClause, create_engine, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query, Session
+
+from src.db.models import Order, Payment, Product
+from src.modules.catalog.service import ProductFilters, product_page, products_by_id
+from src.modules.orders.router import (
+    _order_for_key_query,
+    _order_items_query,
+    _user_orders_query,
+    _versioned_order_query,
+)
+from src.modules.orders.sweeper import _LOCK_BATCH
+from src.modules.outbox.dispatcher import _claim_query
+from src.modules.payments.reconcile import _CHUNK_END, _SUCCEEDED_PAYMENTS
+from src.modules.payments.router import _key_or_in_flight_query, _payment_for_key_query
+from src.modules.payments.worker import _stale_payments_query
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="DATABASE_URL is not set")
+
+USERS = 200
+ORDERS = 20_000
+PRODUCTS = 20_000
+PAGE = 20
+
+SEED = [
+    # 10% of the catalog inactive, 10% in EUR, a few percent out of stock
+    """
+    INSERT INTO products (sku, name, price_cents, currency, stock_qty, is_active)
+    SELECT 'plan-' || g, 'Plan product ' || g, 100 + (g * 7919) % 20000,
+           CASE WHEN g % 10 = 3 THEN 'EUR' ELSE 'USD' END, g % 50, g % 10 <> 0
+    FROM generate_series(1, :products) g
+    """,
+    # 100 orders per user over the last ~6 weeks, so across partitions
+    """
+    INSERT INTO orders (user_id, status, total_cents, currency, idempotency_key, created_at)
+    SELECT 'plan_user_' || g % :users,
+           CASE WHEN g % 3 = 0 THEN 'PAID' WHEN g % 7 = 0 THEN 'CANCELLED' ELSE 'CREATED' END,
+           1000, 'USD', 'plan-key-' || g, now() - g * interval '3 minutes'
+    FROM generate_series(1, :orders) g
+    """,
+    """
+    INSERT INTO order_idempotency_keys (user_id, idempotency_key, order_id, order_created_at)
+    SELECT user_id, idempotency_key, id, created_at FROM orders WHERE user_id LIKE 'plan_user_%'
+    """,
+    """
+    INSERT INTO order_items (order_id, order_created_at, product_id, sku, name, qty,
+                             unit_price_cents, line_total_cents)
+    SELECT o.id, o.created_at, n, 'plan-' || n, 'Plan product ' || n, 1, 500, 500
+    FROM orders o CROSS JOIN generate_series(1, 3) n
+    WHERE o.user_id LIKE 'plan_user_%'
+    """,
+    # One payment per non-cancelled order; a few still in flight
+    """
+    INSERT INTO payments (order_id, order_created_at, status, amount, currency,
+                          idempotency_key, created_at)
+    SELECT id, created_at,
+           CASE WHEN status = 'PAID' THEN 'SUCCEEDED'
+                WHEN id % 100 = 0 THEN 'PENDING' ELSE 'FAILED' END,
+           10.00, 'USD', 'plan-pay-' || id, created_at
+    FROM orders WHERE user_id LIKE 'plan_user_%' AND status <> 'CANCELLED'
+    """,
+    # Handled events are deleted, so the table holds dead letters plus a backlog
+    """
+    INSERT INTO outbox_events (event_type, payload, status, attempts, available_at)
+    SELECT 'PLAN_TEST', '{}', CASE WHEN g % 5 = 0 THEN 'PENDING' ELSE 'DEAD' END, g % 8,
+           now() - g * interval '1 second'
+    FROM generate_series(1, :orders) g
+    """,
+    "ANALYZE products, orders, order_items, payments, order_idempotency_keys, outbox_events",
+]
+
+INDEXED_SCANS = {"Index Scan", "Index Only Scan", "Bitmap Heap Scan", "Bitmap Index Scan"}
+
+
+@pytest.fixture(scope="module")
+def conn():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as c:
+        tx = c.begin()
+        try:
+            params = {"products": PRODUCTS, "orders": ORDERS, "users": USERS}
+            for stmt in SEED:
+                c.execute(text(stmt), params)
+            yield c
+        finally:
+            tx.rollback()
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def sample(conn):
+    order = (
+        conn.execute(
+            text(
+                "SELECT id, user_id, created_at, idempotency_key FROM orders "
+                "WHERE user_id = 'plan_user_7' ORDER BY id DESC LIMIT 1"
+            )
+        )
+        .mappings()
+        .one()
+    )
+    product_ids = conn.execute(
+        text("SELECT id FROM products WHERE sku LIKE 'plan-%' ORDER BY id LIMIT 50")
+    ).scalars()
+    payment_id = conn.execute(
+        text("SELECT id FROM payments WHERE order_id = :id"), {"id": order["id"]}
+    ).scalar_one_or_none()
+    return {**order, "product_ids": list(product_ids), "payment_id": payment_id or 0}
+
+
+@pytest.fixture(scope="module")
+def db(conn):
+    # Only builds the ORM queries; they run through explain() on `conn`
+    with Session(bind=conn) as session:
+        yield session
+
+
+def explain(conn, statement: Query | TextClause, params: dict | None = None) -> dict:
+    if isinstance(statement, TextClause):
+        result = conn.execute(text(f"EXPLAIN (FORMAT JSON) {statement.text}"), params or {})
+    else:
+        compiled = statement.statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+        result = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+    raw = result.scalar_one()
+    return (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+
+def walk(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from walk(child)
+
+
+def empty_relations(conn) -> set[str]:
+    # Partitions for future months are empty; a seq scan there costs nothing
+    return set(conn.execute(text("SELECT relname FROM pg_class WHERE relpages = 0")).scalars())
+
+
+def assert_plan(
+    conn,
+    statement: Query | TextClause,
+    max_rows: int,
+    max_sorted: int | None = None,
+    params: dict | None = None,
+) -> None:
+    plan = explain(conn, statement, params)
+    nodes = list(walk(plan))
+    empty = empty_relations(conn)
+    shown = json.dumps(plan, indent=1)
+
+    seq_scans = [
+        n["Relation Name"]
+        for n in nodes
+        if n["Node Type"] == "Seq Scan" and n["Relation Name"] not in empty
+    ]
+    assert not seq_scans, f"seq scan on {seq_scans}:\n{shown}"
+    assert any(n["Node Type"] in INDEXED_SCANS for n in nodes), f"no index scan:\n{shown}"
+
+    # Sorting what the query returns anyway (a handful of order lines) is
+    # fine; sorting before a LIMIT means the index no longer gives the order.
+    # Selective filters may sort their (bounded) matches instead.
+    max_sorted = max_rows if max_sorted is None else max_sorted
+    big_sorts = [
+        n
+        for n in nodes
+        if n["Node Type"] in ("Sort", "Incremental Sort") and n["Plan Rows"] > max_sorted
+    ]
+    assert not big_sorts, f"sort over {big_sorts[0]['Plan Rows']} rows:\n{shown}"
+
+    assert plan["Plan Rows"] <= max_rows, f"estimated {plan['Plan Rows']} rows:\n{shown}"
+
+
+def listing(db, filters: ProductFilters) -> Query:
+    # First page, as the listing endpoint queries it
+    return product_page(filters.apply(db.query(Product)), PAGE, 0)
+
+
+def test_list_active_products_page(conn, db):
+    assert_plan(conn, listing(db, ProductFilters()), max_rows=PAGE)
+
+
+def test_list_all_products_page(conn, db):
+    assert_plan(conn, listing(db, ProductFilters(active_only=False)), max_rows=PAGE)
+
+
+def test_list_products_in_price_range(conn, db):
+    # A $1 range: about 1% of the catalog
+    assert_plan(
+        conn,
+        listing(db, ProductFilters(min_price_cents=2000, max_price_cents=2100)),
+        max_rows=PAGE,
+        max_sorted=PRODUCTS // 50,
+    )
+
+
+def test_list_products_in_currency_and_price_range(conn, db):
+    filters = ProductFilters(currency="EUR", min_price_cents=2000, max_price_cents=4000)
+    assert_plan(conn, listing(db, filters), max_rows=PAGE, max_sorted=PRODUCTS // 50)
+
+
+def test_list_in_stock_products_page(conn, db):
+    assert_plan(conn, listing(db, ProductFilters(in_stock=True)), max_rows=PAGE)
+
+
+def test_load_products_by_ids(conn, db, sample):
+    ids = sample["product_ids"]
+    assert_plan(conn, products_by_id(db, ids), max_rows=len(ids))
+
+
+def test_list_orders_for_user(conn, db, sample):
+    assert_plan(conn, _user_orders_query(db, sample["user_id"], PAGE), max_rows=PAGE)
+
+
+def test_get_order(conn, db, sample):
+    query = _versioned_order_query(db, sample["id"], sample["user_id"])
+    assert_plan(conn, query.limit(1), max_rows=1)
+
+
+def test_order_for_idempotency_key(conn, db, sample):
+    query = _order_for_key_query(db, sample["user_id"], sample["idempotency_key"])
+    assert_plan(conn, query.limit(1), max_rows=1)
+
+
+def test_order_items_for_order(conn, db, sample):
+    assert_plan(conn, _order_items_query(db, sample["id"], sample["created_at"]), max_rows=10)
+
+
+def test_payment_for_idempotency_key(conn, db, sample):
+    # Before the order is loaded, so by order id alone (every month's partition)
+    query = _payment_for_key_query(db, sample["id"], f"plan-pay-{sample['id']}")
+    assert_plan(conn, query.limit(1), max_rows=1)
+
+
+def test_key_or_in_flight_payments_for_order(conn, db, sample):
+    order = db.get(Order, (sample["id"], sample["created_at"]))
+    assert_plan(conn, _key_or_in_flight_query(db, order, "pay-key"), max_rows=5)
+
+
+def test_get_payment(conn, db, sample):
+    query = db.query(Payment).filter(Payment.id == sample["payment_id"])
+    assert_plan(conn, query.limit(1), max_rows=10)
+
+
+def test_stale_payment_sweep(conn, db):
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=60)
+    assert_plan(conn, _stale_payments_query(db, cutoff, 500), max_rows=500)
+
+
+def test_outbox_claim(conn, db):
+    assert_plan(conn, _claim_query(db, 100), max_rows=100)
+
+
+def test_unpaid_order_sweep(conn):
+    cutoff = datetime.now(timezone.utc) - timedelta(days=1)
+    after = cutoff - timedelta(days=30)
+    assert_plan(
+        conn,
+        _LOCK_BATCH,
+        max_rows=500,
+        params={"cutoff": cutoff, "after_created_at": after, "after_id": 0, "limit": 500},
+    )
+
+
+def test_reconcile_chunk_bounds(conn, sample):
+    assert_plan(conn, _CHUNK_END, max_rows=1, params={"after": sample["id"] - 2000, "offset": 999})
+
+
+def test_reconcile_succeeded_payments_in_chunk(conn, sample):
+    assert_plan(
+        conn,
+        _SUCCEEDED_PAYMENTS,
+        max_rows=1000,
+        params={"after": sample["id"] - 1000, "last": sample["id"]},
+    )